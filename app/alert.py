@@ -1,22 +1,32 @@
-import time
+import asyncio
+import random
+import signal
 import os
+import time
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
-from influxdb_client import InfluxDBClient
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from prometheus_client import Histogram
+from sqlalchemy import bindparam, create_engine, text
+import influx
+import telemetry
+from config.constants import INSTRUMENT_TYPES, heartbeat_field
+from flux_planner import flux_string_array
+from notifier import AlertDispatcher
 
 load_dotenv()
 
 # General variables
 MINUTES_TIMEOUT = os.getenv("TIMEOUT", 10)
+HEARTBEAT_LOOKBACK_MINUTES = int(os.getenv("HEARTBEAT_LOOKBACK", 30))
+CHECK_INTERVAL = float(os.getenv("CHECK_INTERVAL", 60))              # seconds, per station (overridable per type)
+CHECK_JITTER = float(os.getenv("CHECK_JITTER", 0.1))                 # +/- fraction of the interval, per group tick
+MAX_CONCURRENT_QUERIES = int(os.getenv("MAX_CONCURRENT_QUERIES", 4))
+STATIONS_REFRESH = float(os.getenv("STATIONS_REFRESH", 300))         # seconds between instrument list reloads
+FLUSH_INTERVAL = float(os.getenv("STATUS_FLUSH_INTERVAL", 5))        # seconds between status write-backs
+REPORT_INTERVAL = float(os.getenv("METRICS_REPORT_INTERVAL", 60))
+METRICS_PORT = int(os.getenv("ALERT_METRICS_PORT", 9101))            # Prometheus listener, 0 disables
 
 # Load environment variables
-url = os.getenv("INFLUXDB_URL")
-token = os.getenv("INFLUXDB_TOKEN")
-org = os.getenv("INFLUXDB_ORG")
 bucket = os.getenv("INFLUXDB_BUCKET")
 db_url = os.getenv('DATABASE_URL')
 
@@ -29,81 +39,256 @@ EMAIL_FROM = os.getenv("EMAIL_FROM")
 EMAIL_TO = os.getenv("EMAIL_TO")
 if EMAIL_TO:
     EMAIL_TO = EMAIL_TO.split(",")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1").lower() in ("1", "true", "yes")
+ALERT_COALESCE_WINDOW = float(os.getenv("ALERT_COALESCE_WINDOW", 30))   # seconds merged into one digest
+ALERT_MAX_RETRIES = int(os.getenv("ALERT_MAX_RETRIES", 5))
+ALERT_RETRY_BACKOFF = float(os.getenv("ALERT_RETRY_BACKOFF", 2))          # seconds, doubled on each retry
 
 # Postgres engine
 engine = create_engine(db_url)
 
-# InfluxDB client
-client = InfluxDBClient(url=url, token=token, org=org)
-query_api = client.query_api()
+# InfluxDB client (shared, see influx.py)
+query_api = influx.query_api()
+
+
+# Monitor metrics (logged every REPORT_INTERVAL)
+metrics = {
+    "checks": 0,
+    "check_errors": 0,
+    "queries": 0,
+    "transitions": 0,
+    "missed_cycles": 0,
+    "lag_seconds_last": 0.0,
+    "lag_seconds_max": 0.0,
+}
 
+# Prometheus histograms (served by the listener on METRICS_PORT, next to the Influx
+# query timings recorded by telemetry.py for latest_heartbeats)
+CHECK_SECONDS = Histogram("alert_check_duration_seconds",
+                          "Check duration of a group of stations (one Influx query)",
+                          buckets=telemetry.LATENCY_BUCKETS)
+FLUSH_SECONDS = Histogram("alert_flush_duration_seconds",
+                          "Status write-back duration", buckets=telemetry.LATENCY_BUCKETS)
+LAG_SECONDS = Histogram("alert_schedule_lag_seconds",
+                        "Delay of a group check behind its schedule", buckets=telemetry.LATENCY_BUCKETS)
 
-def check_station_status():
+
+def load_instruments():
     with engine.connect() as connection:
-        results = connection.execute(text("SELECT id, name, status FROM instruments"))
-        instruments = [{"id": row[0], "name": row[1], "status": row[2]} for row in results]
-
-        current_time = datetime.utcnow()
-
-        for instrument in instruments:
-            id = instrument["id"]
-            name = instrument["name"]
-            prev_status = instrument["status"]
-            
-            query = f"""from(bucket: "{bucket}") 
-                        |> range(start: -30m) 
-                        |> filter(fn: (r) => r._field == "TempOut" and r.topic == "{id}") 
-                        |> last()"""
-            tables = query_api.query(query)
-
-            last_message_time = None
-            for table in tables:
-                for record in table.records:
-                    last_message_time = record.get_time()
-
-            if last_message_time:
-                last_message_time = last_message_time.replace(tzinfo=None)
-                time_difference = current_time - last_message_time
-                current_status = "offline" if time_difference > timedelta(minutes=int(MINUTES_TIMEOUT)) else "online"
-            else:
-                current_status = "offline"
-
-            if current_status != prev_status:
-                send_alert(id, current_status, name)
-                update_query = text("UPDATE instruments SET status = :status WHERE id = :id")
-                connection.execute(update_query, {"status": current_status, "id": id})
+        results = connection.execute(text("SELECT id, name, status, instrument_type, \"airlinkID\" FROM instruments"))
+        return [
+            {"id": row[0], "name": row[1], "status": row[2],
+             "heartbeat": heartbeat_field(row[3], bool(row[4])),
+             "interval": float(INSTRUMENT_TYPES.get(row[3], {}).get("check_interval", CHECK_INTERVAL))}
+            for row in results
+        ]
+
+
+def latest_heartbeats(field, topics):
+    """Latest timestamp of `field` (any field if None) per topic, in one query."""
+    field_filter = f' and r._field == "{field}"' if field else ""
+    topic_set = flux_string_array(topics)
+    query = f"""from(bucket: "{bucket}") 
+                |> range(start: -{HEARTBEAT_LOOKBACK_MINUTES}m) 
+                |> filter(fn: (r) => r._measurement == "mqtt_data"{field_filter}) 
+                |> filter(fn: (r) => contains(value: r.topic, set: {topic_set}))
+                |> last()
+                |> keep(columns: ["topic", "_time"])"""
+    tables = query_api.query(query, name="latest_heartbeats")
 
+    latest = {}
+    for table in tables:
+        for record in table.records:
+            topic = record.values.get("topic")
+            ts = record.get_time().replace(tzinfo=None)
+            if topic is not None and (topic not in latest or ts > latest[topic]):
+                latest[topic] = ts
+    return latest
+
+
+def write_transitions(changes):
+    """Persist {station_id: status} with at most one UPDATE per status value."""
+    by_status = {}
+    for station_id, status in changes.items():
+        by_status.setdefault(status, []).append(station_id)
+
+    update_query = text("UPDATE instruments SET status = :status WHERE id IN :ids").bindparams(
+        bindparam("ids", expanding=True))
+    with engine.connect() as connection:
+        for status, ids in by_status.items():
+            connection.execute(update_query, {"status": status, "ids": ids})
+        # Web workers keep an in-memory copy of the table (registry.py): tell them on commit,
+        # as a status-only change (their /instruments snapshots do not carry the status)
+        connection.execute(text("SELECT pg_notify('instruments_changed', 'status')"))
         connection.commit()
 
 
-def send_alert(station_id, status, station_name):
-    subject = f"ALERT: Station {station_name} ({station_id}) is now {status.upper()}"
-    body = f"The station '{station_name}' (ID {station_id}) has changed status to {status.upper()}."
+def station_status(last_message_time, current_time):
+    if not last_message_time:
+        return "offline"
+    return "offline" if current_time - last_message_time > timedelta(minutes=int(MINUTES_TIMEOUT)) else "online"
+
+
+def schedule_key(station):
+    """Stations checked together, with one Influx query per tick: same heartbeat field and interval."""
+    return station["heartbeat"], station["interval"]
+
+
+class StatusMonitor:
+    """
+    Checks the stations in groups sharing a heartbeat field and an interval
+    (from their instrument type): each group has one tick, with jitter, and
+    costs one Influx query per cycle. Queries run in threads, bounded by a
+    semaphore. Status transitions are written back in bulk; stops cleanly on
+    SIGTERM/SIGINT.
+    """
+
+    def __init__(self):
+        self.stations = {}
+        self.tasks = {}             # schedule_key -> group loop
+        self.changes = {}
+        self.semaphore = asyncio.Semaphore(MAX_CONCURRENT_QUERIES)
+        self.dispatcher = None
+        self.stopping = None
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.stopping.set)
+
+        self.dispatcher = AlertDispatcher(
+            SMTP_SERVER, SMTP_PORT, EMAIL_FROM, EMAIL_TO,
+            window=ALERT_COALESCE_WINDOW, max_retries=ALERT_MAX_RETRIES,
+            backoff=ALERT_RETRY_BACKOFF, starttls=SMTP_STARTTLS,
+        )
+        if METRICS_PORT:
+            telemetry.register_stats("alert", self.stats)
+            telemetry.serve(METRICS_PORT)
+        background = [asyncio.create_task(self._every(FLUSH_INTERVAL, self.flush)),
+                      asyncio.create_task(self._every(REPORT_INTERVAL, self.report)),
+                      asyncio.create_task(self.dispatcher.run())]
+        while not self.stopping.is_set():
+            try:
+                await self.sync_stations()
+            except Exception as e:
+                print(f"Failed to load instruments: {e}")
+            await self._sleep(STATIONS_REFRESH)
+
+        print("Stopping status monitor")
+        tasks = list(self.tasks.values()) + background
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.flush()
+        await self.dispatcher.drain()
+        engine.dispose()
+        influx.close_client()
+
+    async def sync_stations(self):
+        instruments = await asyncio.to_thread(load_instruments)
+        current = {i["id"]: i for i in instruments}
+
+        for station_id, instrument in current.items():
+            known = self.stations.get(station_id)
+            if known:
+                # Keep the in-memory status (it may not be flushed yet), refresh the rest
+                instrument["status"] = known["status"]
+        self.stations = current
+
+        groups = {schedule_key(station) for station in current.values()}
+        for key in set(self.tasks) - groups:
+            self.tasks.pop(key).cancel()
+        for key in groups - set(self.tasks):
+            self.tasks[key] = asyncio.create_task(self.group_loop(key))
+
+    async def group_loop(self, key):
+        field, interval = key
+        loop = asyncio.get_running_loop()
+        # Random first run spreads the groups over their interval; the jitter moves the
+        # whole tick, so the group stays in one query per cycle
+        next_run = loop.time() + random.uniform(0, interval)
+        while True:
+            await asyncio.sleep(max(0.0, next_run - loop.time()))
+            stations = [station for station in self.stations.values() if schedule_key(station) == key]
+
+            lag = max(0.0, loop.time() - next_run)
+            metrics["lag_seconds_last"] = lag
+            metrics["lag_seconds_max"] = max(metrics["lag_seconds_max"], lag)
+            LAG_SECONDS.observe(lag)
+
+            started = time.perf_counter()
+            try:
+                await self.check(field, stations)
+            except Exception as e:
+                metrics["check_errors"] += 1
+                print(f"Status check failed for {len(stations)} stations ({field or 'any field'}, "
+                      f"every {interval:g}s): {e}")
+            CHECK_SECONDS.observe(time.perf_counter() - started)
+
+            next_run += interval * random.uniform(1 - CHECK_JITTER, 1 + CHECK_JITTER)
+            now = loop.time()
+            if next_run < now:
+                # Could not keep up: skip the cycles that are already past
+                metrics["missed_cycles"] += int((now - next_run) // interval) + 1
+                next_run = now
+
+    async def check(self, field, stations):
+        if not stations:
+            return
+        async with self.semaphore:
+            metrics["queries"] += 1
+            latest = await asyncio.to_thread(latest_heartbeats, field, [station["id"] for station in stations])
+
+        now = datetime.utcnow()
+        for station in stations:
+            metrics["checks"] += 1
+            current_status = station_status(latest.get(station["id"]), now)
+            if current_status != station["status"]:
+                station["status"] = current_status
+                self.changes[station["id"]] = current_status
+                metrics["transitions"] += 1
+                self.send_alert(station["id"], current_status, station["name"])
 
-    send_email(subject, body)
+    def send_alert(self, station_id, status, station_name):
+        # Queued: delivered (and coalesced with other transitions) by the dispatcher task
+        self.dispatcher.enqueue(station_id, station_name, status)
+        print(f"ALERT: Station {station_name} ({station_id}) is now {status}")
 
-    print(f"ALERT: Station {station_name} ({station_id}) is now {status}")
+    async def flush(self):
+        if not self.changes:
+            return
+        changes, self.changes = self.changes, {}
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(write_transitions, changes)
+        except Exception as e:
+            print(f"Failed to write status changes: {e}")
+            # Retry on the next flush, unless a newer transition superseded them
+            self.changes = {**changes, **self.changes}
+        FLUSH_SECONDS.observe(time.perf_counter() - started)
 
+    def stats(self):
+        return dict(metrics, stations=len(self.stations), pending_changes=len(self.changes),
+                    alerts_queued=self.dispatcher.queue.qsize(), alerts_sent=self.dispatcher.sent,
+                    alerts_failed=self.dispatcher.failed)
 
-def send_email(subject, body):
-    msg = MIMEMultipart()
-    msg['From'] = EMAIL_FROM
-    msg['To'] = ", ".join(EMAIL_TO) if isinstance(EMAIL_TO, list) else EMAIL_TO
-    msg['Subject'] = subject
+    async def report(self):
+        print(f"Monitor: {len(self.stations)} stations, {metrics}, "
+              f"alerts queued={self.dispatcher.queue.qsize()} sent={self.dispatcher.sent} failed={self.dispatcher.failed}")
 
-    msg.attach(MIMEText(body, 'plain'))
+    async def _every(self, seconds, fn):
+        while True:
+            await asyncio.sleep(seconds)
+            await fn()
 
-    try:
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()
-            #server.login(SMTP_USERNAME, SMTP_PASSWORD)
-            server.sendmail(EMAIL_FROM, EMAIL_TO, msg.as_string())
+    async def _sleep(self, seconds):
+        try:
+            await asyncio.wait_for(self.stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
 
-        print(f"Email sent to {EMAIL_TO} with subject: {subject}")
-    except Exception as e:
-        print(f"Failed to send email: {e}")
 
+if __name__ == "__main__":
+    asyncio.run(StatusMonitor().run())
 
-while True:
-    check_station_status()
-    time.sleep(60)
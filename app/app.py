@@ -14,13 +14,37 @@ Flask app that manages users and instruments and exposes:
 Security (current & TODO)
 -------------------------
 - Uses SECRET_KEY, bcrypt, and login-required routes where needed.
+- Login is throttled per IP and per username, and bcrypt runs on a bounded pool (passwords.py).
 - TODO (recommended): enable CSRF protection on POST/PUT/DELETE, harden cookies,
-  rate-limit login, and convert destructive GETs to POST (some already done).
+  and convert destructive GETs to POST (some already done).
 
 Configuration (env)
 -------------------
 - SECRET_KEY, DATABASE_URL, UPLOAD_FOLDER, ALLOWED_EXTENSIONS
 - INFLUXDB_URL, INFLUXDB_TOKEN, INFLUXDB_ORG, INFLUXDB_BUCKET
+- INFLUXDB_TIMEOUT_MS, INFLUXDB_POOL_MAXSIZE (shared client, see influx.py)
+- INSTRUMENTS_CACHE_TTL, INSTRUMENTS_CACHE_STALE, INSTRUMENTS_CACHE_FILE (snapshot cache, see cache.py)
+- TIMESERIES_CHUNK_HOURS (streaming export chunk size)
+- LIVE_POLL_INTERVAL, LIVE_BUFFER_SIZE, LIVE_MAX_CLIENTS, LIVE_MAX_LIFETIME, LIVE_RETRY
+  (SSE live feed; streams per worker process and their lifetime, see live.py)
+- ROLLUPS_ENABLED, INFLUXDB_ROLLUP_BUCKET (rollup tiers written by downsampler.py)
+- UPLOAD_BATCH_SIZE, UPLOAD_FLUSH_INTERVAL_MS, UPLOAD_MAX_RETRIES, UPLOAD_RETRY_INTERVAL_MS (CSV backfill)
+- USER_CACHE_TTL (seconds a session user is served from memory)
+- BCRYPT_ROUNDS, BCRYPT_WORKERS, LOGIN_QUEUE_SIZE, LOGIN_QUEUE_TIMEOUT, LOGIN_THROTTLE_WINDOW,
+  LOGIN_IP_ATTEMPTS, LOGIN_USER_FAILURES (off-thread bcrypt and login throttling, see passwords.py)
+- HTTP_INSTRUMENTS_MAX_AGE, HTTP_TIMESERIES_MAX_AGE, HTTP_CLOSED_RANGE_MARGIN (ETag/Cache-Control)
+- COMPRESS_MIN_SIZE, COMPRESS_LEVEL (gzip/brotli responses, see http_cache.py)
+- WINDOW_CACHE_DIR, WINDOW_CACHE_MAX_MB, WINDOW_CACHE_MARGIN (disk cache of closed days, see window_cache.py)
+- DATA_VERSION_DIR (per-instrument data versions bumped by backfills, see data_versions.py;
+  shared by all web workers, like WINDOW_CACHE_DIR)
+- AGGREGATION_POOL_SIZE, AGGREGATION_PARALLEL_MIN_ROWS (process pool for large pandas aggregations,
+  off by default: every gunicorn worker gets its own pool, so keep it small, and enable it only if
+  benchmarks/bench_parallel.py shows a gain on the host; it also gives the threshold)
+- EXPORT_RESULTS_DIR, EXPORT_JOB_WORKERS, EXPORT_RESULT_TTL (asynchronous export jobs, see jobs.py)
+- BATCH_EXPORT_WORKERS, BATCH_EXPORT_MAX_INSTRUMENTS (multi-instrument export pool/limit)
+- PARQUET_COMPRESSION (default codec of format=parquet exports, see export.py)
+- METRICS_TOKEN (bearer token required by /metrics; without it /metrics is disabled), PROMETHEUS_MULTIPROC_DIR
+  (aggregates the metrics of all gunicorn workers, see telemetry.py)
 
 Key Endpoints
 -------------
@@ -30,7 +54,14 @@ Key Endpoints
 - DELETE /api/users/<id>               : delete user (admin)
 - POST /api/users/change_password      : change current user's password
 - GET/POST /instruments                : list or import instruments from Influx topics
-- GET  /timeseries/<instrument_id>     : export CSV for selected time window/interval
+- GET  /instruments/stream             : live value deltas (Server-Sent Events)
+- GET  /timeseries/<instrument_id>     : export CSV for selected time window/interval (stream=1: chunked);
+                                         format=parquet|arrow for columnar output
+- POST /api/exports                    : submit an export job (same parameters as /timeseries)
+- GET  /api/exports/<id>               : job status and progress; /download for the finished file
+- GET/POST /api/timeseries/batch       : several instruments, one window: streamed ZIP or long-format file
+- GET  /api/cache/stats                : cache counters and hit rates, login queue/latency (admin)
+- GET  /metrics                        : Prometheus metrics (route/Influx/phase timings, cache counters; bearer METRICS_TOKEN)
 - POST /api/instruments                : create instrument
 - PATCH/PUT/DELETE /api/instruments/<id>: update/delete instrument
 - POST /edit/<id>                      : update instrument via form
@@ -40,7 +71,12 @@ Key Endpoints
 Notes
 -----
 - The variables list for each instrument influences which fields are favored in CSV headers.
-- The time series export uses Flux aggregateWindow with fn=last to preserve non-numeric fields.
+- The time series export pushes aggregation down to Flux aggregateWindow when aggregation.yaml
+  allows it (flux_planner.py), otherwise it aggregates raw points with pandas (utils.py).
+- /instruments and /timeseries carry weak ETags; a closed time range (ending in the past) is
+  answered with 304 before touching Influx when the client already has it.
+- The Flask app is built by create_app(); production runs it under gunicorn with several
+  preloaded workers (gunicorn.conf.py), `python app.py` is the development server.
 - Keep models/schema intact per your requirement; comments focus on structure and usage.
 """
 
@@ -48,18 +84,39 @@ from io import StringIO
 from dotenv import load_dotenv
 from datetime import timedelta, datetime
 from dateutil import parser as dateparser
-from flask import Flask, render_template, redirect, url_for, request, jsonify, Response, abort
-from flask_login import LoginManager, login_user, login_required, logout_user, current_user
+from functools import partial
+from flask import Flask, current_app, render_template, redirect, url_for, request, jsonify, Response, abort, send_file, g
+from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from flask_migrate import Migrate
 from models import db, User, Instrument
-from flask_bcrypt import Bcrypt
 from werkzeug.utils import secure_filename
+from sqlalchemy.engine import make_url
 from sqlalchemy.exc import IntegrityError
-from influxdb_client import InfluxDBClient
+from influxdb_client.client.write_api import SYNCHRONOUS, WriteOptions
+import influx
 import utils
+import flux_planner
+import rollups
+import http_cache
+import export
+import telemetry
+from flux_planner import flux_string_array, flux_time, raw_timeseries_query, records_to_rows
+from cache import SnapshotCache, TTLCache
+from jobs import ExportJobs
+from window_cache import WindowCache
+from data_versions import DataVersions
+from registry import registry, notify_changed
+from passwords import Overloaded, hasher, throttle
+from live import LiveFeed
 import csv
+import hmac
+import json
+import logging
 import os
+import threading
 import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 import pandas as pd
 
 from config.constants import INSTRUMENT_TYPES, variables_for
@@ -69,23 +126,25 @@ from config.loader import load_aggregation_config
 load_dotenv()
 aggregation_cfg = load_aggregation_config()
 
-app = Flask(__name__)
+# For code running outside the app context (background threads, write callbacks)
+log = logging.getLogger(__name__)
 
-# Core configuration (secrets, DB, uploads, formats)
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['UPLOAD_FOLDER'] = os.getenv('UPLOAD_FOLDER')
-app.config['ALLOWED_EXTENSIONS'] = set(os.getenv('ALLOWED_EXTENSIONS').split(','))
-
-# Initialize extensions (DB, password hashing, migrations, session manager)
-db.init_app(app)
-bcrypt = Bcrypt(app)
-migrate = Migrate(app, db)
+# Extensions are created unbound and attached to each app by create_app()
+migrate = Migrate()
 login_manager = LoginManager()
-login_manager.init_app(app)
 login_manager.login_view = 'login'
 
+# Routes are collected at import time and registered on the app by create_app()
+_routes = []
+
+
+def route(rule, **options):
+    def decorator(view):
+        _routes.append((rule, options, view))
+        return view
+    return decorator
+
+
 # Static catalog that maps instrument type keys to labels and variable hints
 instrument_types = {
     "ws_on": {
@@ -129,12 +188,25 @@ instrument_types = {
 # Additional variables automatically appended for airlink devices
 airlink_variables = "pm_2p5_nowcast, pm_1, pm_10_nowcast, aqi_nowcast_val"
 
-# InfluxDB connection parameters
-inluxdb_url = os.getenv("INFLUXDB_URL")
-token = os.getenv("INFLUXDB_TOKEN")
+# InfluxDB connection parameters (the client itself is shared, see influx.py)
 org = os.getenv("INFLUXDB_ORG")
 bucket = os.getenv("INFLUXDB_BUCKET")
 
+# Streaming export: hours of raw data read from Influx per chunk
+TIMESERIES_CHUNK_HOURS = int(os.getenv("TIMESERIES_CHUNK_HOURS", 24))
+
+# Bulk CSV backfill: batched writes to Influx
+UPLOAD_WRITE_OPTIONS = WriteOptions(
+    batch_size=int(os.getenv("UPLOAD_BATCH_SIZE", 5000)),
+    flush_interval=int(os.getenv("UPLOAD_FLUSH_INTERVAL_MS", 1000)),
+    max_retries=int(os.getenv("UPLOAD_MAX_RETRIES", 3)),
+    retry_interval=int(os.getenv("UPLOAD_RETRY_INTERVAL_MS", 1000)),
+)
+
+# Rollup tiers maintained by downsampler.py (see rollups.py)
+ROLLUPS_ENABLED = os.getenv("ROLLUPS_ENABLED", "1").lower() in ("1", "true", "yes")
+rollup_bucket = os.getenv("INFLUXDB_ROLLUP_BUCKET") or bucket
+
 
 # Simple admin guard: only "admin" username is treated as administrator
 def admin_required(f):
@@ -150,20 +222,48 @@ def admin_required(f):
 
 # Basic file-type allowlist for uploads (by extension)
 def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS']
+
+
+# Index a last() result once as {topic: {field: value}} (linear in the result size)
+def index_last_values(tables):
+    latest = {}
+    for table in tables:
+        for record in table.records:
+            topic = record.values.get("topic")
+            if topic is not None:
+                latest.setdefault(topic, {})[record.get_field()] = record.get_value()
+    return latest
+
+
+# Identity kept in the user cache: detached and read-only, password work reloads the User row
+class SessionUser(UserMixin):
+    def __init__(self, id, username):
+        self.id = id
+        self.username = username
+
+
+def load_session_user(user_id):
+    user = db.session.get(User, user_id)
+    return SessionUser(user.id, user.username) if user else None
+
+
+# Short-TTL cache of session users: no Postgres round trip per authenticated request.
+# Password change and deletion invalidate the entry here; other workers expire it within the TTL.
+user_cache = TTLCache(loader=load_session_user, ttl=float(os.getenv("USER_CACHE_TTL", 30)), name="users")
 
 
 # Session user loader for Flask-Login
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return user_cache.get(int(user_id))
 
 
 # Save uploaded image into configured upload folder (if any)
 def handle_file_upload(file):
     if file and allowed_file(file.filename):
         filename = secure_filename(file.filename)
-        file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+        file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
         return filename
     return None
 
@@ -219,14 +319,147 @@ def create_or_update_instrument(data, is_edit=False):
     return instrument
 
 
+# Build the /instruments listing: instruments enriched with their latest Influx values.
+# Runs inside its own app context so the cache can call it from a background thread.
+def load_instruments_snapshot(app):
+    with app.app_context():
+        query_api = influx.query_api()
+        instruments = registry.all()
+        variables_by_id = {instrument.id: instrument.variable_list for instrument in instruments}
+
+        # Only ask Influx for the fields some instrument actually shows
+        wanted_fields = sorted({v for variables in variables_by_id.values() for v in variables})
+        latest = {}
+        if wanted_fields:
+            query = f"""
+            from(bucket: "{bucket}")
+              |> range(start: -3h)
+              |> filter(fn: (r) => r._measurement == "mqtt_data")
+              |> filter(fn: (r) => contains(value: r._field, set: {flux_string_array(wanted_fields)}))
+              |> last()
+            """
+            tables = query_api.query(query, org=org, name="instruments_snapshot")
+            latest = index_last_values(tables)
+
+        instruments_data = []
+        for instrument in instruments:
+            relevant_variables = variables_by_id[instrument.id]
+
+            instrument_data = {
+                'id': instrument.id,
+                'name': instrument.name,
+                'airlinkID': instrument.airlinkID,
+                'latitude': instrument.latitude,
+                'longitude': instrument.longitude,
+                'type': instrument.instrument_type,
+                'organization': instrument.organization,
+                'image': f'static/uploads/{instrument.image}' if instrument.image else None
+            }
+
+            topic_values = latest.get(instrument.id, {})
+            influx_data = {field: topic_values[field] for field in relevant_variables if field in topic_values}
+
+            # Example conversion: Fahrenheit to Celsius for TempOut
+            instrument_data['variables'] = influx_data
+            if 'TempOut' in instrument_data['variables']:
+                instrument_data['variables']['TempOut'] = utils.convert_f_to_c(instrument_data['variables']['TempOut'])
+
+            instruments_data.append(instrument_data)
+
+        return instruments_data
+
+
+# Live snapshot cache for GET /instruments (optionally shared through a file)
+instruments_cache = SnapshotCache(
+    loader=None,                          # bound to the app by create_app()
+    ttl=float(os.getenv("INSTRUMENTS_CACHE_TTL", 60)),
+    stale_ttl=float(os.getenv("INSTRUMENTS_CACHE_STALE", 300)),
+    path=os.getenv("INSTRUMENTS_CACHE_FILE") or None,
+    name="instruments",
+)
+
+# Any change to the instrument metadata (here or, via NOTIFY, in another worker) makes the snapshot
+# stale: served once more while it is refreshed in the background (status flips do not touch it)
+registry.on_change.append(instruments_cache.mark_stale)
+
+
+# Commit pending instrument changes: NOTIFY is sent with the commit (other workers drop their
+# registry through LISTEN), this worker drops its registry and marks its /instruments snapshot stale
+def commit_instruments():
+    notify_changed(db.session)
+    db.session.commit()
+    registry.invalidate()
+
+# Disk cache of aggregated windows per closed day (disabled when WINDOW_CACHE_DIR is set empty)
+WINDOW_CACHE_DIR = os.getenv("WINDOW_CACHE_DIR", "/tmp/window-cache")
+window_cache = WindowCache(
+    path=WINDOW_CACHE_DIR,
+    max_bytes=int(os.getenv("WINDOW_CACHE_MAX_MB", 512)) * 1024 * 1024,
+    closed_margin=int(os.getenv("WINDOW_CACHE_MARGIN", 900)),
+) if WINDOW_CACHE_DIR else None
+
+# Per-instrument data versions: a backfill into the past invalidates what was derived from it
+data_versions = DataVersions(os.getenv("DATA_VERSION_DIR", "/tmp/data-versions"))
+
+# HTTP caching policy
+HTTP_INSTRUMENTS_MAX_AGE = int(os.getenv("HTTP_INSTRUMENTS_MAX_AGE", 30))
+HTTP_TIMESERIES_MAX_AGE = int(os.getenv("HTTP_TIMESERIES_MAX_AGE", 300))     # closed ranges; then revalidated
+HTTP_CLOSED_RANGE_MARGIN = int(os.getenv("HTTP_CLOSED_RANGE_MARGIN", 900))   # seconds; late points
+AGGREGATION_POOL_SIZE = int(os.getenv("AGGREGATION_POOL_SIZE", 0))         # processes per web worker, 0/1: off
+AGGREGATION_PARALLEL_MIN_ROWS = int(os.getenv("AGGREGATION_PARALLEL_MIN_ROWS", 200000))
+BATCH_EXPORT_WORKERS = int(os.getenv("BATCH_EXPORT_WORKERS", 4))
+BATCH_EXPORT_MAX_INSTRUMENTS = int(os.getenv("BATCH_EXPORT_MAX_INSTRUMENTS", 200))
+_instruments_body = {"snapshot": None, "body": None, "etag": None}
+
+
+def instruments_body():
+    """JSON body and ETag of the current snapshot, serialised once per snapshot."""
+    snapshot = instruments_cache.get()
+    memo = _instruments_body
+    if memo["snapshot"] is not snapshot:
+        body = jsonify(snapshot).get_data()
+        memo.update(snapshot=snapshot, body=body, etag=http_cache.fingerprint(body))
+    return memo["body"], memo["etag"]
+
+
+# Shared per-process poller behind /instruments/stream (SSE deltas)
+live_feed = LiveFeed(
+    snapshot=instruments_cache.get,
+    interval=float(os.getenv("LIVE_POLL_INTERVAL", 30)),
+    buffer_size=int(os.getenv("LIVE_BUFFER_SIZE", 256)),
+    max_clients=int(os.getenv("LIVE_MAX_CLIENTS", 4)),
+    max_lifetime=float(os.getenv("LIVE_MAX_LIFETIME", 300)),
+    retry=float(os.getenv("LIVE_RETRY", 5)),
+)
+
+# Counters exported by /metrics (read at scrape time)
+telemetry.register_stats("instruments_cache", instruments_cache.stats)
+telemetry.register_stats("registry", registry.stats)
+telemetry.register_stats("user_cache", user_cache.stats)
+telemetry.register_stats("login", lambda: dict(hasher.stats(), **throttle.stats()))
+telemetry.register_stats("live", live_feed.stats)
+if window_cache is not None:
+    telemetry.register_stats("window_cache", window_cache.stats)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+
 # Public home page (e.g., login form view)
-@app.route('/')
+@route('/')
 def index():
     return render_template('index.html')
 
 
+# bcrypt pool saturated (passwords.Overloaded): 503, the client retries shortly
+BUSY_ERROR = "Servizio momentaneamente occupato, riprova."
+BUSY_HEADERS = {"Retry-After": "5"}
+
+
+def busy_response():
+    return jsonify({"error": BUSY_ERROR}), 503, BUSY_HEADERS
+
+
 # Username/password login with bcrypt verification and session creation
-@app.route('/login', methods=['GET', 'POST'])
+@route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         # Riconosci chiamate AJAX
@@ -237,8 +470,33 @@ def login():
         username = (data.get('username') or '').strip()
         password = (data.get('password') or '').strip()
 
+        # Throttling per IP (tentativi) e per username (fallimenti), prima di qualsiasi lavoro bcrypt
+        retry_after = throttle.check(request.remote_addr, username.lower())
+        if retry_after:
+            error = "Troppi tentativi, riprova più tardi."
+            headers = {"Retry-After": str(retry_after)}
+            if is_ajax:
+                return jsonify({"success": False, "error": error}), 429, headers
+            return render_template('index.html', login_error=error, login_modal_open=True), 429, headers
+
+        # Verifica bcrypt sul pool dedicato (coda di ammissione limitata)
         user = User.query.filter_by(username=username).first()
-        if user and user.check_password(password):
+        try:
+            valid = hasher.verify(user.password if user else None, password)
+        except Overloaded:
+            if is_ajax:
+                return jsonify({"success": False, "error": BUSY_ERROR}), 503, BUSY_HEADERS
+            return render_template('index.html', login_error=BUSY_ERROR, login_modal_open=True), 503, BUSY_HEADERS
+
+        if valid:
+            throttle.succeeded(username.lower())
+            if hasher.needs_rehash(user.password):
+                # Cost factor changed (BCRYPT_ROUNDS): upgrade the stored hash
+                try:
+                    user.set_password(password)
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
             login_user(user)
             if is_ajax:
                 return jsonify({"success": True, "redirect": url_for('dashboard')}), 200
@@ -246,6 +504,7 @@ def login():
             return redirect(url_for('dashboard'))
 
         # credenziali errate
+        throttle.failed(username.lower())
         if is_ajax:
             return jsonify({"success": False, "error": "Credenziali non valide."}), 401
 
@@ -258,7 +517,7 @@ def login():
 
 
 # Users page: admin sees full management; non-admin sees self-service password change
-@app.route('/users', methods=['GET'])
+@route('/users', methods=['GET'])
 @login_required
 def users_page():
     """If admin, render admin user list; otherwise show profile/password form."""
@@ -270,7 +529,7 @@ def users_page():
 
 
 # Admin-only: create a new user (accepts JSON or form-data)
-@app.route('/api/users', methods=['POST'])
+@route('/api/users', methods=['POST'])
 @login_required
 @admin_required
 def api_create_user():
@@ -287,7 +546,10 @@ def api_create_user():
         return jsonify({"error": "Username già esistente."}), 409
 
     user = User(username=username)
-    user.set_password(password)
+    try:
+        user.set_password(password)
+    except Overloaded:
+        return busy_response()
 
     try:
         db.session.add(user)
@@ -302,7 +564,7 @@ def api_create_user():
 
 
 # Admin-only: delete a user, with safeguards for admin/self-delete
-@app.route('/api/users/<int:user_id>', methods=['DELETE'])
+@route('/api/users/<int:user_id>', methods=['DELETE'])
 @login_required
 @admin_required
 def api_delete_user(user_id):
@@ -317,6 +579,7 @@ def api_delete_user(user_id):
     try:
         db.session.delete(user)
         db.session.commit()
+        user_cache.invalidate(user_id)
         return jsonify({"message": "Utente eliminato."}), 200
     except Exception:
         db.session.rollback()
@@ -324,7 +587,7 @@ def api_delete_user(user_id):
 
 
 # Logged-in user: change own password (validates current + basic policy)
-@app.route('/api/users/change_password', methods=['POST'])
+@route('/api/users/change_password', methods=['POST'])
 @login_required
 def api_change_password():
     """
@@ -344,20 +607,28 @@ def api_change_password():
     if len(new_password) < 6:
         return jsonify({"error": "La nuova password deve avere almeno 6 caratteri."}), 400
 
-    if not current_user.check_password(current_password):
-        return jsonify({"error": "Password attuale non corretta."}), 400
+    user = db.session.get(User, current_user.id)
+    try:
+        if not user or not user.check_password(current_password):
+            return jsonify({"error": "Password attuale non corretta."}), 400
+    except Overloaded:
+        return busy_response()
 
     try:
-        current_user.set_password(new_password)
+        user.set_password(new_password)
         db.session.commit()
+        user_cache.invalidate(current_user.id)
         return jsonify({"message": "Password aggiornata con successo."}), 200
+    except Overloaded:
+        db.session.rollback()
+        return busy_response()
     except Exception:
         db.session.rollback()
         return jsonify({"error": "Errore inatteso nell'aggiornamento."}), 500
 
 
 # Utility API to fetch AirLink ID by instrument id
-@app.route('/get_airlink/<string:instrument_id>', methods=['GET'])
+@route('/get_airlink/<string:instrument_id>', methods=['GET'])
 def get_airlink(instrument_id):
     airlinkID = Instrument.get_airlinkID_by_id(instrument_id)
     if airlinkID:
@@ -369,20 +640,18 @@ def get_airlink(instrument_id):
 # Instruments API:
 # - POST: import new instruments discovered in Influx (distinct topics)
 # - GET : list instruments enriched with latest Influx values for relevant variables
-@app.route('/instruments', methods=['GET', 'POST'])
+@route('/instruments', methods=['GET', 'POST'])
 def get_instruments():
-    client = InfluxDBClient(url=inluxdb_url, token=token, org=org)
-    query_api = client.query_api()
-
     if request.method == 'POST':
+        query_api = influx.query_api()
         # Discover unique topics seen in the last 3 hours and create instruments for missing ones
         query = f"""from(bucket: "{bucket}") |> range(start: -3h) |> last() |> distinct(column: "topic")"""
-        tables = query_api.query(query, org=org)
+        tables = query_api.query(query, org=org, name="discover_topics")
         unique_topics = {record.values.get("topic") for table in tables for record in table.records if record.values.get("topic")}
 
         imported_count = 0
         for topic in unique_topics:
-            if not db.session.filter_by(id=topic).first():
+            if not registry.get(topic):
                 data = {
                     'id': topic,
                     'name': '',
@@ -397,131 +666,511 @@ def get_instruments():
                 if create_or_update_instrument(data):
                     imported_count += 1
 
-        db.session.commit()
+        commit_instruments()
         return jsonify({'count': imported_count})
 
-    # For listing, collect last values per topic and attach to instruments
-    query = f"""from(bucket: "{bucket}") |> range(start: -3h) |> last()"""
-    tables = query_api.query(query, org=org)
-
-    instruments = db.session.query(Instrument).all()
-
-    instruments_data = []
-    for instrument in instruments:
-        relevant_variables = instrument.variables.split(", ") if instrument.variables else []
+    # For listing, serve the cached live snapshot (refreshed in the background when stale)
+    body, etag = instruments_body()
+    return http_cache.cacheable(Response(body, mimetype="application/json"), etag,
+                                f"public, max-age={HTTP_INSTRUMENTS_MAX_AGE}")
 
-        instrument_data = {
-            'id': instrument.id,
-            'name': instrument.name,
-            'airlinkID': instrument.airlinkID,
-            'latitude': instrument.latitude,
-            'longitude': instrument.longitude,
-            'type': instrument.instrument_type,
-            'organization': instrument.organization,
-            'image': f'static/uploads/{instrument.image}' if instrument.image else None
-        }
 
-        influx_data = {}
-        for table in tables:
-            for record in table.records:
-                if record.values.get("topic") == instrument.id:
-                    if record.get_field() in relevant_variables:
-                        influx_data[record.get_field()] = record.get_value()
-
-        # Example conversion: Fahrenheit to Celsius for TempOut
-        instrument_data['variables'] = influx_data
-        if 'TempOut' in instrument_data['variables']:
-            instrument_data['variables']['TempOut'] = utils.convert_f_to_c(instrument_data['variables']['TempOut'])
+# Server-Sent Events: live {topic, field, value} deltas for the map (resumable via Last-Event-ID).
+# Each stream holds a worker thread: capped per process (503 + retry hint beyond LIVE_MAX_CLIENTS)
+# and closed after LIVE_MAX_LIFETIME, the browser then reconnects and resumes.
+@route('/instruments/stream', methods=['GET'])
+def instruments_stream():
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
 
-        instruments_data.append(instrument_data)
+    if not live_feed.acquire():
+        # Worker full: back off longer than a normal reconnection
+        retry = int(live_feed.retry * 6)
+        return Response(f"retry: {retry * 1000}\n\n", status=503, mimetype="text/event-stream",
+                        headers={"Retry-After": str(retry), "Cache-Control": "no-cache"})
 
-    return jsonify(instruments_data)
+    response = Response(live_feed.stream(last_event_id), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    # Runs when the server closes the response, even if the stream was never iterated
+    response.call_on_close(live_feed.release)
+    return response
 
 
-# --- CSV export of time series with aggregation ---
-@app.route('/timeseries/<string:instrument_id>', methods=['GET'])
+# Admin-only: hit/miss counters and refresh latency of the /instruments snapshot cache
+@route('/api/cache/stats', methods=['GET'])
 @login_required
-def timeseries(instrument_id):
-    client = InfluxDBClient(url=inluxdb_url, token=token, org=org)
-    query_api = client.query_api()
-
-    # Parametri input
-    start_arg = request.args.get('start')
-    end_arg = request.args.get('end')
-    interval = int(request.args.get('interval', '10') or 10)
-    every = f"{interval}m"
-
+@admin_required
+def cache_stats():
+    return jsonify({
+        "instruments": instruments_cache.stats(),
+        "windows": window_cache.stats() if window_cache is not None else None,
+        "registry": registry.stats(),
+        "users": user_cache.stats(),
+        "login": dict(hasher.stats(), **throttle.stats()),
+        "live_clients": live_feed.clients,
+    })
+
+
+# Prometheus scrape endpoint (no session): bearer METRICS_TOKEN, not served at all without one
+@route('/metrics', methods=['GET'])
+def metrics():
+    if not METRICS_TOKEN:
+        abort(404)
+    if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {METRICS_TOKEN}"):
+        abort(401)
+    body, content_type = telemetry.exposition()
+    return Response(body, content_type=content_type)
+
+
+# Streaming CSV export: reads Influx in time-ordered chunks aligned to the
+# aggregation interval, aggregates each chunk and yields its CSV rows.
+# Only one chunk is held in memory; the cumulative rain correction and the last
+# emitted window are carried over between chunks, so the rows (empty windows
+# across chunk boundaries included) are those of the non-streamed export.
+def stream_timeseries_csv(query_api, instrument_id, start_dt, end_dt, interval):
+    start = start_dt.replace(tzinfo=None)
+    end = end_dt.replace(tzinfo=None)
+    origin = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    windows_per_chunk = max(1, (TIMESERIES_CHUNK_HOURS * 60) // interval)
+    step = timedelta(minutes=interval * windows_per_chunk)
+
+    # Fixed header for every chunk, from the field keys seen in the whole range
+    fields_query = f"""
+    import "influxdata/influxdb/schema"
+    schema.fieldKeys(
+      bucket: "{bucket}",
+      predicate: (r) => r["topic"] == "{instrument_id}" and r._measurement == "mqtt_data",
+      start: {flux_time(start)},
+      stop: {flux_time(end)}
+    )
+    """
+    fields = sorted({rec.get_value() for table in query_api.query(fields_query, org=org, name="field_keys")
+                     for rec in table.records})
+    columns = ["time"] + [f for f in fields if f not in aggregation_cfg["excluded"]]
+
+    yield ",".join(columns) + "\n"
+
+    state = {}
+    chunk_start = start
+    while chunk_start < end:
+        # Chunk edges fall on window edges, so no window is split across chunks
+        chunk_end = min(end, origin + ((chunk_start - origin) // step + 1) * step)
+        tables = query_api.query(
+            raw_timeseries_query(bucket, instrument_id, flux_time(chunk_start), flux_time(chunk_end)), org=org,
+            name="timeseries_stream_chunk")
+        with telemetry.phase("records_to_rows"):
+            rows = records_to_rows(tables)
+        chunk_start = chunk_end
+        if rows:
+            with telemetry.phase("aggregate"):
+                df_agg = utils.aggregate_weather(pd.DataFrame(rows), interval, aggregation_cfg,
+                                                 state=state, origin=pd.Timestamp(origin, tz="UTC"))
+            with telemetry.phase("serialize"):
+                out = StringIO()
+                df_agg.reindex(columns=columns).to_csv(out, index=False, header=False)
+            yield out.getvalue()
+
+
+# Time window of a /timeseries request: start/end (epoch seconds or ISO, default last 3h) and interval (minutes)
+def timeseries_window_args(args):
     now_ts = int(time.time())
 
     def parse_time(val, default_ts):
         if not val:
             return datetime.utcfromtimestamp(default_ts)
+        if isinstance(val, (int, float)):
+            return datetime.utcfromtimestamp(int(val))
         if val.isdigit():
             return datetime.utcfromtimestamp(int(val))
         return dateparser.parse(val)
 
-    start_dt = parse_time(start_arg, now_ts - 10800)
-    end_dt = parse_time(end_arg, now_ts)
+    start_dt = parse_time(args.get('start'), now_ts - 10800)
+    end_dt = parse_time(args.get('end'), now_ts)
+    interval = int(args.get('interval', '10') or 10)
+    return start_dt, end_dt, interval
+
+
+# Export format of a request: format (default csv) and Parquet compression, validated.
+# Returns (fmt, compression, error): error is the 400 response to return, or None
+def export_format_args(args):
+    fmt = (args.get('format') or 'csv').lower()
+    compression = (args.get('compression') or '').lower() or None
+    if fmt not in export.FORMATS:
+        error = f"Unsupported format '{fmt}' (use {', '.join(export.FORMATS)})"
+    elif compression and compression not in export.PARQUET_CODECS:
+        error = f"Unsupported compression '{compression}'"
+    else:
+        return fmt, compression, None
+    return fmt, compression, (jsonify({"error": error}), 400)
+
+
+# Windowed (not yet finished) frame of one instrument over [start_dt, end_dt); empty when there is no data.
+# Picks the cheapest path: rollup tiers, Flux pushdown, or raw points windowed in pandas.
+def timeseries_windows(query_api, instrument_id, start_dt, end_dt, interval):
     start_iso = start_dt.replace(tzinfo=None).isoformat() + "Z"
     end_iso = end_dt.replace(tzinfo=None).isoformat() + "Z"
 
-    instrument = db.session.get(Instrument, instrument_id)
+    # Rollup pre-aggregati: il tier più grosso compatibile con l'intervallo richiesto
+    tier = rollups.pick_tier(interval) if ROLLUPS_ENABLED else None
+    if tier:
+        store = rollups.InfluxRollupStore(query_api, org, bucket, rollup_bucket=rollup_bucket)
+        windows = rollups.fetch_windows(store, instrument_id, tier, start_dt.replace(tzinfo=None),
+                                        end_dt.replace(tzinfo=None), interval, aggregation_cfg)
+        if windows is not None:
+            return windows
 
-    if not instrument:
-        return jsonify({"error": "Instrument not found"}), 404
+    if flux_planner.can_push_down(interval, aggregation_cfg):
+        # Aggregazione eseguita in Influx (aggregateWindow), pandas solo per i campi non numerici
+        return flux_planner.fetch_windows(query_api, org, bucket, instrument_id, start_iso, end_iso,
+                                          interval, aggregation_cfg)
 
     # Query grezza: tutti i dati, senza aggregateWindow
-    query = f"""
-    from(bucket: "{bucket}")
-      |> range(start: {start_iso}, stop: {end_iso})
-      |> filter(fn: (r) => r["topic"] == "{instrument_id}")
-      |> filter(fn: (r) => r._measurement == "mqtt_data")
-      |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
-      |> sort(columns: ["_time"])
-    """
+    tables = query_api.query(raw_timeseries_query(bucket, instrument_id, start_iso, end_iso), org=org,
+                             name="timeseries_raw")
+    with telemetry.phase("records_to_rows"):
+        rows = records_to_rows(tables)
+    if not rows:
+        return pd.DataFrame()
+
+    # Finestre in pandas: inline per le richieste piccole,
+    # su un pool di processi (fuori dal GIL del worker web) oltre la soglia
+    with telemetry.phase("window"):
+        if AGGREGATION_POOL_SIZE > 1 and len(rows) >= AGGREGATION_PARALLEL_MIN_ROWS:
+            return utils.window_weather_parallel(pd.DataFrame(rows), interval, aggregation_cfg,
+                                                 aggregation_pool(), AGGREGATION_POOL_SIZE)
+        return utils.window_weather(pd.DataFrame(rows), interval, aggregation_cfg)
+
+
+# timeseries_windows behind the window cache: closed days come from disk when the interval allows it
+def cached_timeseries_windows(query_api, instrument_id, start_dt, end_dt, interval):
+    if window_cache is not None and window_cache.covers(interval):
+        return window_cache.windows(
+            lambda a, b: timeseries_windows(query_api, instrument_id, a, b, interval),
+            instrument_id, interval, start_dt.replace(tzinfo=None), end_dt.replace(tzinfo=None),
+            aggregation_cfg["hash"], data_versions.get(instrument_id))
+    return timeseries_windows(query_api, instrument_id, start_dt, end_dt, interval)
+
+
+# Chunk edges for progress reporting: every TIMESERIES_CHUNK_HOURS, on window edges counted from
+# the epoch (so no window is split), or the whole range when the interval does not divide a day
+def timeseries_chunks(start_dt, end_dt, interval):
+    start, end = start_dt.replace(tzinfo=None), end_dt.replace(tzinfo=None)
+    if 1440 % interval:
+        return [(start, end)]
+    step = timedelta(minutes=interval * max(1, (TIMESERIES_CHUNK_HOURS * 60) // interval))
+    epoch = datetime(1970, 1, 1)
+    chunks, chunk_start = [], start
+    while chunk_start < end:
+        chunk_end = min(end, epoch + ((chunk_start - epoch) // step + 1) * step)
+        chunks.append((chunk_start, chunk_end))
+        chunk_start = chunk_end
+    return chunks
+
+
+# Aggregated frame of one instrument over [start_dt, end_dt), or None when there is no data.
+# With progress (export jobs) the windows are fetched chunk by chunk, calling progress(fraction);
+# the result is the same, the finishing step always runs once over the whole range.
+def aggregated_timeseries(query_api, instrument_id, start_dt, end_dt, interval, progress=None):
+    if progress is None:
+        windows = cached_timeseries_windows(query_api, instrument_id, start_dt, end_dt, interval)
+    else:
+        chunks = timeseries_chunks(start_dt, end_dt, interval)
+        pieces = []
+        for done, (chunk_start, chunk_end) in enumerate(chunks, 1):
+            piece = cached_timeseries_windows(query_api, instrument_id, chunk_start, chunk_end, interval)
+            if not piece.empty:
+                pieces.append(piece)
+            progress(done / len(chunks))
+        windows = pd.concat(pieces).sort_index() if pieces else pd.DataFrame()
 
-    tables = query_api.query(query, org=org)
+    if windows.empty:
+        return None
+    with telemetry.phase("finish"):
+        return utils.finish_weather_windows(windows, interval, aggregation_cfg)
 
-    # Ricostruisci DataFrame
-    rows = []
-    for table in tables:
-        for rec in table.records:
-            vals = dict(rec.values)
-            row = {"time": vals.get("_time")}
-            for k, v in vals.items():
-                if not k.startswith("_") and k not in ("result", "table", "topic", "_measurement", "_start", "_stop"):
-                    row[k] = v
-            rows.append(row)
 
-    if not rows:
+# --- CSV export of time series with aggregation ---
+@route('/timeseries/<string:instrument_id>', methods=['GET'])
+@login_required
+def timeseries(instrument_id):
+    query_api = influx.query_api()
+
+    # Parametri input
+    start_dt, end_dt, interval = timeseries_window_args(request.args)
+    start_iso = start_dt.replace(tzinfo=None).isoformat() + "Z"
+    end_iso = end_dt.replace(tzinfo=None).isoformat() + "Z"
+
+    instrument = registry.get(instrument_id)
+
+    if not instrument:
+        return jsonify({"error": "Instrument not found"}), 404
+
+    stream = request.args.get('stream', '').lower() in ('1', 'true', 'yes')
+    fmt, compression, error = export_format_args(request.args)
+    if error:
+        return error
+    if stream and fmt != 'csv':
+        return jsonify({"error": "stream=1 is only available for CSV"}), 400
+
+    # Intervallo chiuso (fine nel passato): il risultato cambia solo con un backfill (/upload_influx),
+    # ETag dai parametri e dalla versione dei dati dello strumento, 304 prima di interrogare Influx
+    # se il client ha già questa versione; max-age breve, poi il client rivalida
+    closed = end_dt.replace(tzinfo=None) < datetime.utcnow() - timedelta(seconds=HTTP_CLOSED_RANGE_MARGIN)
+    etag = None
+    if closed:
+        etag = http_cache.fingerprint(instrument_id, start_iso, end_iso, interval, stream, fmt, compression,
+                                      aggregation_cfg["hash"], data_versions.get(instrument_id))
+        cache_control = f"private, max-age={HTTP_TIMESERIES_MAX_AGE}"
+        if http_cache.not_modified(etag):
+            return http_cache.not_modified_response(etag, cache_control)
+
+    # Export in streaming: blocchi temporali, memoria limitata indipendentemente dal range
+    if stream:
+        fname = f"{instrument_id}_aggregated_{interval}m.csv"
+        response = Response(stream_timeseries_csv(query_api, instrument_id, start_dt, end_dt, interval),
+                            mimetype="text/csv",
+                            headers={"Content-Disposition": f"attachment;filename={fname}"})
+        if closed:
+            response.set_etag(etag, weak=True)
+            response.headers["Cache-Control"] = cache_control
+        return response
+
+    df_agg = aggregated_timeseries(query_api, instrument_id, start_dt, end_dt, interval)
+    if df_agg is None:
         return jsonify({"error": "No data found"}), 404
 
-    df = pd.DataFrame(rows)
+    # Esportazione: CSV (default), Parquet o Arrow IPC
+    with telemetry.phase("serialize"):
+        body, mimetype, ext = export.render(df_agg, fmt, compression)
+    fname = f"{instrument_id}_aggregated_{interval}m.{ext}"
+
+    response = Response(body, mimetype=mimetype,
+                        headers={"Content-Disposition": f"attachment;filename={fname}"})
+    if not closed:
+        # Intervallo aperto: nuovi dati possono arrivare, si rivalida sempre sul contenuto
+        etag, cache_control = http_cache.fingerprint(response.get_data()), "private, no-cache"
+    return http_cache.cacheable(response, etag, cache_control)
+
+
+# Process pool for large aggregations (spawned lazily: no fork of a threaded web worker)
+_aggregation_pool = None
+_aggregation_pool_lock = threading.Lock()
+
+
+def aggregation_pool():
+    global _aggregation_pool
+    with _aggregation_pool_lock:
+        if _aggregation_pool is None:
+            _aggregation_pool = ProcessPoolExecutor(max_workers=AGGREGATION_POOL_SIZE,
+                                                    mp_context=multiprocessing.get_context("spawn"))
+        return _aggregation_pool
+
 
-    # Applica la funzione di aggregazione intelligente
-    df_agg = utils.aggregate_weather(df, interval, aggregation_cfg)
+# Bounded pool shared by all batch exports (created lazily, after any worker fork)
+_batch_pool = None
+_batch_pool_lock = threading.Lock()
 
-    # Esportazione CSV
-    out = StringIO()
-    df_agg.to_csv(out, index=False)
-    out.seek(0)
-    fname = f"{instrument_id}_aggregated_{interval}m.csv"
 
-    return Response(out.getvalue(), mimetype="text/csv",
-                    headers={"Content-Disposition": f"attachment;filename={fname}"})
+def batch_pool():
+    global _batch_pool
+    with _batch_pool_lock:
+        if _batch_pool is None:
+            _batch_pool = ThreadPoolExecutor(max_workers=BATCH_EXPORT_WORKERS, thread_name_prefix="batch-export")
+        return _batch_pool
+
+
+# Fetch + aggregate several instruments concurrently; yields (id, df or None, timing) as each completes
+def batch_timeseries(instrument_ids, start_dt, end_dt, interval):
+    query_api = influx.query_api()
+
+    def run(instrument_id):
+        started = time.perf_counter()
+        try:
+            df = aggregated_timeseries(query_api, instrument_id, start_dt, end_dt, interval)
+            error = None
+        except Exception as e:
+            df, error = None, str(e)
+        timing = {"seconds": round(time.perf_counter() - started, 3), "rows": 0 if df is None else len(df)}
+        if error:
+            timing["error"] = error
+        return instrument_id, df, timing
+
+    futures = [batch_pool().submit(run, instrument_id) for instrument_id in instrument_ids]
+    try:
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        # Client gone or error: drop the stations not started yet
+        for future in futures:
+            future.cancel()
+
+
+# --- Multi-instrument export: one window, many stations ---
+# ids (comma-separated or JSON list), start/end/interval as /timeseries,
+# layout=zip (default, one file per station, streamed) or long (single file keyed by instrument),
+# format=csv|parquet|arrow for the files. Per-station timings: timings.json in the ZIP,
+# and the app log in both layouts (not a header: it grows with the number of stations).
+@route('/api/timeseries/batch', methods=['GET', 'POST'])
+@login_required
+def timeseries_batch():
+    args = request.get_json(silent=True) or request.values
+    ids = ','.join(args.getlist('ids')) if hasattr(args, 'getlist') else args.get('ids') or []
+    if isinstance(ids, str):
+        ids = [i.strip() for i in ids.split(',') if i.strip()]
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        return jsonify({"error": "No instrument ids"}), 400
+    if len(ids) > BATCH_EXPORT_MAX_INSTRUMENTS:
+        return jsonify({"error": f"Too many instruments (max {BATCH_EXPORT_MAX_INSTRUMENTS})"}), 400
+
+    start_dt, end_dt, interval = timeseries_window_args(args)
+    layout = (args.get('layout') or 'zip').lower()
+    if layout not in ('zip', 'long'):
+        return jsonify({"error": f"Unsupported layout '{layout}' (use zip, long)"}), 400
+    fmt, compression, error = export_format_args(args)
+    if error:
+        return error
+
+    missing = [i for i in ids if not registry.get(i)]
+    if missing:
+        return jsonify({"error": "Instrument not found", "ids": missing}), 404
+
+    stamp = f"{start_dt:%Y%m%d%H%M}_{end_dt:%Y%m%d%H%M}_{interval}m"
+    started = time.perf_counter()
+    logger = current_app.logger           # the ZIP generator runs outside the app context
+
+    if layout == 'long':
+        frames, timings = {}, {}
+        for instrument_id, df, timing in batch_timeseries(ids, start_dt, end_dt, interval):
+            timings[instrument_id] = timing
+            if df is not None:
+                frames[instrument_id] = df
+        logger.info("Batch export of %d instruments in %.2fs: %s",
+                    len(ids), time.perf_counter() - started, timings)
+        if not frames:
+            return jsonify({"error": "No data found", "timings": timings}), 404
+
+        body, mimetype, ext = export.render(export.long_frame({i: frames[i] for i in ids if i in frames}),
+                                            fmt, compression)
+        return Response(body, mimetype=mimetype, headers={
+            "Content-Disposition": f"attachment;filename=batch_{stamp}.{ext}",
+        })
+
+    def entries():
+        timings = {}
+        for instrument_id, df, timing in batch_timeseries(ids, start_dt, end_dt, interval):
+            timings[instrument_id] = timing
+            if df is not None:
+                body, _, ext = export.render(df, fmt, compression)
+                yield f"{instrument_id}_aggregated_{interval}m.{ext}", body
+        total = round(time.perf_counter() - started, 3)
+        logger.info("Batch export of %d instruments in %.2fs: %s", len(ids), total, timings)
+        yield "timings.json", json.dumps({"total_seconds": total, "instruments": timings}, indent=2)
+
+    return Response(export.zip_stream(entries()), mimetype="application/zip",
+                    headers={"Content-Disposition": f"attachment;filename=batch_{stamp}.zip"})
+
+
+# Background export jobs: results on local disk, shared by the web workers
+export_jobs = ExportJobs(
+    results_dir=os.getenv("EXPORT_RESULTS_DIR", "/tmp/exports"),
+    workers=int(os.getenv("EXPORT_JOB_WORKERS", 2)),
+    ttl=float(os.getenv("EXPORT_RESULT_TTL", 86400)),
+)
+
+
+# Worker of an export job, for every format: windows fetched chunk by chunk
+# (progress = share of the time range done), then finished and serialised once
+def run_export_job(params, path, progress):
+    query_api = influx.query_api()
+    start_dt, end_dt, interval = timeseries_window_args(params)
+    instrument_id = params["instrument_id"]
+
+    # Same path and output as /timeseries (rollups, pushdown, window cache) for every format;
+    # fetching is most of the work, serialisation gets the last 10% of the progress
+    df_agg = aggregated_timeseries(query_api, instrument_id, start_dt, end_dt, interval,
+                                   progress=lambda fraction: progress(0.9 * fraction))
+    if df_agg is None:
+        raise ValueError("No data found")
+    with telemetry.phase("serialize"):
+        body, _, _ = export.render(df_agg, params["format"], params.get("compression"))
+    with open(path, "wb") as fh:
+        fh.write(body)
+
+
+def export_job_json(status):
+    out = {k: status.get(k) for k in ("id", "status", "progress", "error", "size")}
+    out["status_url"] = url_for("export_job_status", job_id=status["id"])
+    if status["status"] == "done":
+        out["download_url"] = url_for("export_job_download", job_id=status["id"])
+    return out
+
+
+# Submit an export job; identical pending (or finished, not expired) requests share the same job
+@route('/api/exports', methods=['POST'])
+@login_required
+def submit_export_job():
+    args = request.get_json(silent=True) or request.values
+    instrument_id = args.get('instrument_id')
+    if not instrument_id or not registry.get(instrument_id):
+        return jsonify({"error": "Instrument not found"}), 404
+
+    start_dt, end_dt, interval = timeseries_window_args(args)
+    fmt, compression, error = export_format_args(args)
+    if error:
+        return error
+    if end_dt.replace(tzinfo=None) <= start_dt.replace(tzinfo=None):
+        return jsonify({"error": "end must be after start"}), 400
+
+    params = {
+        "instrument_id": instrument_id,
+        "start": start_dt.replace(tzinfo=None).isoformat() + "Z",
+        "end": end_dt.replace(tzinfo=None).isoformat() + "Z",
+        "interval": interval,
+        "format": fmt,
+        "compression": compression if fmt == "parquet" else None,
+        "config": aggregation_cfg["hash"],
+    }
+    status = export_jobs.submit(params, run_export_job, export.FORMATS[fmt][1])
+    return jsonify(export_job_json(status)), 202
+
+
+@route('/api/exports/<string:job_id>', methods=['GET'])
+@login_required
+def export_job_status(job_id):
+    status = export_jobs.status(job_id)
+    if not status:
+        return jsonify({"error": "Job not found or expired"}), 404
+    return jsonify(export_job_json(status))
+
+
+@route('/api/exports/<string:job_id>/download', methods=['GET'])
+@login_required
+def export_job_download(job_id):
+    path = export_jobs.result_path(job_id)
+    if not path:
+        return jsonify({"error": "Result not available"}), 404
+    status = export_jobs.status(job_id)
+    params = status["params"]
+    mimetype, ext = export.FORMATS[params["format"]]
+    fname = f"{params['instrument_id']}_aggregated_{params['interval']}m.{ext}"
+    return send_file(path, mimetype=mimetype, as_attachment=True, download_name=fname)
 
 
 # Dashboard view (HTML) – server-side provides instruments list; client JS enhances UI
-@app.route('/dashboard', methods=['GET'])
+@route('/dashboard', methods=['GET'])
 @login_required
 def dashboard():
-    instruments = db.session.query(Instrument).all()
+    instruments = registry.all()
 
     return render_template('dashboard.html', instruments=instruments, instrument_types=INSTRUMENT_TYPES)
 
 
 # JSON API to create instruments (accepts JSON or multipart form to include image)
-@app.route('/api/instruments', methods=['POST'])
+@route('/api/instruments', methods=['POST'])
 @login_required
 def api_create_instrument():
     is_json = request.is_json
@@ -558,7 +1207,7 @@ def api_create_instrument():
             db.session.rollback()
             return jsonify({"error": "Could not create instrument."}), 400
 
-        db.session.commit()
+        commit_instruments()
 
         return jsonify({
             "id": inst.id,
@@ -581,10 +1230,10 @@ def api_create_instrument():
 
 
 # JSON API to update/delete instruments without altering DB schema
-@app.route('/api/instruments/<string:instrument_id>', methods=['PATCH', 'PUT', 'DELETE'])
+@route('/api/instruments/<string:instrument_id>', methods=['PATCH', 'PUT', 'DELETE'])
 @login_required
 def api_instrument_detail(instrument_id):
-    instrument = db.session.get(Instrument, instrument_id)
+    inst = db.session.get(Instrument, instrument_id)
 
     if not inst:
         return jsonify({"error": "Instrument not found"}), 404
@@ -616,7 +1265,7 @@ def api_instrument_detail(instrument_id):
                 inst.image = filename
 
         try:
-            db.session.commit()
+            commit_instruments()
             return jsonify({"message": "Updated", "id": inst.id}), 200
         except IntegrityError:
             db.session.rollback()
@@ -624,12 +1273,12 @@ def api_instrument_detail(instrument_id):
 
     if request.method == 'DELETE':
         db.session.delete(inst)
-        db.session.commit()
+        commit_instruments()
         return jsonify({"message": "Deleted"}), 200
 
 
 # HTML form-based edit route (kept for current UI modal flow)
-@app.route('/edit/<instrument_id>', methods=['POST'])
+@route('/edit/<instrument_id>', methods=['POST'])
 @login_required
 def edit_instrument(instrument_id):
     data = {
@@ -645,7 +1294,7 @@ def edit_instrument(instrument_id):
     }
 
     if create_or_update_instrument(data, is_edit=True):
-        db.session.commit()
+        commit_instruments()
     else:
         db.session.rollback()
 
@@ -653,18 +1302,48 @@ def edit_instrument(instrument_id):
 
 
 # Delete route used by the HTML button (recommend making it POST-only with CSRF)
-@app.route('/delete/<instrument_id>', methods=['POST', 'GET'])
+@route('/delete/<instrument_id>', methods=['POST', 'GET'])
 @login_required
 def delete_instrument(instrument_id):
     instrument = db.session.get(Instrument, instrument_id)
     if instrument:
         db.session.delete(instrument)
-        db.session.commit()
+        commit_instruments()
     return redirect(url_for('dashboard'))
 
 
+# Datetime field values already stored for a topic in [start, stop) (upload dedup)
+def existing_datetimes(query_api, topic_value, start, stop):
+    query = f'''
+    from(bucket: "{bucket}")
+    |> range(start: {flux_time(start)}, stop: {flux_time(stop)})
+    |> filter(fn: (r) => r._measurement == "mqtt_data")
+    |> filter(fn: (r) => r["topic"] == "{topic_value}")
+    |> filter(fn: (r) => r._field == "Datetime")
+    |> keep(columns: ["_value"])
+    '''
+    tables = query_api.query(query, org=org, name="existing_datetimes")
+    return {record.get_value() for table in tables for record in table.records}
+
+
+# After points were written into the past of a topic: rebuild the rollup windows they fall in
+# (the downsampler only rolls up newer windows) and bump its data version, which retires
+# its window cache entries and the ETags of its closed-range /timeseries responses
+def backfilled(influx_client, topic, first, last):
+    if ROLLUPS_ENABLED:
+        store = rollups.InfluxRollupStore(influx.query_api(), org, bucket, rollup_bucket=rollup_bucket,
+                                          write_api=influx_client.write_api(write_options=SYNCHRONOUS))
+        try:
+            rollups.Downsampler(store, aggregation_cfg).rebuild(
+                topic, first.tz_convert(None).to_pydatetime(),
+                last.tz_convert(None).to_pydatetime() + timedelta(seconds=1))
+        except Exception as e:
+            current_app.logger.exception("Rollup rebuild for %s failed: %s", topic, e)
+    data_versions.bump(topic)
+
+
 # CSV upload to InfluxDB to backfill measurement points for a specific topic
-@app.route("/upload_influx", methods=["POST"])
+@route("/upload_influx", methods=["POST"])
 @login_required
 def upload_influx():
     file = request.files.get("file")
@@ -678,63 +1357,127 @@ def upload_influx():
     if "Datetime" not in df.columns:
         return jsonify({"error": "Missing 'Datetime' column in the uploaded file."}), 400
     
-    influx_client = InfluxDBClient(url=inluxdb_url, token=token, org=org)
-    write_api = influx_client.write_api()
-    query_api = influx_client.query_api()
-
-    # For each row, check for an existing point around the timestamp, then insert if new
-    inserted_count = 0
-    for _, row in df.iterrows():
-        datetime_value = row["Datetime"]
-        t0 = datetime.fromisoformat(datetime_value.replace("Z", "+00:00"))
-        start_range = (t0 - timedelta(seconds=1)).isoformat().replace("+00:00", "Z")
-        end_range = (t0 + timedelta(seconds=1)).isoformat().replace("+00:00", "Z")
-
-        query = f'''
-        from(bucket: "{bucket}") 
-        |> range(start: {start_range}, stop: {end_range})
-        |> filter(fn: (r) => r._measurement == "mqtt_data") 
-        |> filter(fn: (r) => r["topic"] == "{topic_value}")
-        '''
-        tables = query_api.query(query, org=org)
-
-        exists = any(
-            record.get_field() == "Datetime" and record.get_value() == datetime_value
-            for table in tables
-            for record in table.records
-        )
-
-        if exists:
-            continue
-        
-        # Accept numeric and string fields only; write point with timestamp
-        fields = {
-            key: value
-            for key, value in row.items()
-            if isinstance(value, (int, float, str))
-        }
-        point = {
-                "measurement": "mqtt_data",
-                "tags": {"topic": topic_value},
-                "fields": fields,
-                "time": datetime_value
-        }
-        write_api.write(bucket=bucket, org=org, record=point)
-        inserted_count += 1
-    
-    return jsonify({"inserted_count": inserted_count}), 200
+    started = time.perf_counter()
+    try:
+        timestamps = pd.to_datetime(df["Datetime"], utc=True)
+    except (ValueError, TypeError):
+        return jsonify({"error": "Invalid values in 'Datetime' column."}), 400
+
+    influx_client = influx.get_client()
+
+    # One range query for the file's time span, then set-based dedup in memory
+    existing = existing_datetimes(influx.query_api(), topic_value,
+                                  timestamps.min() - timedelta(seconds=1),
+                                  timestamps.max() + timedelta(seconds=1))
+    is_new = ~df["Datetime"].isin(existing) & ~df["Datetime"].duplicated()
+    new_rows = df[is_new.to_numpy()]
+    skipped_count = int(len(df) - len(new_rows))
+
+    # Accept numeric and string fields only; point time comes from Datetime
+    points = new_rows.select_dtypes(include=["number", "object"]).copy()
+    points["topic"] = topic_value
+    points.index = pd.DatetimeIndex(timestamps[is_new.to_numpy()])
+
+    failed = {"count": 0}
+
+    # Runs on the write API's batching thread, outside the app context
+    def on_error(conf, data, exception):
+        lines = data.decode() if isinstance(data, bytes) else data
+        failed["count"] += lines.count("\n") + 1
+        log.error("Upload batch write for %s failed: %s", topic_value, exception)
+
+    # Batched line-protocol writes; closing the write API flushes the last batch
+    with influx_client.write_api(write_options=UPLOAD_WRITE_OPTIONS, error_callback=on_error) as write_api:
+        if not points.empty:
+            write_api.write(bucket=bucket, org=org, record=points,
+                            data_frame_measurement_name="mqtt_data",
+                            data_frame_tag_columns=["topic"])
+
+    inserted_count = len(points) - failed["count"]
+    if inserted_count > 0:
+        backfilled(influx_client, topic_value, timestamps[is_new.to_numpy()].min(),
+                   timestamps[is_new.to_numpy()].max())
+
+    elapsed = time.perf_counter() - started
+    return jsonify({
+        "inserted_count": inserted_count,
+        "skipped_count": skipped_count,
+        "failed_count": failed["count"],
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(len(df) / elapsed, 1) if elapsed > 0 else None,
+    }), 200
 
 
 # Logout route to clear session and return to homepage
-@app.route('/logout')
+@route('/logout')
 @login_required
 def logout():
     logout_user()
     return redirect(url_for('index'))
 
 
-# App entry point: ensure DB tables exist and start development server
+# Application factory: configuration, extensions and routes.
+# Production: gunicorn -c gunicorn.conf.py "app:create_app()" (see gunicorn.conf.py);
+# tables are created once with `flask --app "app:create_app()" init-db`, not at startup.
+def create_app(config=None):
+    app = Flask(__name__)
+
+    # Core configuration (secrets, DB, uploads, formats)
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['UPLOAD_FOLDER'] = os.getenv('UPLOAD_FOLDER')
+    app.config['ALLOWED_EXTENSIONS'] = set((os.getenv('ALLOWED_EXTENSIONS') or '').split(','))
+    app.config.update(config or {})
+
+    # Initialize extensions (DB, migrations, session manager); password hashing is in passwords.py
+    db.init_app(app)
+    migrate.init_app(app, db)
+    login_manager.init_app(app)
+
+    for rule, options, view in _routes:
+        app.add_url_rule(rule, view_func=view, **options)
+
+    # Per-route latency for /metrics; registered first so it runs last and includes compression
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response):
+        started = g.get("request_started")
+        if started is not None:
+            route_rule = request.url_rule.rule if request.url_rule else "unmatched"
+            telemetry.HTTP_REQUEST_SECONDS.labels(route_rule, request.method, response.status_code).observe(
+                time.perf_counter() - started)
+        return response
+
+    # Compress JSON/CSV/HTML responses (gzip, or brotli when available)
+    app.after_request(http_cache.compress_response)
+
+    # The snapshot cache refreshes from background threads: give it this app's context
+    instruments_cache.loader = partial(load_instruments_snapshot, app)
+
+    # Instrument registry invalidations from other processes (LISTEN thread, started per worker)
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    listen_dsn = make_url(uri).set(drivername="postgresql").render_as_string(hide_password=False) \
+        if uri and uri.startswith("postgres") else None
+
+    @app.before_request
+    def start_registry_listener():
+        registry.listen(listen_dsn)
+
+    @app.cli.command("init-db")
+    def init_db():
+        """Create missing database tables."""
+        db.create_all()
+
+    return app
+
+
+# Development server (debugger on, single process): ensure DB tables exist and start
 if __name__ == '__main__':
+    app = create_app()
     with app.app_context():
         db.create_all()
     app.run(debug=True, host='0.0.0.0', port=8088)
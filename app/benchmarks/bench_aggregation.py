@@ -0,0 +1,81 @@
+"""
+Micro-benchmarks of the time-series aggregation on synthetic Davis frames.
+
+    cd app && python benchmarks/bench_aggregation.py [--rows 10000 100000 1000000] [--interval 10] [--strings]
+
+For each frame size it times the current utils.aggregate_weather against the
+original implementation (tests/legacy_utils.py) and checks that both return
+the same frame. The first phase alone (utils.window_weather, one resample
+for all column classes) is timed against the per-class resampling it
+replaced, and ensure_monotonic_progressive against the original Python loop
+on a series of the same length. Best of --repeat runs.
+
+The frames hold numeric fields only unless --strings adds a text field
+(BatteryStatus): pd.to_numeric over a text column then dominates both
+implementations alike.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.dirname(HERE), os.path.join(os.path.dirname(HERE), "tests")]
+
+import legacy_utils  # noqa: E402
+import utils  # noqa: E402
+from config.loader import load_aggregation_config  # noqa: E402
+from fake_influx import synthetic_frame  # noqa: E402
+
+
+def best_of(repeat, fn, *args):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def report(title, rows, current, original):
+    print(f"{title:<28} {rows:>9,} rows  current {current * 1000:9.1f} ms  "
+          f"original {original * 1000:9.1f} ms  speedup x{original / current:5.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--interval", type=int, default=10, help="aggregation interval (minutes)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--strings", action="store_true", help="keep the text field in the frames")
+    args = parser.parse_args()
+
+    cfg = load_aggregation_config()
+    for rows in args.rows:
+        frame = synthetic_frame(rows=rows)
+        if not args.strings:
+            frame = frame.drop(columns=["BatteryStatus"])
+
+        current, out = best_of(args.repeat, utils.aggregate_weather, frame, args.interval, cfg)
+        original, expected = best_of(args.repeat, legacy_utils.aggregate_weather, frame, args.interval, cfg)
+        pd.testing.assert_frame_equal(out, expected, check_exact=True)
+        report(f"aggregate_weather {args.interval}m", rows, current, original)
+
+        current, out = best_of(args.repeat, utils.window_weather, frame, args.interval, cfg)
+        original, expected = best_of(args.repeat, legacy_utils.window_weather_per_class, frame, args.interval, cfg)
+        pd.testing.assert_frame_equal(out, expected, check_exact=True)
+        report(f"window_weather {args.interval}m", rows, current, original)
+
+        series = pd.Series(frame["RainDay"].to_numpy(), index=frame["time"])
+        current, out = best_of(args.repeat, utils.ensure_monotonic_progressive, series)
+        original, expected = best_of(args.repeat, legacy_utils.ensure_monotonic_progressive, series)
+        assert np.array_equal(out.to_numpy(), expected.to_numpy())
+        report("ensure_monotonic_progressive", rows, current, original)
+
+
+if __name__ == "__main__":
+    main()
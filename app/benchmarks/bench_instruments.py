@@ -0,0 +1,176 @@
+"""
+Requests per second on GET /instruments against a stand-in InfluxDB
+(influx_stub.py), before and after the shared Influx client.
+
+    cd app && python benchmarks/bench_instruments.py [--instruments 50] [--threads 8] [--seconds 5] [--latency 5]
+
+The app runs in a child process (werkzeug threaded server, SQLite with
+--instruments stations) and is loaded by --threads keep-alive clients for
+--seconds per mode:
+
+- per-request client : a new InfluxDBClient opened and closed for every
+                       query, as before influx.py (snapshot cache bypassed)
+- shared client      : influx.query_api(), one pooled client per process
+                       (snapshot cache bypassed: one Influx query per request)
+- shared + cache     : the production path, snapshot served from memory
+                       (loaded once while waiting for the server)
+
+For each mode it prints req/s, p50/p95 latency, and the queries and TCP
+connections the stand-in Influx received.
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.dirname(HERE), HERE]
+
+from influx_stub import InfluxStub  # noqa: E402
+
+MODES = ("per-request client", "shared client", "shared + cache")
+
+
+def configure(influx_url, db_path):
+    """Environment read by app.py / influx.py at import time (must run before importing them)."""
+    os.environ.update({
+        "INFLUXDB_URL": influx_url, "INFLUXDB_TOKEN": "bench", "INFLUXDB_ORG": "bench",
+        "INFLUXDB_BUCKET": "bench", "DATABASE_URL": f"sqlite:///{db_path}", "SECRET_KEY": "bench",
+        "WINDOW_CACHE_DIR": "", "ROLLUPS_ENABLED": "0", "LIVE_POLL_INTERVAL": "3600",
+    })
+    os.environ.pop("INSTRUMENTS_CACHE_FILE", None)
+    os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+
+
+def seed(count):
+    import app as webapp
+    from models import Instrument, db
+
+    flask_app = webapp.create_app()
+    with flask_app.app_context():
+        db.create_all()
+        for i in range(count):
+            db.session.add(Instrument(f"station-{i}", f"Station {i}", None, None, "bench", None, 45.0 + i / 100,
+                                      9.0 + i / 100, "TempOut, HumOut, Barometer, WindSpeed", "weather_station"))
+        db.session.commit()
+    return [f"station-{i}" for i in range(count)]
+
+
+def serve(mode, port):
+    from influxdb_client import InfluxDBClient
+    from werkzeug.serving import make_server
+
+    import app as webapp
+    import influx
+
+    flask_app = webapp.create_app()
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    if mode != "shared + cache":
+        # Every request loads the snapshot itself, as before the snapshot cache
+        webapp.instruments_cache.get = lambda: webapp.load_instruments_snapshot(flask_app)
+
+    if mode == "per-request client":
+        class PerRequestClient:
+            def query(self, query, org=None, **kwargs):
+                cfg = influx.settings()
+                with InfluxDBClient(url=cfg["url"], token=cfg["token"], org=cfg["org"],
+                                    timeout=cfg["timeout"]) as client:
+                    return client.query_api().query(query, org=org, **kwargs)
+
+        influx.query_api = lambda: influx.TimedQueryApi(PerRequestClient())
+        webapp.influx = influx
+
+    make_server("127.0.0.1", port, flask_app, threaded=True).serve_forever()
+
+
+def wait_ready(url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up")
+
+
+def load(url, threads, seconds):
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + seconds
+
+    def client():
+        session = requests.Session()
+        mine = []
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            response = session.get(url)
+            if response.status_code != 200:
+                with lock:
+                    errors[0] += 1
+                continue
+            mine.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(mine)
+
+    workers = [threading.Thread(target=client) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    latencies.sort()
+    return latencies, errors[0]
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--instruments", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=8, help="concurrent HTTP clients")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--latency", type=float, default=5, help="stand-in Influx latency (ms)")
+    parser.add_argument("--port", type=int, default=18088)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-instruments-")
+    stub = InfluxStub([], latency=args.latency / 1000)
+    configure(stub.url, os.path.join(workdir, "bench.db"))
+    stub.topics = seed(args.instruments)
+    stub.start()
+
+    url = f"http://127.0.0.1:{args.port}/instruments"
+    context = multiprocessing.get_context("fork")
+    print(f"{args.instruments} instruments, {args.threads} clients, {args.seconds:g}s per mode, "
+          f"Influx latency {args.latency:g} ms")
+    try:
+        for mode in MODES:
+            server = context.Process(target=serve, args=(mode, args.port), daemon=True)
+            server.start()
+            try:
+                wait_ready(url)
+                queries, connections = stub.queries, stub.connections
+                latencies, errors = load(url, args.threads, args.seconds)
+            finally:
+                server.terminate()
+                server.join()
+            print(f"{mode:<20} {len(latencies) / args.seconds:8.1f} req/s  "
+                  f"p50 {percentile(latencies, 0.5) * 1000:7.1f} ms  p95 {percentile(latencies, 0.95) * 1000:7.1f} ms  "
+                  f"influx queries {stub.queries - queries:6d}  connections {stub.connections - connections:6d}"
+                  + (f"  errors {errors}" if errors else ""))
+    finally:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Where to put AGGREGATION_PARALLEL_MIN_ROWS: inline window_weather against
+window_weather_parallel on a process pool, across frame sizes and pool sizes.
+
+    cd app && python benchmarks/bench_parallel.py [--rows 20000 50000 ...] [--workers 2 4] [--interval 10]
+
+The pools are created (spawn, like app.aggregation_pool) and warmed up
+before timing, so the figures are the steady state of a web worker: chunk
+pickling, the per-process work and the final concat. For each pool size the
+script prints the smallest row count where the pool beats the inline path;
+if there is one on the production host (the result depends on its cores and
+on what else runs there), enable the pool with a small AGGREGATION_POOL_SIZE
+(it is per gunicorn worker) and set AGGREGATION_PARALLEL_MIN_ROWS a little
+above it. Best of --repeat runs; both paths are checked to return the same
+frame.
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.dirname(HERE), os.path.join(os.path.dirname(HERE), "tests")]
+
+import utils  # noqa: E402
+from config.loader import load_aggregation_config  # noqa: E402
+from fake_influx import synthetic_frame  # noqa: E402
+
+
+def best_of(repeat, fn, *args):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+",
+                        default=[20_000, 50_000, 100_000, 200_000, 500_000, 1_000_000, 2_000_000])
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({2, 4, os.cpu_count() or 1} - {0, 1}) or [2])
+    parser.add_argument("--interval", type=int, default=10, help="aggregation interval (minutes)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    cfg = load_aggregation_config()
+    print(f"{os.cpu_count()} CPUs, interval {args.interval}m")
+
+    pools = {}
+    for workers in args.workers:
+        pools[workers] = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        warm = synthetic_frame(rows=2000).drop(columns=["BatteryStatus"])
+        utils.window_weather_parallel(warm, args.interval, cfg, pools[workers], workers)
+
+    crossover = {}
+    try:
+        for rows in args.rows:
+            frame = synthetic_frame(rows=rows).drop(columns=["BatteryStatus"])
+            inline, expected = best_of(args.repeat, utils.window_weather, frame, args.interval, cfg)
+            line = f"{rows:>10,} rows  inline {inline * 1000:8.1f} ms"
+            for workers, pool in pools.items():
+                parallel, out = best_of(args.repeat, utils.window_weather_parallel,
+                                        frame, args.interval, cfg, pool, workers)
+                pd.testing.assert_frame_equal(out[expected.columns], expected, check_freq=False, rtol=1e-9)
+                line += f"  | {workers} procs {parallel * 1000:8.1f} ms x{inline / parallel:4.2f}"
+                if parallel < inline:
+                    crossover.setdefault(workers, rows)
+            print(line)
+    finally:
+        for pool in pools.values():
+            pool.shutdown()
+
+    for workers in pools:
+        if workers in crossover:
+            print(f"{workers} procs: faster than inline from {crossover[workers]:,} rows")
+        else:
+            print(f"{workers} procs: never faster than inline up to {max(args.rows):,} rows")
+
+
+if __name__ == "__main__":
+    main()
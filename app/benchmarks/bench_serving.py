@@ -0,0 +1,233 @@
+"""
+Load test of the serving setup: concurrent SSE clients on /instruments/stream
+while logged-in clients download /timeseries, under gunicorn
+(gunicorn.conf.py) and under the single-process development server.
+
+    cd app && python benchmarks/bench_serving.py [--sse 0 8 32] [--clients 4] [--seconds 10] [--workers 2]
+
+Both servers run the real app against SQLite and a stand-in InfluxDB
+(influx_stub.py). /timeseries uses a 7-minute interval, so every request
+takes the raw-points pandas path (no pushdown, rollups or window cache).
+SSE clients that get a 503 (LIVE_MAX_CLIENTS reached) retry after one
+second, like a browser with a short retry: hint.
+
+For each server and number of SSE clients it prints /timeseries req/s,
+p50/p95 latency and errors (failed logins included), the SSE streams open
+at the end, the 503 answers received, and how long the server took to exit
+after SIGTERM with the streams still connected. --max-streams above
+--threads shows the behaviour without the stream cap.
+
+The streams end at once on SIGTERM, but gunicorn then closes each of their
+connections in turn, waiting up to 2 s for the client to close its side
+(requests, like many browsers, keeps the idle socket open): expect about
+2 s x streams per worker, well below graceful_timeout.
+"""
+
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(HERE)
+sys.path[:0] = [APP_DIR, HERE]
+
+from influx_stub import InfluxStub  # noqa: E402
+
+USERNAME, PASSWORD = "bench", "bench-password"
+DEV_SERVER = "import app; app.create_app().run(host='127.0.0.1', port={port}, threaded=True)"
+
+
+def environment(influx_url, db_path, port, workers, threads, max_streams):
+    env = dict(os.environ)
+    env.update({
+        "INFLUXDB_URL": influx_url, "INFLUXDB_TOKEN": "bench", "INFLUXDB_ORG": "bench",
+        "INFLUXDB_BUCKET": "bench", "DATABASE_URL": f"sqlite:///{db_path}", "SECRET_KEY": "bench",
+        "WINDOW_CACHE_DIR": "", "ROLLUPS_ENABLED": "0", "BCRYPT_ROUNDS": "4", "LIVE_POLL_INTERVAL": "2",
+        "WEB_BIND": f"127.0.0.1:{port}", "WEB_WORKERS": str(workers), "WEB_THREADS": str(threads),
+        "LIVE_MAX_CLIENTS": str(max_streams),
+    })
+    for name in ("INSTRUMENTS_CACHE_FILE", "PROMETHEUS_MULTIPROC_DIR"):
+        env.pop(name, None)
+    return env
+
+
+def seed(env, instruments):
+    script = f"""
+import app
+from models import Instrument, User, db
+flask_app = app.create_app()
+with flask_app.app_context():
+    db.create_all()
+    user = User(username={USERNAME!r})
+    user.set_password({PASSWORD!r})
+    db.session.add(user)
+    for i in range({instruments}):
+        db.session.add(Instrument(f"station-{{i}}", f"Station {{i}}", None, None, "bench", None, 45.0, 9.0,
+                                  "TempOut, HumOut, Barometer, WindSpeed", "weather_station"))
+    db.session.commit()
+"""
+    subprocess.run([sys.executable, "-c", script], cwd=APP_DIR, env=env, check=True)
+
+
+def start_server(kind, env, port):
+    if kind == "gunicorn":
+        command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:create_app()"]
+    else:
+        command = [sys.executable, "-c", DEV_SERVER.format(port=port)]
+    return subprocess.Popen(command, cwd=APP_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_ready(base, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(f"{base}/login", timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"{base} did not come up")
+
+
+def login(base):
+    session = requests.Session()
+    response = session.post(f"{base}/login", json={"username": USERNAME, "password": PASSWORD}, timeout=30)
+    response.raise_for_status()
+    return session
+
+
+class SseClient(threading.Thread):
+    def __init__(self, base, stop):
+        super().__init__(daemon=True)
+        self.base, self.stop = base, stop
+        self.open = False
+        self.rejected = 0
+        self.events = 0
+
+    def run(self):
+        while not self.stop.is_set():
+            try:
+                with requests.get(f"{self.base}/instruments/stream", stream=True, timeout=(5, 30)) as response:
+                    if response.status_code == 503:
+                        self.rejected += 1
+                        self.stop.wait(1)
+                        continue
+                    self.open = True
+                    for line in response.iter_lines():
+                        if self.stop.is_set():
+                            break
+                        if line.startswith(b"event:"):
+                            self.events += 1
+            except requests.RequestException:
+                self.stop.wait(1)
+            finally:
+                self.open = False
+
+
+def timeseries_load(base, clients, seconds, instrument):
+    now = int(time.time())
+    url = f"{base}/timeseries/{instrument}?start={now - 6 * 3600}&end={now}&interval=7"
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + seconds
+
+    def client():
+        mine = []
+        try:
+            session = login(base)
+        except requests.RequestException:
+            with lock:
+                errors[0] += 1
+            return
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            try:
+                ok = session.get(url, timeout=30).status_code == 200
+            except requests.RequestException:
+                ok = False
+            if not ok:
+                with lock:
+                    errors[0] += 1
+                continue
+            mine.append(time.perf_counter() - started)
+        session.close()
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    return latencies, errors[0]
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sse", type=int, nargs="+", default=[0, 8, 32], help="concurrent SSE clients")
+    parser.add_argument("--clients", type=int, default=4, help="concurrent /timeseries clients")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("--threads", type=int, default=8, help="gunicorn threads per worker")
+    parser.add_argument("--max-streams", type=int, default=4,
+                        help="LIVE_MAX_CLIENTS; set it above --threads to see SSE starving /timeseries")
+    parser.add_argument("--rows", type=int, default=360, help="raw points per /timeseries request")
+    parser.add_argument("--latency", type=float, default=5, help="stand-in Influx latency (ms)")
+    parser.add_argument("--port", type=int, default=18089)
+    args = parser.parse_args()
+
+    stub = InfluxStub(["station-0"], latency=args.latency / 1000, rows=args.rows).start()
+    env = environment(stub.url, os.path.join(tempfile.mkdtemp(prefix="bench-serving-"), "bench.db"),
+                      args.port, args.workers, args.threads, args.max_streams)
+    seed(env, instruments=10)
+    stub.topics = [f"station-{i}" for i in range(10)]
+    base = f"http://127.0.0.1:{args.port}"
+
+    print(f"/timeseries: {args.clients} clients, {args.rows} raw rows per request, {args.seconds:g}s per run; "
+          f"gunicorn {args.workers} workers x {args.threads} threads, {args.max_streams} SSE streams per process")
+    try:
+        for kind in ("gunicorn", "dev server"):
+            for sse in args.sse:
+                server = start_server(kind, env, args.port)
+                stop = threading.Event()
+                streams = []
+                try:
+                    wait_ready(base)
+                    streams = [SseClient(base, stop) for _ in range(sse)]
+                    for stream in streams:
+                        stream.start()
+                    time.sleep(1)
+                    latencies, errors = timeseries_load(base, args.clients, args.seconds, "station-0")
+                    open_streams = sum(s.open for s in streams)
+                    rejected = sum(s.rejected for s in streams)
+                finally:
+                    # Shutdown time with the streams still connected (graceful_timeout under gunicorn)
+                    stopping = time.perf_counter()
+                    server.send_signal(signal.SIGTERM)
+                    try:
+                        server.wait(timeout=60)
+                    except subprocess.TimeoutExpired:
+                        server.kill()
+                    shutdown = time.perf_counter() - stopping
+                    stop.set()
+                print(f"{kind:<11} sse {sse:3d}  timeseries {len(latencies) / args.seconds:7.1f} req/s  "
+                      f"p50 {percentile(latencies, 0.5) * 1000:7.1f} ms  p95 {percentile(latencies, 0.95) * 1000:7.1f} ms  "
+                      f"errors {errors:3d}  | streams open {open_streams:3d}  503s {rejected:4d}  "
+                      f"shutdown {shutdown:5.1f}s")
+    finally:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
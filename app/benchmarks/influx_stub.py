@@ -0,0 +1,101 @@
+"""
+Stand-in InfluxDB HTTP server for the load benchmarks.
+
+Answers POST /api/v2/query with annotated CSV, like InfluxDB 2 does, so the
+real influxdb_client (connection pool, CSV parser) is exercised end to end:
+
+- queries with last()       : one record per (topic, field), current time
+- any other query           : `rows` pivoted points (one column per field, as
+                              raw_timeseries_query returns them) of the first
+                              topic, one minute apart, ending now
+
+Every answer is delayed by `latency` seconds (network + query time of a
+real server). Keep-alive is supported (HTTP/1.1), so pooled clients reuse
+their connections; `connections` counts the TCP connections accepted.
+"""
+
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import sleep
+
+LAST_HEADER = ("#datatype,string,long,dateTime:RFC3339,dateTime:RFC3339,dateTime:RFC3339,double,string,string,string\n"
+               "#group,false,false,true,true,false,false,true,true,true\n"
+               "#default,_result,,,,,,,,\n"
+               ",result,table,_start,_stop,_time,_value,_field,_measurement,topic\n")
+
+FIELDS = ("TempOut", "HumOut", "Barometer", "WindSpeed", "WindDir", "RainRate", "RainDay")
+
+
+def _iso(dt):
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class InfluxStub:
+    def __init__(self, topics, latency=0.005, rows=180, fields=FIELDS, port=0):
+        self.topics = list(topics)
+        self.latency = latency
+        self.rows = rows
+        self.fields = fields
+        self.queries = 0
+        self.connections = 0
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                stub.connections += 1
+
+            def do_POST(self):
+                query = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode("utf-8", "replace")
+                stub.queries += 1
+                sleep(stub.latency)
+                body = stub.answer(query).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/csv; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, name="influx-stub", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def answer(self, query):
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        start, stop = _iso(now - timedelta(hours=3)), _iso(now)
+        if "last()" in query:
+            lines = [LAST_HEADER]
+            table = 0
+            for topic in self.topics:
+                for i, field in enumerate(self.fields):
+                    lines.append(f",,{table},{start},{stop},{stop},{20.0 + i},{field},mqtt_data,{topic}\n")
+                    table += 1
+            return "".join(lines) + "\n"
+
+        count = len(self.fields)
+        lines = ["#datatype,string,long,dateTime:RFC3339,dateTime:RFC3339,dateTime:RFC3339,string,string"
+                 + ",double" * count + "\n",
+                 "#group,false,false,true,true,false,true,true" + ",false" * count + "\n",
+                 "#default,_result,,,,,," + "," * count + "\n",
+                 ",result,table,_start,_stop,_time,_measurement,topic," + ",".join(self.fields) + "\n"]
+        for n in range(self.rows):
+            ts = _iso(now - timedelta(minutes=self.rows - n))
+            values = ",".join(str(20.0 + i + n % 7) for i in range(count))
+            lines.append(f",,0,{start},{stop},{ts},mqtt_data,{self.topics[0]},{values}\n")
+        return "".join(lines) + "\n"
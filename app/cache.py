@@ -0,0 +1,217 @@
+"""
+In-process snapshot cache with TTL and stale-while-revalidate.
+
+Used to serve the /instruments live snapshot without hitting Influx on every
+page load:
+- fresh   (age < ttl)            : served from memory.
+- stale   (age < ttl + stale_ttl): served from memory, one background refresh started.
+- expired / empty                : the caller loads it; concurrent callers wait for
+                                   that single load instead of running their own.
+
+mark_stale() makes the current snapshot stale without dropping it (next get()
+serves it and refreshes in the background); invalidate() drops it.
+
+If a file path is given the snapshot is also written there (JSON, atomic
+replace) so several worker processes on the same host share one copy.
+
+TTLCache is the keyed variant for small per-entity lookups (e.g. the session
+user): entries expire after `ttl`, can be invalidated one by one, and the
+oldest are dropped beyond `max_entries`.
+"""
+
+import json
+import os
+import threading
+import time
+
+
+class SnapshotCache:
+    def __init__(self, loader, ttl=60, stale_ttl=300, path=None, name="snapshot"):
+        self.loader = loader
+        self.ttl = float(ttl)
+        self.stale_ttl = float(stale_ttl)
+        self.path = path
+        self.name = name
+
+        self._value = None
+        self._loaded_at = None
+        self._stale_before = None              # snapshots loaded before this are stale
+        self._lock = threading.Lock()          # single-flight guard for loads
+        self._refreshing = False
+        self._stats = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "refreshes": 0,
+            "refresh_errors": 0,
+            "refresh_seconds_total": 0.0,
+            "last_refresh_seconds": 0.0,
+        }
+
+    # --- public API ---
+    def get(self):
+        """Return the cached snapshot, loading or refreshing it as needed."""
+        self._adopt_shared()
+        age = self._age()
+
+        if age is not None and age < self.ttl:
+            self._stats["hits"] += 1
+            return self._value
+
+        if age is not None and age < self.ttl + self.stale_ttl:
+            self._stats["stale_hits"] += 1
+            value = self._value
+            self._refresh_in_background()
+            return value
+
+        self._stats["misses"] += 1
+        with self._lock:
+            # Another thread may have loaded it while we were waiting
+            self._adopt_shared()
+            age = self._age()
+            if age is not None and age < self.ttl:
+                return self._value
+            self._refresh()
+        return self._value
+
+    def invalidate(self):
+        """Drop the snapshot (memory and shared file) so the next get() reloads it."""
+        with self._lock:
+            self._value = None
+            self._loaded_at = None
+            if self.path:
+                try:
+                    os.remove(self.path)
+                except FileNotFoundError:
+                    pass
+
+    def mark_stale(self):
+        """Keep serving the snapshot, but refresh it (in the background) on the next get()."""
+        self._stale_before = time.time()
+
+    def stats(self):
+        out = dict(self._stats)
+        out["age_seconds"] = self._age()
+        return out
+
+    # --- internals ---
+    def _age(self):
+        if self._loaded_at is None:
+            return None
+        age = time.time() - self._loaded_at
+        if self._stale_before is not None and self._loaded_at <= self._stale_before:
+            return max(age, self.ttl)
+        return age
+
+    def _refresh(self):
+        """Run the loader (caller holds the lock) and publish the result."""
+        started = time.perf_counter()
+        try:
+            value = self.loader()
+        except Exception:
+            self._stats["refresh_errors"] += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self._stats["refreshes"] += 1
+            self._stats["refresh_seconds_total"] += elapsed
+            self._stats["last_refresh_seconds"] = elapsed
+
+        self._value = value
+        self._loaded_at = time.time()
+        self._write_shared()
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                with self._lock:
+                    if self._age() is not None and self._age() < self.ttl:
+                        return
+                    self._refresh()
+            except Exception as e:
+                print(f"[{self.name}] background refresh failed: {e}")
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name=f"{self.name}-refresh", daemon=True).start()
+
+    def _adopt_shared(self):
+        """Pick up a newer snapshot written by another process, if any."""
+        if not self.path:
+            return
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if self._loaded_at is not None and mtime <= self._loaded_at:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as fh:
+                payload = json.load(fh)
+            self._value = payload["value"]
+            self._loaded_at = float(payload["loaded_at"])
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def _write_shared(self):
+        if not self.path:
+            return
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump({"loaded_at": self._loaded_at, "value": self._value}, fh, default=str)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"[{self.name}] could not write shared snapshot: {e}")
+
+
+class TTLCache:
+    def __init__(self, loader, ttl=60, max_entries=10000, name="ttl"):
+        self.loader = loader                   # key -> value (None is not cached)
+        self.ttl = float(ttl)
+        self.max_entries = max_entries
+        self.name = name
+
+        self._entries = {}                     # key -> (expires_at, value), insertion ordered
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._stats["hits"] += 1
+                return entry[1]
+            self._stats["misses"] += 1
+
+        value = self.loader(key)
+        if value is not None:
+            with self._lock:
+                self._entries.pop(key, None)
+                self._entries[key] = (now + self.ttl, value)
+                while len(self._entries) > self.max_entries:
+                    self._entries.pop(next(iter(self._entries)))
+        return value
+
+    def invalidate(self, key=None):
+        """Drop one entry (or all of them)."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+            self._stats["invalidations"] += 1
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._stats)
+            out["size"] = len(self._entries)
+        lookups = out["hits"] + out["misses"]
+        out["hit_rate"] = round(out["hits"] / lookups, 4) if lookups else None
+        return out
@@ -1,17 +1,25 @@
 
+# "heartbeat": campo usato da alert.py come segnale di vita della stazione
+# "check_interval": secondi tra due controlli di stato (default CHECK_INTERVAL)
 INSTRUMENT_TYPES = {
     "ws_on": {
         "name": "Stazione Meteorologica",
         "variables": ["TempOut", "HumOut", "WindSpeed", "WindDir", "RainRate", "Barometer"],
+        "heartbeat": "TempOut",
     },
-    "ws_off": {"name": "Stazione Meteorologica - off", "variables": []},
-    "radar_off": {"name": "Radar Meteorologico", "variables": ["Precipitation"]},
-    "tidegauge_off": {"name": "Mareografo", "variables": ["SeaLevel"]},
+    "ws_off": {"name": "Stazione Meteorologica - off", "variables": [], "heartbeat": "TempOut"},
+    "radar_off": {"name": "Radar Meteorologico", "variables": ["Precipitation"], "heartbeat": "Precipitation"},
+    "tidegauge_off": {"name": "Mareografo", "variables": ["SeaLevel"], "heartbeat": "SeaLevel"},
     "wavebuoy_off": {"name": "Ondametro", "variables": []},
     "mooring_off": {"name": "Mooring", "variables": []},
     "owbuoy_off": {"name": "Boa Meteo-Oceanografica", "variables": []},
     "hf_off": {"name": "HF Radar", "variables": []},
-    "glider_off": {"name": "Glider", "variables": ["Temp", "Salt", "Depth", "Turbidity", "Oxygen", "Nitrates"]},
+    "glider_off": {
+        "name": "Glider",
+        "variables": ["Temp", "Salt", "Depth", "Turbidity", "Oxygen", "Nitrates"],
+        "heartbeat": "Temp",
+        "check_interval": 300,
+    },
 }
 
 AIRLINK_VARIABLES = ["pm_2p5_nowcast", "pm_1", "pm_10_nowcast", "aqi_nowcast_val"]
@@ -30,3 +38,17 @@ def variables_for(instrument_type: str, has_airlink: bool) -> str:
     seen = set()
     deduped = [v for v in all_vars if not (v in seen or seen.add(v))]
     return ", ".join(deduped)
+
+
+def heartbeat_field(instrument_type: str, has_airlink: bool):
+    """
+    Campo che indica che lo strumento sta trasmettendo: quello del tipo,
+    altrimenti una variabile AirLink per i dispositivi solo AirLink,
+    altrimenti None (qualsiasi campo).
+    """
+    field = INSTRUMENT_TYPES.get(instrument_type, {}).get("heartbeat")
+    if field:
+        return field
+    if has_airlink:
+        return AIRLINK_VARIABLES[0]
+    return None
@@ -1,14 +1,21 @@
+import hashlib
 import yaml
 from pathlib import Path
 
+from config.units import compile_units
+
 CONFIG_PATH = Path(__file__).with_name("aggregation.yaml")
 
 def load_aggregation_config():
-    with open(CONFIG_PATH, "r", encoding="utf-8") as fh:
-        data = yaml.safe_load(fh) or {}
+    raw = CONFIG_PATH.read_bytes()
+    data = yaml.safe_load(raw) or {}
     return {
+        # Fingerprint of aggregation.yaml: changes whenever aggregated output may change
+        "hash": hashlib.sha256(raw).hexdigest(),
         "excluded": set(data.get("excluded_columns", [])),
         "rain": set(data.get("rain_columns", [])),
         "wind": set(data.get("wind_columns", [])),
-        "units": data.get("units", {})
+        "units": data.get("units", {}),
+        "conversions": compile_units(data.get("units", {})),
+        "pushdown": bool(data.get("flux_pushdown", False))
     }
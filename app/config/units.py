@@ -0,0 +1,48 @@
+"""
+Registro delle conversioni di unità usate in aggregation.yaml (sezione "units").
+
+Ogni conversione è una funzione vettoriale su array NumPy (nessuna chiamata
+Python per riga). La sezione "units" viene compilata una sola volta al
+caricamento della configurazione in una lista di (colonna, funzione).
+"""
+
+CONVERSIONS = {
+    "ftoc": lambda a: (a - 32) * 5.0 / 9.0,        # Fahrenheit → Celsius
+    "ctof": lambda a: a * 9.0 / 5.0 + 32,          # Celsius → Fahrenheit
+    "ctok": lambda a: a + 273.15,                  # Celsius → Kelvin
+    "ktoc": lambda a: a - 273.15,                  # Kelvin → Celsius
+    "inhg_to_hpa": lambda a: a * 33.8639,          # pollici di mercurio → hPa
+    "mps_to_kmh": lambda a: a * 3.6,               # m/s → km/h
+    "kmh_to_mps": lambda a: a / 3.6,               # km/h → m/s
+    "mph_to_mps": lambda a: a * 0.44704,           # miglia/h → m/s
+    "mph_to_kmh": lambda a: a * 1.609344,          # miglia/h → km/h
+    "knots_to_kmh": lambda a: a * 1.852,           # nodi → km/h
+    "in_to_mm": lambda a: a * 25.4,                # pollici → mm
+}
+
+
+def _scale(factor):
+    return lambda a: a * factor
+
+
+def compile_units(units: dict) -> list:
+    """
+    Compila la sezione "units" in una lista di (colonna, funzione vettoriale).
+    Solleva ValueError per conversioni sconosciute o fattori non numerici,
+    invece di ignorarli in silenzio a ogni export.
+    """
+    compiled = []
+    for col, uconf in (units or {}).items():
+        uconf = uconf or {}
+        if "convert" in uconf:
+            name = str(uconf["convert"]).lower()
+            if name not in CONVERSIONS:
+                raise ValueError(f"Unknown unit conversion '{uconf['convert']}' for column '{col}'")
+            compiled.append((col, CONVERSIONS[name]))
+        elif "factor" in uconf:
+            try:
+                factor = float(uconf["factor"])
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid conversion factor {uconf['factor']!r} for column '{col}'")
+            compiled.append((col, _scale(factor)))
+    return compiled
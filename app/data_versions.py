@@ -0,0 +1,45 @@
+"""
+Per-instrument data versions, shared by the web workers through a directory.
+
+A topic's version changes whenever points are written into its past
+(/upload_influx backfills). Results derived from closed time ranges are
+keyed on it, so none of them outlives a backfill:
+
+- window cache entries (window_cache.py)
+- the ETag of closed-range /timeseries responses
+
+Live MQTT points land in the open day, which is never cached, and do not
+change the version.
+
+Each version is a small file (<dir>/<sha1 of the topic>) holding an opaque
+token, replaced atomically. A topic that was never backfilled has version "0".
+"""
+
+import hashlib
+import os
+import time
+
+
+class DataVersions:
+    def __init__(self, path):
+        self.path = path
+
+    def _file(self, topic):
+        return os.path.join(self.path, hashlib.sha1(topic.encode()).hexdigest())
+
+    def get(self, topic):
+        try:
+            with open(self._file(topic), encoding="utf-8") as fh:
+                return fh.read().strip() or "0"
+        except OSError:
+            return "0"
+
+    def bump(self, topic):
+        """Give the topic a new version (after writing points into its past)."""
+        os.makedirs(self.path, exist_ok=True)
+        version = f"{time.time_ns():x}.{os.getpid()}"
+        tmp = f"{self._file(topic)}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.write(version)
+        os.replace(tmp, self._file(topic))
+        return version
@@ -0,0 +1,52 @@
+import time
+import os
+from datetime import timedelta
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+from influxdb_client.client.write_api import SYNCHRONOUS
+
+import influx
+from config.loader import load_aggregation_config
+from rollups import Downsampler, InfluxRollupStore
+
+load_dotenv()
+
+# General variables
+DOWNSAMPLE_INTERVAL = int(os.getenv("DOWNSAMPLE_INTERVAL", 60))        # seconds between passes
+ROLLUP_BACKFILL_DAYS = int(os.getenv("ROLLUP_BACKFILL_DAYS", 30))
+ROLLUP_LAG_MINUTES = int(os.getenv("ROLLUP_LAG_MINUTES", 2))            # grace for late points
+
+# Load environment variables
+org = os.getenv("INFLUXDB_ORG")
+bucket = os.getenv("INFLUXDB_BUCKET")
+rollup_bucket = os.getenv("INFLUXDB_ROLLUP_BUCKET") or bucket
+db_url = os.getenv('DATABASE_URL')
+
+# Postgres engine
+engine = create_engine(db_url)
+
+# InfluxDB client (shared, see influx.py); rollups are written synchronously in batches
+client = influx.get_client()
+store = InfluxRollupStore(
+    influx.query_api(), org, bucket,
+    rollup_bucket=rollup_bucket,
+    write_api=client.write_api(write_options=SYNCHRONOUS),
+    lookback_days=ROLLUP_BACKFILL_DAYS,
+)
+downsampler = Downsampler(
+    store, load_aggregation_config(),
+    backfill=timedelta(days=ROLLUP_BACKFILL_DAYS),
+    lag=timedelta(minutes=ROLLUP_LAG_MINUTES),
+)
+
+
+def list_topics():
+    with engine.connect() as connection:
+        return [row[0] for row in connection.execute(text("SELECT id FROM instruments"))]
+
+
+while True:
+    started = time.time()
+    written = downsampler.run_once(list_topics())
+    print(f"Rollups updated in {time.time() - started:.1f}s: {written}")
+    time.sleep(DOWNSAMPLE_INTERVAL)
@@ -0,0 +1,174 @@
+"""
+Query planner that pushes /timeseries aggregation down into InfluxDB.
+
+Based on aggregation.yaml, numeric fields are windowed by Flux itself:
+- normal columns and RainRate       : aggregateWindow(fn: mean)
+- cumulative rain (RainDay, ...)    : aggregateWindow(fn: last)
+- wind (WindSpeed + WindDir)        : mean of the u/v components
+so Influx returns one row per window instead of every raw sample.
+Non-numeric fields cannot be pushed down: they are fetched raw and windowed
+by pandas (utils.window_weather). Both outputs then go through the same
+utils.finish_weather_windows step as the pure pandas path.
+"""
+
+import pandas as pd
+
+import utils
+
+MINUTES_PER_DAY = 1440
+
+# Columns of a Flux record that are not data fields
+META_COLUMNS = {"result", "table", "topic", "_measurement", "_start", "_stop", "_time", "_field", "_value"}
+
+
+def flux_string_array(values):
+    """Render a Python list of names as a Flux array literal: ["a", "b"]."""
+    return "[" + ", ".join('"' + str(v).replace('\\', '\\\\').replace('"', '\\"') + '"' for v in values) + "]"
+
+
+def flux_time(dt):
+    """Naive-UTC (or aware) datetime as a Flux RFC3339 literal."""
+    return dt.replace(tzinfo=None).isoformat() + "Z"
+
+
+def raw_timeseries_query(bucket, instrument_id, start_iso, stop_iso):
+    """Flux for the raw (pivoted, time-sorted) points of one topic in [start, stop)."""
+    return f"""
+    from(bucket: "{bucket}")
+      |> range(start: {start_iso}, stop: {stop_iso})
+      |> filter(fn: (r) => r["topic"] == "{instrument_id}")
+      |> filter(fn: (r) => r._measurement == "mqtt_data")
+      |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
+      |> sort(columns: ["_time"])
+    """
+
+
+def records_to_rows(tables):
+    """Flatten pivoted Flux records into {"time": ..., field: value} rows."""
+    rows = []
+    for table in tables:
+        for rec in table.records:
+            vals = dict(rec.values)
+            row = {"time": vals.get("_time")}
+            for k, v in vals.items():
+                if not k.startswith("_") and k not in ("result", "table", "topic", "_measurement", "_start", "_stop"):
+                    row[k] = v
+            rows.append(row)
+    return rows
+
+
+def can_push_down(interval_minutes, cfg):
+    """
+    Push down only when enabled in config and when Flux windows (aligned to the
+    epoch) coincide with pandas bins (aligned to midnight of the first day).
+    """
+    return bool(cfg.get("pushdown")) and interval_minutes > 0 and MINUTES_PER_DAY % interval_minutes == 0
+
+
+def _source(bucket, instrument_id, start_iso, stop_iso, cfg):
+    return f"""from(bucket: "{bucket}")
+  |> range(start: {start_iso}, stop: {stop_iso})
+  |> filter(fn: (r) => r["topic"] == "{instrument_id}")
+  |> filter(fn: (r) => r._measurement == "mqtt_data")
+  |> filter(fn: (r) => not contains(value: r._field, set: {flux_string_array(sorted(cfg["excluded"]))}))"""
+
+
+def pushdown_query(bucket, instrument_id, start_iso, stop_iso, interval_minutes, cfg):
+    """Flux returning one pivoted row per window for every numeric field."""
+    every = f"{interval_minutes}m"
+    last_cols = flux_string_array(utils.cumulative_rain_columns(cfg))
+    window = f'aggregateWindow(every: {every}, fn: {{fn}}, timeSrc: "_start", createEmpty: false)'
+
+    return f"""
+import "math"
+import "types"
+
+data = {_source(bucket, instrument_id, start_iso, stop_iso, cfg)}
+  |> filter(fn: (r) => types.isNumeric(v: r._value))
+  |> toFloat()
+
+means = data
+  |> filter(fn: (r) => not contains(value: r._field, set: {last_cols}))
+  |> {window.format(fn="mean")}
+
+lasts = data
+  |> filter(fn: (r) => contains(value: r._field, set: {last_cols}))
+  |> {window.format(fn="last")}
+
+wind = data
+  |> filter(fn: (r) => r._field == "WindSpeed" or r._field == "WindDir")
+  |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+  |> filter(fn: (r) => exists r.WindSpeed and exists r.WindDir)
+
+wind_u = wind
+  |> map(fn: (r) => ({{r with _field: "{utils.WIND_U}", _value: r.WindSpeed * math.sin(x: r.WindDir * math.pi / 180.0)}}))
+  |> group(columns: ["topic", "_field"])
+  |> {window.format(fn="mean")}
+
+wind_v = wind
+  |> map(fn: (r) => ({{r with _field: "{utils.WIND_V}", _value: r.WindSpeed * math.cos(x: r.WindDir * math.pi / 180.0)}}))
+  |> group(columns: ["topic", "_field"])
+  |> {window.format(fn="mean")}
+
+union(tables: [means, lasts, wind_u, wind_v])
+  |> group(columns: ["topic"])
+  |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+  |> sort(columns: ["_time"])
+"""
+
+
+def fallback_query(bucket, instrument_id, start_iso, stop_iso, cfg):
+    """Flux returning the raw (pivoted) points of the fields that cannot be pushed down."""
+    return f"""
+import "types"
+
+{_source(bucket, instrument_id, start_iso, stop_iso, cfg)}
+  |> filter(fn: (r) => not types.isNumeric(v: r._value))
+  |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+  |> sort(columns: ["_time"])
+"""
+
+
+def windows_frame(tables, interval_minutes):
+    """Windowed Flux result as a DataFrame indexed by window start (UTC)."""
+    rows = []
+    for table in tables:
+        for rec in table.records:
+            row = {k: v for k, v in rec.values.items() if k not in META_COLUMNS}
+            row["time"] = rec.values.get("_time")
+            rows.append(row)
+    if not rows:
+        return pd.DataFrame()
+
+    df = pd.DataFrame(rows)
+    # The first window is truncated to the range start: label it with its full-window start
+    df["time"] = pd.to_datetime(df["time"], utc=True).dt.floor(f"{interval_minutes}min")
+    return df.set_index("time").sort_index()
+
+
+def fetch_windows(query_api, org, bucket, instrument_id, start_iso, stop_iso, interval_minutes, cfg):
+    """
+    Run the pushdown plan and return the windowed frame expected by
+    utils.finish_weather_windows (empty if there is no data).
+    """
+    windows = windows_frame(
+        query_api.query(pushdown_query(bucket, instrument_id, start_iso, stop_iso, interval_minutes, cfg), org=org,
+                        name="pushdown"),
+        interval_minutes,
+    )
+
+    fallback_rows = records_to_rows(query_api.query(fallback_query(bucket, instrument_id, start_iso, stop_iso, cfg),
+                                                    org=org, name="pushdown_fallback"))
+    if fallback_rows:
+        windows = windows.combine_first(utils.window_weather(pd.DataFrame(fallback_rows), interval_minutes, cfg))
+
+    if windows.empty:
+        return windows
+
+    # Wind fields present but never sampled together: the pandas path yields NaN too
+    if {"WindSpeed", "WindDir"}.issubset(windows.columns) and utils.WIND_U not in windows.columns:
+        windows[utils.WIND_U] = float("nan")
+        windows[utils.WIND_V] = float("nan")
+
+    # Same column order as the raw pivot used by the pandas path
+    return windows[sorted(windows.columns)]
@@ -0,0 +1,105 @@
+"""
+Gunicorn settings for the production `web` service:
+
+    gunicorn -c gunicorn.conf.py "app:create_app()"
+
+- Several worker processes, each with a thread pool (gthread): slow Influx
+  queries and exports do not block the other requests. An SSE client
+  (/instruments/stream) holds one thread for as long as it is connected, so
+  LIVE_MAX_CLIENTS (default 4) must stay well below WEB_THREADS: further
+  clients get 503 and retry later, and streams end after LIVE_MAX_LIFETIME
+  so browsers reconnect and spread over the workers.
+- Shutdown/recycling: post_worker_init makes open streams close as soon as
+  the worker stops accepting requests (SIGTERM, HUP, max_requests), and
+  closes idle keep-alive connections on SIGTERM, so restarts are not held
+  up for graceful_timeout by SSE clients or idle browsers.
+- preload_app: the application is imported once in the master and forked,
+  so workers start fast and share the read-only memory. Anything holding
+  sockets (SQLAlchemy pool, Influx client) is opened lazily in each worker;
+  post_fork drops any DB connection the master may have opened.
+- Graceful restarts: SIGHUP starts new workers and lets the old ones finish
+  their requests within graceful_timeout; max_requests recycles workers
+  periodically (with jitter, so they do not all restart together).
+- Per-process state (snapshot cache, live feed poller, aggregation pool when
+  AGGREGATION_POOL_SIZE enables it) is duplicated in every worker: keep
+  WEB_WORKERS modest and prefer threads, or share the snapshot through
+  INSTRUMENTS_CACHE_FILE.
+- Metrics: with PROMETHEUS_MULTIPROC_DIR set, every worker writes its
+  histograms there and /metrics aggregates them; the directory is emptied
+  when the master starts and dead workers are marked (telemetry.py).
+
+Configuration (env)
+-------------------
+- WEB_BIND (default 0.0.0.0:8088), WEB_WORKERS (default CPUs + 1),
+  WEB_THREADS (8), WEB_TIMEOUT (120), WEB_GRACEFUL_TIMEOUT (30),
+  WEB_MAX_REQUESTS (2000), WEB_KEEPALIVE (5)
+"""
+
+import multiprocessing
+import os
+import shutil
+
+bind = os.getenv("WEB_BIND", "0.0.0.0:8088")
+workers = int(os.getenv("WEB_WORKERS", multiprocessing.cpu_count() + 1))
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", 8))
+preload_app = True
+
+timeout = int(os.getenv("WEB_TIMEOUT", 120))
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("WEB_KEEPALIVE", 5))
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", 2000))
+max_requests_jitter = max_requests // 10
+
+accesslog = "-"
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    # DB connections inherited from the master must not be shared between processes
+    # (the Influx client in influx.py already re-creates itself after a fork)
+    from models import db
+
+    app = worker.app.wsgi()
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    # Open SSE streams end once this worker stops accepting requests; SIGTERM wakes them at once
+    import signal
+    from app import live_feed
+
+    live_feed.accepting = lambda: worker.alive
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def close_idle():
+        # gthread (gunicorn >= 26) waits for idle keep-alive connections too, and only
+        # expires them when another event wakes its loop: drop them now
+        for conn in list(worker.keepalived_conns) + list(worker.pending_conns):
+            conn.timeout = 0
+        worker.murder_keepalived()
+        worker.murder_pending()
+
+    def handle_term(sig, frame):
+        previous(sig, frame)
+        live_feed.wake()
+        if hasattr(worker, "method_queue"):
+            worker.method_queue.defer(close_idle)
+
+    signal.signal(signal.SIGTERM, handle_term)
+
+
+def on_starting(server):
+    # Metric files of a previous run would be added to the new counters
+    multiproc_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if multiproc_dir:
+        shutil.rmtree(multiproc_dir, ignore_errors=True)
+        os.makedirs(multiproc_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,106 @@
+"""
+HTTP caching and compression helpers.
+
+- Weak ETags built from a content/parameter fingerprint, with 304 handling
+  for If-None-Match (weak comparison, so compressed and identity variants
+  share the tag).
+- Response compression negotiated from Accept-Encoding: brotli when the
+  optional `brotli` package is installed and accepted, otherwise gzip.
+  Streamed responses are gzip-compressed on the fly; Server-Sent Events are
+  never compressed (it would buffer the live feed).
+
+Configuration (env)
+-------------------
+- COMPRESS_MIN_SIZE : smallest body (bytes) worth compressing (default 1024)
+- COMPRESS_LEVEL    : gzip level 1-9 (default 6)
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import zlib
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", 6))
+COMPRESSIBLE_TYPES = {"application/json", "text/csv", "text/html", "text/plain", "text/css",
+                      "application/javascript", "text/javascript"}
+
+
+def fingerprint(*parts):
+    """Stable hash of JSON-serialisable parts (bytes are hashed as-is)."""
+    h = hashlib.sha1()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else json.dumps(part, sort_keys=True, default=str).encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def not_modified(etag):
+    """True if the client already holds this representation."""
+    return request.if_none_match.contains_weak(etag)
+
+
+def not_modified_response(etag, cache_control):
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = cache_control
+    return response
+
+
+def cacheable(response, etag, cache_control):
+    """Attach validators/policy and turn the response into a 304 when the client is current."""
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = cache_control
+    if response.status_code == 200 and not_modified(etag):
+        return not_modified_response(etag, cache_control)
+    return response
+
+
+def _gzip_stream(chunks):
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk if isinstance(chunk, bytes) else chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def compress_response(response):
+    """after_request hook: compress eligible responses according to Accept-Encoding."""
+    if (response.status_code != 200
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    accepted = request.accept_encodings
+    response.vary.add("Accept-Encoding")
+
+    if response.is_streamed:
+        if accepted.quality("gzip") > 0:
+            response.response = _gzip_stream(response.response)
+            response.headers["Content-Encoding"] = "gzip"
+            response.headers.pop("Content-Length", None)
+        return response
+
+    if response.direct_passthrough:
+        return response
+
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+
+    if brotli is not None and accepted.quality("br") > 0:
+        response.set_data(brotli.compress(body))
+        response.headers["Content-Encoding"] = "br"
+    elif accepted.quality("gzip") > 0:
+        response.set_data(gzip.compress(body, compresslevel=COMPRESS_LEVEL))
+        response.headers["Content-Encoding"] = "gzip"
+    return response
@@ -0,0 +1,104 @@
+"""
+Shared InfluxDB connection layer.
+
+One InfluxDBClient per process, created lazily on first use and reused by
+every request (app.py) and by the status monitor (alert.py). The underlying
+urllib3 pool is bounded, timeouts are configurable and the client is closed
+at interpreter exit.
+
+Configuration (env)
+-------------------
+- INFLUXDB_URL, INFLUXDB_TOKEN, INFLUXDB_ORG, INFLUXDB_BUCKET
+- INFLUXDB_TIMEOUT_MS    : HTTP timeout in milliseconds (default 30000)
+- INFLUXDB_POOL_MAXSIZE  : max pooled HTTP connections (default 10)
+
+query_api() returns a thin wrapper that times every query and counts the
+records it returned, reporting them to the callbacks in `query_observers`
+(see telemetry.py). Each call site labels its query with name= (a fixed,
+low-cardinality string: it becomes a Prometheus label).
+"""
+
+import atexit
+import os
+import threading
+import time
+
+from influxdb_client import InfluxDBClient
+
+_client = None
+_client_pid = None
+_lock = threading.Lock()
+
+
+def settings():
+    """Connection parameters read from the environment (after load_dotenv)."""
+    return {
+        "url": os.getenv("INFLUXDB_URL"),
+        "token": os.getenv("INFLUXDB_TOKEN"),
+        "org": os.getenv("INFLUXDB_ORG"),
+        "bucket": os.getenv("INFLUXDB_BUCKET"),
+        "timeout": int(os.getenv("INFLUXDB_TIMEOUT_MS", 30000)),
+        "pool_maxsize": int(os.getenv("INFLUXDB_POOL_MAXSIZE", 10)),
+    }
+
+
+def get_client():
+    """Return the process-wide client, creating it on first use (or after a fork)."""
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+
+    with _lock:
+        if _client is None or _client_pid != pid:
+            cfg = settings()
+            # A client inherited from the parent process shares its sockets: drop it
+            _client = InfluxDBClient(
+                url=cfg["url"],
+                token=cfg["token"],
+                org=cfg["org"],
+                timeout=cfg["timeout"],
+                connection_pool_maxsize=cfg["pool_maxsize"],
+            )
+            _client_pid = pid
+    return _client
+
+
+# observer(name, seconds, rows), called after each query made through query_api()
+query_observers = []
+
+
+class TimedQueryApi:
+    """QueryApi wrapper reporting latency and records of each query to query_observers."""
+
+    def __init__(self, api):
+        self._api = api
+
+    def query(self, query, org=None, name="unnamed", **kwargs):
+        started = time.perf_counter()
+        tables = self._api.query(query, org=org, **kwargs)
+        seconds = time.perf_counter() - started
+        rows = sum(len(table.records) for table in tables)
+        for observer in query_observers:
+            observer(name, seconds, rows)
+        return tables
+
+    def __getattr__(self, name):
+        return getattr(self._api, name)
+
+
+def query_api():
+    return TimedQueryApi(get_client().query_api())
+
+
+def close_client():
+    """Close the pooled connections; safe to call more than once."""
+    global _client, _client_pid
+    with _lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+
+
+atexit.register(close_client)
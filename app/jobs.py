@@ -0,0 +1,171 @@
+"""
+Asynchronous export jobs (/api/exports).
+
+Long exports run on a small background pool instead of inside the HTTP
+request. A job's id is the fingerprint of its parameters, so identical
+requests share one job (while it is pending, and reuse its artifact once it
+is done). State lives next to the artifact in the results directory:
+
+    <id>.json        status: queued/running/done/failed, progress 0..1, timestamps,
+                     owner (host, pid) of the process running the job
+    <id>.<ext>       finished artifact (written as <id>.part, then renamed)
+
+Status files are replaced atomically, so any web worker sharing the
+directory can report progress and serve the result. Finished and failed
+jobs expire after `ttl` seconds and are removed by a periodic sweep. A
+pending job whose owner process no longer exists (worker recycled or
+killed: the pool threads die with it) is reported as failed right away and
+can be resubmitted; as a fallback for owners on another host, so is one
+whose status has not moved for `stale_after` seconds.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PENDING = ("queued", "running")
+HOST = socket.gethostname()
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class ExportJobs:
+    def __init__(self, results_dir, workers=2, ttl=86400, stale_after=1800, sweep_every=60):
+        self.results_dir = results_dir
+        self.workers = workers
+        self.ttl = ttl
+        self.stale_after = stale_after
+        self.sweep_every = sweep_every
+
+        self._pool = None
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+
+    @staticmethod
+    def job_id(params):
+        return hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()[:20]
+
+    def _path(self, name):
+        return os.path.join(self.results_dir, name)
+
+    def _write_status(self, status):
+        status["updated"] = time.time()
+        tmp = self._path(f"{status['id']}.json.{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(status, fh)
+        os.replace(tmp, self._path(f"{status['id']}.json"))
+
+    def _read_status(self, job_id):
+        try:
+            with open(self._path(f"{job_id}.json"), encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def status(self, job_id):
+        """Current status of a job, or None if unknown/expired."""
+        if not job_id.isalnum():
+            return None
+        self.sweep()
+        status = self._read_status(job_id)
+        if status is None:
+            return None
+        if status["status"] in PENDING and self._orphaned(status):
+            status.update(status="failed", error="Export worker stopped")
+        return status
+
+    def _orphaned(self, status):
+        owner = status.get("owner") or {}
+        if owner.get("host") == HOST and owner.get("pid") and owner["pid"] != os.getpid():
+            return not process_alive(owner["pid"])
+        return time.time() - status["updated"] > self.stale_after
+
+    def result_path(self, job_id):
+        status = self.status(job_id)
+        if not status or status["status"] != "done":
+            return None
+        path = self._path(status["file"])
+        return path if os.path.exists(path) else None
+
+    def submit(self, params, work, ext):
+        """
+        Start (or join) the job for `params`. `work(params, path, progress)`
+        writes the artifact to `path`, calling progress(fraction) as it goes.
+        """
+        job_id = self.job_id(params)
+        with self._lock:
+            os.makedirs(self.results_dir, exist_ok=True)
+            current = self.status(job_id)
+            if current and (current["status"] in PENDING
+                            or (current["status"] == "done" and self.result_path(job_id))):
+                return current
+
+            status = {"id": job_id, "status": "queued", "progress": 0.0, "params": params,
+                      "file": f"{job_id}.{ext}", "created": time.time(), "finished": None, "error": None,
+                      "owner": {"host": HOST, "pid": os.getpid()}}
+            self._write_status(status)
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="export-job")
+            self._pool.submit(self._run, status, work)
+            return status
+
+    def _run(self, status, work):
+        part = self._path(f"{status['id']}.part")
+        last_report = [0.0]
+
+        def progress(fraction):
+            # At most one status write per second
+            now = time.time()
+            if now - last_report[0] >= 1.0:
+                last_report[0] = now
+                status["progress"] = round(min(max(fraction, 0.0), 1.0), 4)
+                self._write_status(status)
+
+        status["status"] = "running"
+        self._write_status(status)
+        try:
+            work(status["params"], part, progress)
+            os.replace(part, self._path(status["file"]))
+            status.update(status="done", progress=1.0, size=os.path.getsize(self._path(status["file"])))
+        except Exception as e:
+            status.update(status="failed", error=str(e))
+            if os.path.exists(part):
+                os.remove(part)
+        status["finished"] = time.time()
+        self._write_status(status)
+
+    def sweep(self):
+        """Remove expired jobs and their artifacts (at most every `sweep_every` seconds)."""
+        now = time.time()
+        if now - self._last_sweep < self.sweep_every:
+            return
+        self._last_sweep = now
+
+        for status_path in glob.glob(self._path("*.json")):
+            try:
+                with open(status_path, encoding="utf-8") as fh:
+                    status = json.load(fh)
+            except (OSError, ValueError):
+                continue
+            finished = status.get("finished") or (status.get("updated", now) + self.stale_after
+                                                  if status.get("status") in PENDING else None)
+            if finished is None or now - finished < self.ttl:
+                continue
+            for path in (self._path(status.get("file", "")), status_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
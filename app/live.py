@@ -0,0 +1,175 @@
+"""
+Live feed of instrument values for Server-Sent Events (/instruments/stream).
+
+One poller thread per process reads the /instruments snapshot (through the
+snapshot cache, so Influx cost does not grow with viewers), diffs it against
+the previous one and publishes only the changed {topic, field, value}
+deltas as numbered events. Events are kept in a small ring buffer so a
+reconnecting client can resume from its Last-Event-ID; if that id has
+already been dropped, the client gets a full snapshot instead.
+
+Every open stream holds one request thread of its worker, so streams are
+bounded: at most `max_clients` per process (acquire() fails beyond that and
+the endpoint answers 503 with a retry hint), and each stream ends after
+about `max_lifetime` seconds so the browser reconnects - with its
+Last-Event-ID, so nothing is lost - possibly to a less busy worker. Streams
+also end within `keepalive` seconds once `accepting()` turns false (the
+worker is shutting down or recycling), or right away after wake().
+"""
+
+import json
+import random
+import threading
+import time
+from collections import deque
+
+
+def diff_snapshots(previous, current):
+    """Changed values between two snapshots, as [{topic, field, value}] (value None = gone)."""
+    deltas = []
+    for instrument in current:
+        topic = instrument["id"]
+        before = previous.get(topic, {})
+        after = instrument.get("variables") or {}
+        for field, value in after.items():
+            if field not in before or before[field] != value:
+                deltas.append({"topic": topic, "field": field, "value": value})
+        for field in before.keys() - after.keys():
+            deltas.append({"topic": topic, "field": field, "value": None})
+    return deltas
+
+
+def sse_event(data, event_id=None, event=None, retry=None):
+    """Format one SSE message (retry: reconnection delay hint in milliseconds)."""
+    lines = []
+    if retry is not None:
+        lines.append(f"retry: {int(retry)}")
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+class LiveFeed:
+    def __init__(self, snapshot, interval=30.0, buffer_size=256, max_clients=4, max_lifetime=300.0,
+                 retry=5.0):
+        self.snapshot = snapshot          # callable returning the instruments list
+        self.interval = interval
+        self.events = deque(maxlen=buffer_size)
+        self.last_id = 0
+        self.clients = 0
+        self.max_clients = max_clients
+        self.max_lifetime = max_lifetime
+        self.retry = retry                # seconds before the browser reconnects
+        self.rejected = 0
+        self.accepting = lambda: True     # set by the server (gunicorn.conf.py): False while shutting down
+
+        self._values = {}
+        self._latest = []
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def start(self):
+        """Start the poller on first use (after any fork, so each worker has its own)."""
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._poll_forever, name="live-feed", daemon=True)
+                self._thread.start()
+
+    def _poll_forever(self):
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"[live] poll failed: {e}")
+            time.sleep(self.interval)
+
+    def poll(self):
+        """Take a snapshot and publish its deltas (if any) as one event."""
+        current = self.snapshot()
+        deltas = diff_snapshots(self._values, current)
+        with self._cond:
+            self._latest = current
+            self._values = {i["id"]: dict(i.get("variables") or {}) for i in current}
+            if deltas:
+                self.last_id += 1
+                self.events.append((self.last_id, deltas))
+            self._cond.notify_all()
+
+    def initial_state(self):
+        """Current snapshot and event id, for a client that cannot resume."""
+        with self._cond:
+            if not self._latest:
+                self._cond.wait(timeout=self.interval)
+            return self.last_id, self._latest
+
+    def events_after(self, event_id):
+        """Buffered events after event_id, or None if the buffer no longer reaches back that far."""
+        with self._cond:
+            if event_id > self.last_id:
+                return None
+            if self.events and event_id < self.events[0][0] - 1:
+                return None
+            return [(i, d) for i, d in self.events if i > event_id]
+
+    def wait(self, event_id, timeout):
+        """Block until an event newer than event_id exists (or timeout, or wake())."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.last_id > event_id or not self.accepting(), timeout=timeout)
+
+    def wake(self):
+        """Wake every waiting stream (they end if accepting() is now false)."""
+        with self._cond:
+            self._cond.notify_all()
+
+    def acquire(self):
+        """Reserve a stream slot; False when this process already serves max_clients streams."""
+        with self._cond:
+            if self.clients >= self.max_clients or not self.accepting():
+                self.rejected += 1
+                return False
+            self.clients += 1
+            return True
+
+    def release(self):
+        with self._cond:
+            self.clients -= 1
+
+    def stats(self):
+        return {"clients": self.clients, "max_clients": self.max_clients, "rejected": self.rejected,
+                "last_event_id": self.last_id}
+
+    def stream(self, last_event_id=None, keepalive=15.0):
+        """Generator of SSE messages for one client (the caller holds a slot from acquire())."""
+        self.start()
+        # Spread the reconnections of clients that arrived together
+        deadline = time.monotonic() + self.max_lifetime * random.uniform(0.8, 1.0)
+        retry_ms = self.retry * 1000
+
+        events = self.events_after(last_event_id) if last_event_id is not None else None
+        if events is None:
+            cursor, snapshot = self.initial_state()
+            yield sse_event(snapshot, event_id=cursor, event="snapshot", retry=retry_ms)
+        else:
+            cursor = last_event_id
+            yield f"retry: {int(retry_ms)}\n\n"
+            for event_id, deltas in events:
+                yield sse_event(deltas, event_id=event_id, event="delta")
+                cursor = event_id
+
+        while self.accepting() and time.monotonic() < deadline:
+            self.wait(cursor, min(keepalive, max(0.0, deadline - time.monotonic())))
+            if not self.accepting():
+                break
+            events = self.events_after(cursor)
+            if events is None:
+                # Fell behind the ring buffer: start over from a snapshot
+                cursor, snapshot = self.initial_state()
+                yield sse_event(snapshot, event_id=cursor, event="snapshot")
+            elif not events:
+                yield ": keepalive\n\n"
+            for event_id, deltas in events or []:
+                yield sse_event(deltas, event_id=event_id, event="delta")
+                cursor = event_id
@@ -1,9 +1,9 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from flask_bcrypt import Bcrypt
+
+from passwords import hasher
 
 db = SQLAlchemy()
-bcrypt = Bcrypt()
 
 class User(db.Model, UserMixin):
     __tablename__ = 'users'
@@ -13,12 +13,12 @@ class User(db.Model, UserMixin):
     password = db.Column(db.String(150), nullable=False)
 
     def set_password(self, password):
-        """Hashes the password and stores it."""
-        self.password = bcrypt.generate_password_hash(password).decode('utf-8')
+        """Hashes the password and stores it (bcrypt on the bounded pool, see passwords.py)."""
+        self.password = hasher.hash(password)
 
     def check_password(self, password):
-        """Checks the hashed password."""
-        return bcrypt.check_password_hash(self.password, password)
+        """Checks the hashed password (may raise passwords.Overloaded)."""
+        return hasher.verify(self.password, password)
 
 
 class Instrument(db.Model):
@@ -48,16 +48,19 @@ class Instrument(db.Model):
         self.variables = variables
         self.instrument_type = instrument_type
 
+    # Lookups go through the in-memory registry (registry.py) instead of a query per call
     @classmethod
     def get_airlinkID_by_id(cls, id):
-        instrument = cls.query.filter_by(id=id).first()
+        from registry import registry
+        instrument = registry.get(id)
         if instrument:
             return instrument.airlinkID
         return None
 
     @classmethod
     def get_variables_by_id(cls, id):
-        instrument = cls.query.filter_by(id=id).first()
+        from registry import registry
+        instrument = registry.get(id)
         if instrument:
             return instrument.variables
-        return None
\ No newline at end of file
+        return None
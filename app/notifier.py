@@ -0,0 +1,155 @@
+"""
+Non-blocking, coalesced alert delivery for alert.py.
+
+Status transitions are queued by the monitor and delivered by a background
+task: transitions arriving within `window` seconds are merged into a single
+digest email ("37 stations went offline"), one SMTP connection is kept open
+and reused between messages, and failed sends are retried with exponential
+backoff (reconnecting each time). Blocking smtplib calls run in a thread so
+a slow relay never stalls the status checks.
+
+The dispatcher only needs a host/port, so it can be pointed at a local SMTP
+stand-in with starttls=False (tests/smtp_stub.py in the tests, or aiosmtpd).
+"""
+
+import asyncio
+import smtplib
+from datetime import datetime
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+
+
+def build_message(transitions):
+    """
+    Subject and body for a batch of (station_id, station_name, status, when).
+    A single transition keeps the classic per-station subject; several are
+    summarised in a digest, keeping only the latest status of each station.
+    """
+    latest = {}
+    for station_id, station_name, status, when in transitions:
+        latest[station_id] = (station_name, status, when)
+
+    if len(latest) == 1:
+        station_id, (station_name, status, _) = next(iter(latest.items()))
+        subject = f"ALERT: Station {station_name} ({station_id}) is now {status.upper()}"
+        body = f"The station '{station_name}' (ID {station_id}) has changed status to {status.upper()}."
+        return subject, body
+
+    by_status = {}
+    for station_id, (station_name, status, when) in sorted(latest.items()):
+        by_status.setdefault(status, []).append((station_id, station_name, when))
+
+    labels = {"offline": "went offline", "online": "came back online"}
+    summary = ", ".join(f"{len(stations)} stations {labels.get(status, 'are now ' + status)}"
+                        for status, stations in sorted(by_status.items()))
+    lines = []
+    for status, stations in sorted(by_status.items()):
+        lines.append(f"{status.upper()} ({len(stations)}):")
+        lines += [f"  - {name} (ID {sid}) at {when:%Y-%m-%d %H:%M:%S} UTC" for sid, name, when in stations]
+        lines.append("")
+    return f"ALERT: {summary}", "\n".join(lines)
+
+
+class AlertDispatcher:
+    def __init__(self, host, port, sender, recipients, window=30.0, max_retries=5,
+                 backoff=2.0, starttls=True, timeout=30.0):
+        self.host = host
+        self.port = int(port) if port else 0
+        self.sender = sender
+        self.recipients = recipients or []
+        self.window = window
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.starttls = starttls
+        self.timeout = timeout
+
+        self.queue = asyncio.Queue()
+        self.sent = 0
+        self.failed = 0
+        self._smtp = None
+
+    def enqueue(self, station_id, station_name, status):
+        """Queue a transition; never blocks the caller."""
+        self.queue.put_nowait((station_id, station_name, status, datetime.utcnow()))
+
+    async def run(self):
+        """Background sender: coalesce a window of transitions, then deliver them."""
+        loop = asyncio.get_running_loop()
+        batch = []
+        try:
+            while True:
+                batch = [await self.queue.get()]
+                deadline = loop.time() + self.window
+                while (remaining := deadline - loop.time()) > 0:
+                    try:
+                        batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+                await self._deliver(batch)
+                batch = []
+        except asyncio.CancelledError:
+            # Hand the unsent batch back so drain() can still deliver it
+            for item in batch:
+                self.queue.put_nowait(item)
+            raise
+        finally:
+            await asyncio.to_thread(self._disconnect)
+
+    async def drain(self):
+        """Deliver whatever is still queued (used on shutdown)."""
+        batch = []
+        while not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        if batch:
+            await self._deliver(batch)
+        await asyncio.to_thread(self._disconnect)
+
+    async def _deliver(self, batch):
+        subject, body = build_message(batch)
+        for attempt in range(self.max_retries + 1):
+            try:
+                await asyncio.to_thread(self._send, subject, body)
+                self.sent += 1
+                print(f"Email sent to {self.recipients} with subject: {subject}")
+                return
+            except Exception as e:
+                await asyncio.to_thread(self._disconnect)
+                if attempt == self.max_retries:
+                    self.failed += 1
+                    print(f"Failed to send email after {attempt + 1} attempts: {e}")
+                    return
+                await asyncio.sleep(self.backoff * (2 ** attempt))
+
+    def _send(self, subject, body):
+        msg = MIMEMultipart()
+        msg['From'] = self.sender
+        msg['To'] = ", ".join(self.recipients)
+        msg['Subject'] = subject
+        msg.attach(MIMEText(body, 'plain'))
+
+        self._connection().sendmail(self.sender, self.recipients, msg.as_string())
+
+    def _connection(self):
+        """Reuse the open connection if the server still answers, else reconnect."""
+        if self._smtp is not None:
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._disconnect()
+
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            smtp.starttls()
+        self._smtp = smtp
+        return smtp
+
+    def _disconnect(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except Exception:
+            pass
+        self._smtp = None
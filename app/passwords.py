@@ -0,0 +1,215 @@
+"""
+Password hashing off the request thread, and login admission control.
+
+bcrypt is deliberately slow (it burns ~100-300 ms of CPU at cost 12). Run on
+the request thread, a burst of logins pins the worker and starves the map
+and export endpoints. Here:
+
+- PasswordHasher runs bcrypt on a small bounded pool (the bcrypt C code
+  releases the GIL, so other request threads keep running). Work waiting for
+  the pool is the admission queue: beyond `max_queue` waiting calls new
+  logins are rejected immediately (Overloaded -> 503) instead of piling up.
+  The cost factor is configurable; hashes made with another cost still
+  verify and can be upgraded on the next successful login (needs_rehash).
+- LoginThrottle limits attempts per client IP and failures per username in
+  a sliding window (429 with Retry-After).
+
+Both keep counters for the metrics (queue depth, verification latency,
+rejections). State is per process.
+
+Configuration (env)
+-------------------
+- BCRYPT_ROUNDS (cost factor, default 12), BCRYPT_WORKERS (default 2)
+- LOGIN_QUEUE_SIZE (max waiting verifications, default 32), LOGIN_QUEUE_TIMEOUT (s, default 10)
+- LOGIN_THROTTLE_WINDOW (s, default 300), LOGIN_IP_ATTEMPTS (default 30), LOGIN_USER_FAILURES (default 5)
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import bcrypt
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", 2))
+LOGIN_QUEUE_SIZE = int(os.getenv("LOGIN_QUEUE_SIZE", 32))
+LOGIN_QUEUE_TIMEOUT = float(os.getenv("LOGIN_QUEUE_TIMEOUT", 10))
+LOGIN_THROTTLE_WINDOW = float(os.getenv("LOGIN_THROTTLE_WINDOW", 300))
+LOGIN_IP_ATTEMPTS = int(os.getenv("LOGIN_IP_ATTEMPTS", 30))
+LOGIN_USER_FAILURES = int(os.getenv("LOGIN_USER_FAILURES", 5))
+
+
+class Overloaded(Exception):
+    """The hashing queue is full (or the wait timed out): try again later."""
+
+
+def _to_bytes(value):
+    return value.encode("utf-8") if isinstance(value, str) else value
+
+
+class PasswordHasher:
+    def __init__(self, rounds=BCRYPT_ROUNDS, workers=BCRYPT_WORKERS, max_queue=LOGIN_QUEUE_SIZE,
+                 timeout=LOGIN_QUEUE_TIMEOUT):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._running = 0
+        self._dummy = None
+        self.metrics = {"verifications": 0, "hashes": 0, "rejected": 0, "timeouts": 0,
+                        "verify_seconds_total": 0.0, "verify_seconds_max": 0.0, "queue_seconds_total": 0.0}
+
+    def _executor(self):
+        # Created lazily, and again after a fork (threads do not survive it)
+        if self._pool is None or self._pool_pid != os.getpid():
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+            self._pool_pid = os.getpid()
+            self._waiting = self._running = 0
+        return self._pool
+
+    def _run(self, fn, *args):
+        """Run fn on the pool and wait for it; returns (result, seconds spent in fn)."""
+        with self._lock:
+            pool = self._executor()
+            if self._waiting >= self.max_queue:
+                self.metrics["rejected"] += 1
+                raise Overloaded()
+            self._waiting += 1
+        queued_at = time.perf_counter()
+
+        def task():
+            with self._lock:
+                self._waiting -= 1
+                self._running += 1
+                self.metrics["queue_seconds_total"] += time.perf_counter() - queued_at
+            started = time.perf_counter()
+            try:
+                return fn(*args), time.perf_counter() - started
+            finally:
+                with self._lock:
+                    self._running -= 1
+
+        future = pool.submit(task)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            if future.cancel():
+                with self._lock:
+                    self._waiting -= 1
+            with self._lock:
+                self.metrics["timeouts"] += 1
+            raise Overloaded()
+
+    def hash(self, password):
+        hashed, _ = self._run(lambda: bcrypt.hashpw(_to_bytes(password), bcrypt.gensalt(self.rounds)))
+        with self._lock:
+            self.metrics["hashes"] += 1
+        return hashed.decode("utf-8")
+
+    def verify(self, hashed, password):
+        """
+        Check a password against a stored hash. With hashed=None the same work
+        is done against a dummy hash, so unknown usernames cost as much as
+        known ones (no timing hint).
+        """
+        if hashed is None:
+            if self._dummy is None:
+                self._dummy, _ = self._run(lambda: bcrypt.hashpw(b"dummy-password", bcrypt.gensalt(self.rounds)))
+            target = self._dummy
+        else:
+            target = _to_bytes(hashed)
+
+        ok, seconds = self._run(lambda: bcrypt.checkpw(_to_bytes(password), target))
+        with self._lock:
+            self.metrics["verifications"] += 1
+            self.metrics["verify_seconds_total"] += seconds
+            self.metrics["verify_seconds_max"] = max(self.metrics["verify_seconds_max"], seconds)
+        return ok and hashed is not None
+
+    def needs_rehash(self, hashed):
+        """True if the stored hash was made with another cost factor."""
+        try:
+            return int(hashed.split("$")[2]) != self.rounds
+        except (AttributeError, IndexError, ValueError):
+            return False
+
+    def stats(self):
+        with self._lock:
+            out = dict(self.metrics)
+            out.update(queue_depth=self._waiting, running=self._running, workers=self.workers,
+                       max_queue=self.max_queue, rounds=self.rounds)
+        n = out["verifications"]
+        out["verify_seconds_avg"] = round(out["verify_seconds_total"] / n, 4) if n else None
+        return out
+
+
+class LoginThrottle:
+    """Sliding-window limits: attempts per IP, failures per username."""
+
+    def __init__(self, window=LOGIN_THROTTLE_WINDOW, ip_attempts=LOGIN_IP_ATTEMPTS,
+                 user_failures=LOGIN_USER_FAILURES):
+        self.window = window
+        self.ip_attempts = ip_attempts
+        self.user_failures = user_failures
+
+        self._ips = {}
+        self._users = {}
+        self._lock = threading.Lock()
+        self.throttled = 0
+
+    def _recent(self, table, key, now):
+        events = table.get(key)
+        if events is None:
+            return deque()
+        while events and events[0] <= now - self.window:
+            events.popleft()
+        if not events:
+            del table[key]
+        return events
+
+    def _prune(self, now):
+        for table in (self._ips, self._users):
+            for key in list(table):
+                self._recent(table, key, now)
+
+    def check(self, ip, username):
+        """Seconds to wait before this attempt is allowed (0 = go ahead); records the attempt."""
+        now = time.monotonic()
+        with self._lock:
+            if len(self._ips) + len(self._users) > 10000:
+                self._prune(now)
+            waits = []
+            ip_events = self._recent(self._ips, ip, now)
+            if len(ip_events) >= self.ip_attempts:
+                waits.append(ip_events[0] + self.window - now)
+            user_events = self._recent(self._users, username, now)
+            if len(user_events) >= self.user_failures:
+                waits.append(user_events[0] + self.window - now)
+            if waits:
+                self.throttled += 1
+                return max(1, int(max(waits)) + 1)
+            self._ips.setdefault(ip, deque()).append(now)
+            return 0
+
+    def failed(self, username):
+        with self._lock:
+            self._users.setdefault(username, deque()).append(time.monotonic())
+
+    def succeeded(self, username):
+        with self._lock:
+            self._users.pop(username, None)
+
+    def stats(self):
+        with self._lock:
+            return {"throttled": self.throttled, "tracked_ips": len(self._ips), "tracked_users": len(self._users)}
+
+
+hasher = PasswordHasher()
+throttle = LoginThrottle()
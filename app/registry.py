@@ -0,0 +1,159 @@
+"""
+Process-local registry of the instruments table.
+
+Instrument metadata changes only when an admin edits it (or when alert.py
+flips a status), but it is read by almost every request. The registry loads
+the whole table once into immutable records indexed by id, and keeps it
+until it is invalidated:
+
+- locally, by the write paths in app.py right after their commit;
+- in the other processes, through Postgres LISTEN/NOTIFY: writers send
+  NOTIFY on CHANNEL inside their transaction (so it is delivered only if the
+  change commits), and each web worker runs one listener thread that drops
+  its registry (and calls the on_change hooks) when a notification arrives.
+
+alert.py flushes status flips every few seconds with the payload
+STATUS_PAYLOAD: those only drop the registry (the dashboard shows the
+status), without the on_change hooks, since nothing derived from the
+metadata (the /instruments snapshot) depends on the status.
+
+If the listener loses its connection it reconnects with backoff and
+invalidates once, since notifications sent meanwhile are lost.
+"""
+
+import os
+import select
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import text
+
+from models import db, Instrument
+
+CHANNEL = "instruments_changed"
+STATUS_PAYLOAD = "status"                 # only the status column changed (alert.py)
+
+
+@dataclass(frozen=True)
+class InstrumentRecord:
+    """Read-only copy of an Instrument row (safe to share between threads)."""
+    id: str
+    name: Optional[str]
+    image: Optional[str]
+    organization: Optional[str]
+    installation_date: Optional[date]
+    latitude: float
+    longitude: float
+    variables: str
+    instrument_type: str
+    airlinkID: Optional[str]
+    status: Optional[str]
+
+    @classmethod
+    def from_model(cls, instrument):
+        return cls(**{field: getattr(instrument, field) for field in cls.__dataclass_fields__})
+
+    @property
+    def variable_list(self):
+        return self.variables.split(", ") if self.variables else []
+
+
+def notify_changed(session, payload=""):
+    """Queue a NOTIFY in the current transaction (Postgres only; no-op elsewhere)."""
+    if session.get_bind().dialect.name == "postgresql":
+        session.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": payload})
+
+
+class InstrumentRegistry:
+    def __init__(self):
+        self.on_change = []               # callbacks run on every invalidation
+        self.loads = 0
+        self.invalidations = 0
+
+        self._records = None
+        self._lock = threading.Lock()
+        self._listener = None
+        self._listener_pid = None
+
+    def _snapshot(self):
+        records = self._records
+        if records is None:
+            with self._lock:
+                if self._records is None:
+                    # Needs an app context (request, or the snapshot cache's own)
+                    self._records = {i.id: InstrumentRecord.from_model(i) for i in db.session.query(Instrument).all()}
+                    self.loads += 1
+                records = self._records
+        return records
+
+    def all(self):
+        return list(self._snapshot().values())
+
+    def get(self, instrument_id):
+        return self._snapshot().get(instrument_id)
+
+    def invalidate(self, status_only=False):
+        with self._lock:
+            self._records = None
+            self.invalidations += 1
+        if status_only:
+            return
+        for callback in self.on_change:
+            callback()
+
+    def stats(self):
+        return {"loaded": self._records is not None, "size": len(self._records or {}),
+                "loads": self.loads, "invalidations": self.invalidations,
+                "listening": self._listener is not None and self._listener.is_alive()}
+
+    # --- cross-process invalidation ---
+
+    def listen(self, dsn):
+        """Start the LISTEN thread of this process (once per process, also after a fork)."""
+        if not dsn or not dsn.startswith("postgresql"):
+            return
+        with self._lock:
+            if self._listener_pid == os.getpid() and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(target=self._listen_forever, args=(dsn,),
+                                              name="instrument-registry", daemon=True)
+            self._listener_pid = os.getpid()
+            self._listener.start()
+
+    def _listen_forever(self, dsn):
+        import psycopg2
+
+        backoff = 1.0
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(dsn)
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {CHANNEL}")
+                # Changes made while we were not listening are unknown
+                self.invalidate()
+                backoff = 1.0
+                while True:
+                    if select.select([conn], [], [], 60) == ([], [], []):
+                        continue
+                    conn.poll()
+                    if conn.notifies:
+                        payloads = {n.payload for n in conn.notifies}
+                        conn.notifies.clear()
+                        self.invalidate(status_only=payloads == {STATUS_PAYLOAD})
+            except Exception as e:
+                print(f"[registry] listener error: {e}; reconnecting in {backoff:.0f}s")
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+
+
+registry = InstrumentRegistry()
@@ -0,0 +1,316 @@
+"""
+Pre-aggregated rollup tiers (1m / 10m / 1h / 1d) for /timeseries.
+
+The downsampler (downsampler.py) windows the raw points of every instrument
+with utils.window_weather at each tier and stores, per window, the means,
+the last value of cumulative rain, the wind u/v means and the number of
+samples behind each mean. /timeseries then answers from the coarsest tier
+that tiles the requested interval: whole tier windows are read from the
+rollups, the edges (and anything newer than the last rollup) from raw data,
+and everything is recombined with count-weighted means and last values
+before the usual utils.finish_weather_windows step.
+
+The rollups of a (topic, tier) cover [earliest window, latest window]: the
+downsampler only backfills a limited period from its first run. A request
+reaching further than `max_raw_edge` outside that span is not served from
+the tier at all (the caller falls back to pushdown/raw), so a partially
+covered range is never returned truncated.
+
+Storage is pluggable: InfluxRollupStore keeps rollups in Influx (measurement
+"mqtt_rollup", tags topic/tier); any object with the same methods can stand in
+for it.
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import utils
+from flux_planner import MINUTES_PER_DAY, flux_time, raw_timeseries_query, records_to_rows
+
+TIERS = {"1m": 1, "10m": 10, "1h": 60, "1d": 1440}
+ROLLUP_MEASUREMENT = "mqtt_rollup"
+
+EPOCH = datetime(1970, 1, 1)
+
+# Influx reserves keys starting with "_": internal columns are stored with a prefix
+STORED_PREFIX = "rollup"
+
+
+def floor_time(dt, minutes):
+    """Floor a naive-UTC datetime to a multiple of `minutes` since the epoch."""
+    step = minutes * 60
+    return EPOCH + timedelta(seconds=int((dt - EPOCH).total_seconds()) // step * step)
+
+
+def ceil_time(dt, minutes):
+    floored = floor_time(dt, minutes)
+    return floored if floored == dt else floored + timedelta(minutes=minutes)
+
+
+def pick_tier(interval_minutes, tiers=TIERS):
+    """
+    Coarsest tier whose windows tile the requested interval exactly, or None.
+    Like the Flux pushdown, only intervals dividing a day are served, so the
+    epoch-aligned tier windows line up with the pandas bins.
+    """
+    if interval_minutes <= 0 or MINUTES_PER_DAY % interval_minutes != 0:
+        return None
+    candidates = [(minutes, name) for name, minutes in tiers.items() if interval_minutes % minutes == 0]
+    return max(candidates)[1] if candidates else None
+
+
+def tier_windows(rows, minutes, cfg):
+    """Raw rows windowed at a tier, with sample counts; empty windows dropped."""
+    if not rows:
+        return pd.DataFrame()
+    windows = utils.window_weather(pd.DataFrame(rows), minutes, cfg, origin="epoch", counts=True)
+    data_cols = [c for c in windows.columns if not c.endswith(utils.COUNT_SUFFIX)]
+    return windows[windows[data_cols].notna().any(axis=1)]
+
+
+def combine_windows(windows, interval_minutes, cfg):
+    """
+    Merge tier windows (with counts) into windows of `interval_minutes`:
+    count-weighted means, last value for cumulative rain.
+    """
+    if windows.empty:
+        return windows
+
+    keys = windows.index.floor(f"{interval_minutes}min")
+    suffix = utils.COUNT_SUFFIX
+    mean_cols = [c[:-len(suffix)] for c in windows.columns
+                 if c.endswith(suffix) and c[:-len(suffix)] in windows.columns]
+    last_cols = [c for c in utils.cumulative_rain_columns(cfg) if c in windows.columns]
+
+    n = windows[[c + suffix for c in mean_cols]].fillna(0).to_numpy(dtype=float)
+    values = windows[mean_cols].to_numpy(dtype=float)
+    weighted = pd.DataFrame(np.where(n > 0, values * n, 0.0), index=windows.index, columns=mean_cols)
+    counts = pd.DataFrame(n, index=windows.index, columns=mean_cols)
+
+    totals = counts.groupby(keys).sum()
+    parts = [weighted.groupby(keys).sum() / totals.where(totals > 0)]
+    if last_cols:
+        parts.append(windows[last_cols].groupby(keys).last())
+
+    out = pd.concat(parts, axis=1)
+    out.index.name = "time"
+    return out[sorted(out.columns)]
+
+
+def fetch_windows(store, topic, tier, start, end, interval_minutes, cfg, max_raw_edge=timedelta(days=1)):
+    """
+    Windowed frame for [start, end) at `interval_minutes`, built from the tier
+    rollups plus raw data for the edges. Returns None when the tier rollups do
+    not cover the range, except for raw edges of at most `max_raw_edge`
+    (the caller falls back to the other paths).
+    start/end are naive-UTC datetimes.
+    """
+    minutes = TIERS[tier]
+    latest = store.latest_window(topic, tier)
+    earliest = store.earliest_window(topic, tier) if latest is not None else None
+    if latest is None or earliest is None:
+        return None
+
+    first = max(ceil_time(start, minutes), earliest)
+    last = min(floor_time(end, minutes), latest + timedelta(minutes=minutes))
+    if first >= last:
+        return None
+    # Uncovered whole windows before the oldest / after the newest rollup are read raw:
+    # only accepted for short spans (late downsampler pass), not for missing history
+    if first - ceil_time(start, minutes) > max_raw_edge or floor_time(end, minutes) - last > max_raw_edge:
+        return None
+
+    pieces = []
+    if start < first:
+        pieces.append(tier_windows(store.read_raw(topic, start, first), minutes, cfg))
+    pieces.append(store.read_windows(topic, tier, first, last))
+    if last < end:
+        pieces.append(tier_windows(store.read_raw(topic, last, end), minutes, cfg))
+
+    pieces = [p for p in pieces if not p.empty]
+    if not pieces:
+        return pd.DataFrame()
+    return combine_windows(pd.concat(pieces).sort_index(), interval_minutes, cfg)
+
+
+class InfluxRollupStore:
+    """Raw points and rollup windows kept in InfluxDB."""
+
+    def __init__(self, query_api, org, bucket, rollup_bucket=None, write_api=None, lookback_days=30):
+        self.query_api = query_api
+        self.write_api = write_api
+        self.org = org
+        self.bucket = bucket
+        self.rollup_bucket = rollup_bucket or bucket
+        self.lookback_days = lookback_days
+
+    def read_raw(self, topic, start, stop):
+        query = raw_timeseries_query(self.bucket, topic, flux_time(start), flux_time(stop))
+        return records_to_rows(self.query_api.query(query, org=self.org, name="rollup_read_raw"))
+
+    def _rollup_filter(self, topic, tier):
+        return (f'filter(fn: (r) => r._measurement == "{ROLLUP_MEASUREMENT}" '
+                f'and r.topic == "{topic}" and r.tier == "{tier}")')
+
+    def latest_window(self, topic, tier):
+        """Start of the newest stored window within the lookback (naive UTC), or None."""
+        query = f"""
+        from(bucket: "{self.rollup_bucket}")
+          |> range(start: -{self.lookback_days}d)
+          |> {self._rollup_filter(topic, tier)}
+          |> last()
+          |> keep(columns: ["_time"])
+          |> group()
+          |> max(column: "_time")
+        """
+        latest = None
+        for table in self.query_api.query(query, org=self.org, name="rollup_latest_window"):
+            for rec in table.records:
+                latest = rec.get_time().replace(tzinfo=None)
+        return latest
+
+    def earliest_window(self, topic, tier):
+        """Start of the oldest stored window (naive UTC), or None."""
+        query = f"""
+        from(bucket: "{self.rollup_bucket}")
+          |> range(start: 0)
+          |> {self._rollup_filter(topic, tier)}
+          |> first()
+          |> keep(columns: ["_time"])
+          |> group()
+          |> min(column: "_time")
+        """
+        earliest = None
+        for table in self.query_api.query(query, org=self.org, name="rollup_earliest_window"):
+            for rec in table.records:
+                earliest = rec.get_time().replace(tzinfo=None)
+        return earliest
+
+    def read_windows(self, topic, tier, start, stop):
+        query = f"""
+        from(bucket: "{self.rollup_bucket}")
+          |> range(start: {flux_time(start)}, stop: {flux_time(stop)})
+          |> {self._rollup_filter(topic, tier)}
+          |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+          |> sort(columns: ["_time"])
+        """
+        rows = []
+        for table in self.query_api.query(query, org=self.org, name="rollup_read_windows"):
+            for rec in table.records:
+                row = {_from_stored(k): v for k, v in rec.values.items()
+                       if not k.startswith("_") and k not in ("result", "table", "topic", "tier")}
+                row["time"] = rec.get_time()
+                rows.append(row)
+        if not rows:
+            return pd.DataFrame()
+        df = pd.DataFrame(rows)
+        df["time"] = pd.to_datetime(df["time"], utc=True)
+        return df.set_index("time")
+
+    def write_windows(self, topic, tier, windows):
+        points = []
+        for ts, row in windows.iterrows():
+            fields = {}
+            for col, value in row.items():
+                if pd.isna(value):
+                    continue
+                key = _to_stored(col)
+                fields[key] = int(value) if col.endswith(utils.COUNT_SUFFIX) else float(value)
+            if fields:
+                points.append({
+                    "measurement": ROLLUP_MEASUREMENT,
+                    "tags": {"topic": topic, "tier": tier},
+                    "fields": fields,
+                    "time": ts.to_pydatetime(),
+                })
+        if points:
+            self.write_api.write(bucket=self.rollup_bucket, org=self.org, record=points)
+        return len(points)
+
+
+def _to_stored(col):
+    return STORED_PREFIX + col if col.startswith("_") else col
+
+
+def _from_stored(key):
+    return key[len(STORED_PREFIX):] if key.startswith(STORED_PREFIX + "_") else key
+
+
+class Downsampler:
+    """
+    Incrementally maintains the rollup tiers. Only closed windows (older than
+    `lag`) are written; each (topic, tier) resumes from its last stored window,
+    never looking further back than `backfill`. Points arriving later than
+    `lag` for an already rolled-up window are not picked up by the passes:
+    whoever writes them (the /upload_influx backfill) calls rebuild().
+    """
+
+    def __init__(self, store, cfg, tiers=TIERS, backfill=timedelta(days=30),
+                 lag=timedelta(minutes=2), chunk=timedelta(days=1)):
+        self.store = store
+        self.cfg = cfg
+        self.tiers = tiers
+        self.backfill = backfill
+        self.lag = lag
+        self.chunk = chunk
+        self._next_start = {}
+
+    def run_once(self, topics, now=None):
+        """One pass over all topics and tiers; returns windows written per tier."""
+        now = now or datetime.utcnow()
+        written = {tier: 0 for tier in self.tiers}
+        for topic in topics:
+            for tier, minutes in self.tiers.items():
+                try:
+                    written[tier] += self.update(topic, tier, minutes, now)
+                except Exception as e:
+                    print(f"Rollup {tier} for {topic} failed: {e}")
+        return written
+
+    def update(self, topic, tier, minutes, now):
+        key = (topic, tier)
+        oldest = floor_time(now - self.backfill, minutes)
+        closed_end = floor_time(now - self.lag, minutes)
+
+        start = self._next_start.get(key)
+        if start is None:
+            latest = self.store.latest_window(topic, tier)
+            start = latest + timedelta(minutes=minutes) if latest else oldest
+        start = max(start, oldest)
+
+        written = 0
+        for chunk_start, chunk_stop in self._chunks(start, closed_end, minutes):
+            written += self._roll_up(topic, tier, minutes, chunk_start, chunk_stop)
+            self._next_start[key] = chunk_stop
+        return written
+
+    def rebuild(self, topic, start, stop):
+        """
+        Recompute the stored windows of every tier touched by raw points in
+        [start, stop) (naive UTC), after they were written late. Only windows
+        already rolled up are rewritten (the rest is up to the passes);
+        returns windows written per tier.
+        """
+        written = {tier: 0 for tier in self.tiers}
+        for tier, minutes in self.tiers.items():
+            latest = self.store.latest_window(topic, tier)
+            earliest = self.store.earliest_window(topic, tier) if latest is not None else None
+            if latest is None or earliest is None:
+                continue
+            first = max(floor_time(start, minutes), earliest)
+            last = min(ceil_time(stop, minutes), latest + timedelta(minutes=minutes))
+            for chunk_start, chunk_stop in self._chunks(first, last, minutes):
+                written[tier] += self._roll_up(topic, tier, minutes, chunk_start, chunk_stop)
+        return written
+
+    def _chunks(self, start, stop, minutes):
+        step = timedelta(minutes=minutes * max(1, int(self.chunk.total_seconds() // 60) // minutes))
+        while start < stop:
+            yield start, min(stop, start + step)
+            start += step
+
+    def _roll_up(self, topic, tier, minutes, start, stop):
+        windows = tier_windows(self.store.read_raw(topic, start, stop), minutes, self.cfg)
+        return self.store.write_windows(topic, tier, windows) if not windows.empty else 0
@@ -277,28 +277,44 @@ $(document).ready(function() {
     const startISO = toIsoUTC(startVal);
     const endISO = toIsoUTC(endVal);
 
-    // GET verso /timeseries/<id>?start=...&end=...&interval=...
-    const url = `/timeseries/${encodeURIComponent(currentInstrumentId)}?start=${encodeURIComponent(startISO)}&end=${encodeURIComponent(endISO)}&interval=${encodeURIComponent(interval)}`;
+    // Export asincrono: POST /api/exports, poi polling dello stato fino al file pronto
+    const originalLabel = exportBtn.textContent;
+    exportBtn.disabled = true;
 
     try {
-      const res = await fetch(url, { method: 'GET' });
+      const res = await fetch('/api/exports', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ instrument_id: currentInstrumentId, start: startISO, end: endISO, interval })
+      });
       if(!res.ok){
         const text = await res.text();
         throw new Error(text || ('HTTP '+res.status));
       }
-      const blob = await res.blob();
+      let job = await res.json();
+
+      while(job.status === 'queued' || job.status === 'running'){
+        exportBtn.textContent = `Export ${Math.round((job.progress || 0) * 100)}%`;
+        await new Promise(resolve => setTimeout(resolve, 2000));
+        const poll = await fetch(job.status_url);
+        if(!poll.ok) throw new Error('HTTP '+poll.status);
+        job = await poll.json();
+      }
+      if(job.status !== 'done') throw new Error(job.error || 'Export failed');
+
       const a = document.createElement('a');
-      const href = URL.createObjectURL(blob);
-      a.href = href;
+      a.href = job.download_url;
       const ts = new Date().toISOString().slice(0,19).replace(/[:T]/g,'-');
       a.download = `${currentInstrumentId}_timeseries_${interval}m_${ts}.csv`;
       document.body.appendChild(a);
       a.click();
       a.remove();
-      URL.revokeObjectURL(href);
     } catch (err) {
       console.error('Export error:', err);
       alert('Errore durante l\'export.');
+    } finally {
+      exportBtn.disabled = false;
+      exportBtn.textContent = originalLabel;
     }
   });
 })();
@@ -299,6 +299,9 @@ function updatePopupContent(marker, popupContent) {
     }
 }
 
+// Marker e dati di ogni strumento, per applicare gli aggiornamenti live
+const liveInstruments = {};
+
 fetch('/instruments')
     .then(response => response.json())
     .then(data => {
@@ -345,6 +348,79 @@ fetch('/instruments')
                 updatePopup(currentPage);
             });
 
+            liveInstruments[instrument.id] = {
+                instrument: instrument,
+                refresh: () => { if (marker.isPopupOpen()) updatePopup(currentPage); }
+            };
+
         });
+
+        subscribeLiveUpdates();
     })
     .catch(error => console.error('Error fetching instruments:', error));
+
+// Aggiornamenti live via Server-Sent Events: solo i valori cambiati {topic, field, value}.
+// EventSource si riconnette da solo inviando Last-Event-ID quando il server chiude lo stream;
+// con 503 (worker pieno) resta CLOSED: riapriamo noi, con jitter, riprendendo da lastEventId.
+function subscribeLiveUpdates() {
+    if (!window.EventSource) return;
+
+    const applyValue = (topic, field, value) => {
+        const entry = liveInstruments[topic];
+        if (!entry) return null;
+        if (value === null) {
+            delete entry.instrument.variables[field];
+        } else {
+            entry.instrument.variables[field] = value;
+        }
+        return entry;
+    };
+
+    let lastEventId = null;
+    let retryDelay = 5000;
+
+    const listen = (source) => {
+        source.addEventListener('delta', (event) => {
+            if (event.lastEventId) lastEventId = event.lastEventId;
+            const touched = new Set();
+            JSON.parse(event.data).forEach(d => {
+                const entry = applyValue(d.topic, d.field, d.value);
+                if (entry) touched.add(entry);
+            });
+            touched.forEach(entry => entry.refresh());
+        });
+
+        source.addEventListener('snapshot', (event) => {
+            if (event.lastEventId) lastEventId = event.lastEventId;
+            JSON.parse(event.data).forEach(instrument => {
+                const entry = liveInstruments[instrument.id];
+                if (!entry) return;
+                entry.instrument.variables = instrument.variables || {};
+                entry.refresh();
+            });
+        });
+    };
+
+    const connect = () => {
+        const url = lastEventId === null
+            ? '/instruments/stream'
+            : `/instruments/stream?lastEventId=${encodeURIComponent(lastEventId)}`;
+        const source = new EventSource(url);
+        listen(source);
+
+        source.onopen = () => { retryDelay = 5000; };
+        source.onerror = () => {
+            if (source.readyState !== EventSource.CLOSED) {
+                console.warn('Live updates interrupted, reconnecting...');
+                return;
+            }
+            source.close();
+            const delay = retryDelay * (0.5 + Math.random());
+            retryDelay = Math.min(retryDelay * 2, 120000);
+            console.warn(`Live updates unavailable, retrying in ${Math.round(delay / 1000)}s`);
+            setTimeout(connect, delay);
+        };
+    };
+
+    connect();
+}
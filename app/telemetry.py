@@ -0,0 +1,113 @@
+"""
+Prometheus metrics (text exposition format) for the web app and alert.py.
+
+- http_request_duration_seconds{route,method,status}   per-route latency (streamed
+  responses: time until the response object is returned, not the whole stream)
+- influx_query_duration_seconds{query} / influx_query_rows{query}
+  every Flux query made through influx.query_api(), labelled with the name= of its call site
+- timeseries_phase_duration_seconds{phase}              fetch / records_to_rows / window /
+  finish / serialize steps of a time-series export
+- app_component_stat{component,stat}                    counters of the in-process caches,
+  registry, login queue... read at scrape time from their stats() methods
+
+The web app serves them at /metrics (only with METRICS_TOKEN set, as a bearer
+token); alert.py runs its own small listener
+(serve()). Under gunicorn, set PROMETHEUS_MULTIPROC_DIR so the histograms
+of all workers are aggregated; component stats then come from the worker
+answering the scrape (they carry a pid label).
+"""
+
+import os
+from contextlib import contextmanager
+from time import perf_counter
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Histogram,
+                               generate_latest, multiprocess, start_http_server)
+from prometheus_client.core import GaugeMetricFamily
+
+import influx
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000, 10000000)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route",
+    ["route", "method", "status"], buckets=LATENCY_BUCKETS)
+INFLUX_QUERY_SECONDS = Histogram(
+    "influx_query_duration_seconds", "Flux query latency (until all tables are read)",
+    ["query"], buckets=LATENCY_BUCKETS)
+INFLUX_QUERY_ROWS = Histogram(
+    "influx_query_rows", "Records returned per Flux query", ["query"], buckets=ROW_BUCKETS)
+PHASE_SECONDS = Histogram(
+    "timeseries_phase_duration_seconds", "Time spent per time-series processing phase",
+    ["phase"], buckets=LATENCY_BUCKETS)
+
+
+def observe_query(name, seconds, rows):
+    INFLUX_QUERY_SECONDS.labels(name).observe(seconds)
+    INFLUX_QUERY_ROWS.labels(name).observe(rows)
+
+
+influx.query_observers.append(observe_query)
+
+
+@contextmanager
+def phase(name):
+    """Time a block as one processing phase."""
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        PHASE_SECONDS.labels(name).observe(perf_counter() - started)
+
+
+class StatsCollector:
+    """Exposes numeric values of registered stats() dicts as gauges."""
+
+    def __init__(self):
+        self.sources = {}
+
+    def register(self, component, stats):
+        self.sources[component] = stats
+
+    def collect(self):
+        family = GaugeMetricFamily("app_component_stat", "In-process component counters",
+                                   labels=["component", "stat", "pid"])
+        pid = str(os.getpid())
+        for component, stats in self.sources.items():
+            try:
+                values = stats()
+            except Exception:
+                continue
+            for stat, value in values.items():
+                if isinstance(value, bool):
+                    value = int(value)
+                if isinstance(value, (int, float)):
+                    family.add_metric([component, stat, pid], value)
+        yield family
+
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+
+def register_stats(component, stats):
+    stats_collector.register(component, stats)
+
+
+def exposition():
+    """(body, content type) of the current metrics."""
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(stats_collector)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def serve(port):
+    """Standalone metrics listener (for processes without a web app, e.g. alert.py)."""
+    start_http_server(port)
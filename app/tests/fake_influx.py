@@ -0,0 +1,165 @@
+"""
+In-memory stand-in for the influxdb_client QueryApi used by the tests.
+
+It holds raw points in long format (time, topic, field, value) and answers
+the Flux produced by flux_planner.py the way InfluxDB would:
+
+- schema.fieldKeys      : field keys of one topic (whole series, range ignored)
+- filter on one _field  : points of one field of one topic in [start, stop), as _value
+- raw_timeseries_query  : pivoted points of one topic in [start, stop)
+- fallback_query        : same, non-numeric fields only
+- pushdown_query        : aggregateWindow (timeSrc "_start", createEmpty false)
+                          mean / last per field class and u/v wind means,
+                          epoch-aligned windows, first one truncated to the range start
+
+Only the query shapes generated by this repo are understood.
+"""
+
+import json
+import math
+import re
+
+import numpy as np
+import pandas as pd
+from influxdb_client.client.flux_table import FluxRecord, FluxTable
+
+EPOCH = pd.Timestamp(0, tz="UTC")
+
+
+def _parse_time(literal):
+    return pd.Timestamp(literal).tz_convert("UTC") if literal.endswith("Z") else pd.Timestamp(literal, tz="UTC")
+
+
+def _table(rows):
+    table = FluxTable()
+    table.records = [FluxRecord(table, values) for values in rows]
+    return table
+
+
+def _is_numeric(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class FakeQueryApi:
+    def __init__(self, points):
+        self.points = points.sort_values("time", kind="stable").reset_index(drop=True)
+        self.queries = []
+
+    def query(self, query, org=None, **kwargs):
+        self.queries.append(query)
+        if "schema.fieldKeys" in query:
+            topic = re.search(r'r\["topic"\] == "([^"]*)"', query).group(1)
+            fields = sorted(self.points.loc[self.points["topic"] == topic, "field"].unique())
+            return [_table([{"_value": field} for field in fields])]
+        start, stop = (_parse_time(t) for t in re.search(r"range\(start: (\S+), stop: (\S+)\)", query).groups())
+        topic = re.search(r'r\["topic"\] == "([^"]*)"', query).group(1)
+        sets = [json.loads(s) for s in re.findall(r"set: (\[[^\]]*\])", query)]
+
+        points = self.points
+        data = points[(points["topic"] == topic) & (points["time"] >= start) & (points["time"] < stop)]
+        if "not contains(value: r._field" in query:
+            data = data[~data["field"].isin(sets[0])]
+
+        meta = {"result": "_result", "table": 0, "_start": start.to_pydatetime(), "_stop": stop.to_pydatetime(),
+                "_measurement": "mqtt_data", "topic": topic}
+        field = re.search(r'filter\(fn: \(r\) => r\._field == "([^"]*)"\)', query)
+        if field:
+            data = data[data["field"] == field.group(1)]
+            return [_table([dict(meta, _time=ts.to_pydatetime(), _field=field.group(1), _value=value)
+                            for ts, value in zip(data["time"], data["value"])])] if not data.empty else []
+        if "aggregateWindow" in query:
+            return self._pushdown(query, data, start, meta)
+        if "not types.isNumeric" in query:
+            data = data[~data["value"].map(_is_numeric)]
+        return self._pivot(data, meta)
+
+    @staticmethod
+    def _pivot(data, meta):
+        if data.empty:
+            return []
+        wide = data.pivot(index="time", columns="field", values="value")
+        wide = wide[sorted(wide.columns)].astype(object)
+        rows = []
+        for ts, values in wide.iterrows():
+            row = dict(meta, _time=ts.to_pydatetime())
+            row.update({k: (None if isinstance(v, float) and math.isnan(v) else v) for k, v in values.items()})
+            rows.append(row)
+        return [_table(rows)]
+
+    def _pushdown(self, query, data, start, meta):
+        data = data[data["value"].map(_is_numeric)].copy()
+        if data.empty:
+            return []
+        data["value"] = data["value"].astype(float)
+        every = pd.Timedelta(minutes=int(re.search(r"every: (\d+)m", query).group(1)))
+        window = EPOCH + ((data["time"] - EPOCH) // every) * every
+        data["window"] = window.where(window > start, start)
+
+        series = []
+        # Field classes: `name = data |> filter(... contains(set)) |> aggregateWindow(fn: ...)`
+        for negate, names, fn in re.findall(
+                r"= data\s*\|> filter\(fn: \(r\) => (not )?contains\(value: r\._field, set: (\[[^\]]*\])\)\)"
+                r"\s*\|> aggregateWindow\([^)]*fn: (\w+)", query):
+            selected = data["field"].isin(json.loads(names))
+            part = data[~selected if negate else selected]
+            series.append(getattr(part.groupby(["field", "window"])["value"], fn)())
+
+        # Wind components: pivot WindSpeed/WindDir, map to u/v, then aggregateWindow
+        wind = data[data["field"].isin(["WindSpeed", "WindDir"])].pivot(index="time", columns="field", values="value")
+        components = re.findall(r'_field: "(\w+)", _value: r\.WindSpeed \* math\.(sin|cos)\(x: r\.WindDir \* math\.pi / 180\.0\)'
+                                r'.*?aggregateWindow\([^)]*fn: (\w+)', query, re.S)
+        if {"WindSpeed", "WindDir"}.issubset(wind.columns):
+            wind = wind.dropna(subset=["WindSpeed", "WindDir"])
+            windows = data.drop_duplicates("time").set_index("time")["window"].reindex(wind.index).to_numpy()
+            for name, trig, fn in components:
+                values = [s * getattr(math, trig)(d * math.pi / 180.0) for s, d in zip(wind["WindSpeed"], wind["WindDir"])]
+                comp = getattr(pd.Series(values, index=wind.index).groupby(windows), fn)()
+                series.append(pd.concat({name: comp}, names=["field", "window"]))
+
+        long = pd.concat([s for s in series if not s.empty]).rename("value").reset_index()
+        return self._pivot(long.rename(columns={"window": "time"}), meta)
+
+
+def synthetic_frame(rows=4320, start="2024-03-01T00:00:00Z", step_seconds=60, seed=7):
+    """
+    Davis-like raw rows (one per sample, "time" + fields): 1-minute samples with
+    jitter, cumulative rain with daily resets, a string field and an excluded field.
+    """
+    random = np.random.RandomState(seed)
+    minutes = np.arange(rows)
+    times = pd.Timestamp(start) + pd.to_timedelta(minutes * step_seconds + random.randint(0, 20, rows), unit="s")
+    rain_rate = np.clip(random.normal(0.0, 0.05, rows), 0, None).round(2)
+    rain_day = pd.Series(rain_rate / 60.0).groupby(np.asarray(times.normalize())).cumsum().round(2).to_numpy()
+
+    return pd.DataFrame({
+        "time": times,
+        "TempOut": (60 + 10 * np.sin(minutes / 400.0) + random.normal(0, 0.3, rows)).round(1),
+        "HumOut": np.clip(70 + random.normal(0, 5, rows), 0, 100).round(0),
+        "Barometer": (29.9 + random.normal(0, 0.01, rows)).round(3),
+        "WindSpeed": np.abs(random.normal(3, 2, rows)).round(1),
+        "WindDir": random.randint(0, 360, rows).astype(float),
+        "RainRate": rain_rate,
+        "RainDay": rain_day,
+        "RainMonth": (rain_day + 4.2).round(2),
+        "RainYear": (rain_day + 31.7).round(2),
+        "ForecastIcon": random.randint(0, 8, rows).astype(float),
+        "BatteryStatus": "OK",
+    })
+
+
+def synthetic_points(topic="station-1", days=3, **kwargs):
+    """synthetic_frame as raw Influx points (time, topic, field, value)."""
+    frame = synthetic_frame(rows=days * 86400 // kwargs.get("step_seconds", 60), **kwargs)
+    points = frame.melt(id_vars="time", var_name="field", value_name="value")
+    points["topic"] = topic
+    points["value"] = [v if isinstance(v, str) else float(v) for v in points["value"]]
+    return points
+
+
+def with_gaps(points):
+    """Drop whole periods (one across midnight) and the wind direction for one hour."""
+    t = points["time"]
+    outage = ((t >= "2024-03-01T10:00:00Z") & (t < "2024-03-01T13:30:00Z")) | \
+             ((t >= "2024-03-02T18:00:00Z") & (t < "2024-03-03T02:00:00Z"))
+    no_dir = (t >= "2024-03-02T05:00:00Z") & (t < "2024-03-02T06:00:00Z") & (points["field"] == "WindDir")
+    return points[~(outage | no_dir)].reset_index(drop=True)
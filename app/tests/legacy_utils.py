@@ -0,0 +1,128 @@
+"""
+Reference copy of the original aggregation code (utils.py before the
+vectorisation work), kept only to check that the current implementation
+produces the same output. The debug prints are removed; nothing else changed.
+
+window_weather_per_class is the first aggregation phase as it was before the
+single-pass resampling (one resample per column class).
+"""
+
+import numpy as np
+import pandas as pd
+
+import utils
+
+
+def f_to_c(temp_f):
+    return (temp_f - 32) * 5.0 / 9.0
+
+
+def apply_unit_conversions(df: pd.DataFrame, cfg: dict) -> pd.DataFrame:
+    if "units" not in cfg:
+        return df
+
+    df = df.copy()
+
+    for col, uconf in cfg["units"].items():
+        if col not in df.columns:
+            continue
+
+        if "convert" in uconf:
+            if uconf["convert"].lower() == "ftoc":
+                df[col] = df[col].apply(lambda x: f_to_c(x) if pd.notnull(x) else np.nan)
+
+        elif "factor" in uconf:
+            try:
+                df[col] = df[col].astype(float) * float(uconf["factor"])
+            except Exception:
+                pass
+
+    return df
+
+
+def ensure_monotonic_progressive(series: pd.Series) -> pd.Series:
+    if series.empty:
+        return series
+
+    values = series.fillna(0).to_numpy()
+    corrected = np.zeros_like(values, dtype=float)
+    offset = 0.0
+    corrected[0] = values[0]
+
+    for i in range(1, len(values)):
+        if values[i] < values[i - 1]:
+            offset += values[i - 1]
+        corrected[i] = values[i] + offset
+
+    return pd.Series(corrected, index=series.index)
+
+
+def aggregate_weather(df: pd.DataFrame, interval_minutes: int, cfg: dict):
+    if df.empty:
+        return df
+
+    df = df.copy()
+    df["time"] = pd.to_datetime(df["time"], utc=True)
+    df = df.set_index("time")
+
+    df.drop(columns=[c for c in cfg["excluded"] if c in df.columns], inplace=True, errors="ignore")
+
+    for col in df.columns:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+
+    agg = df.resample(f"{interval_minutes}min").mean()
+
+    for col in cfg["rain"]:
+        if col in df.columns:
+            if col.lower() == "rainrate":
+                agg[col] = df[col].resample(f"{interval_minutes}min").mean()
+            else:
+                last_vals = df[col].resample(f"{interval_minutes}min").last()
+                agg[col] = ensure_monotonic_progressive(last_vals)
+
+    if {"WindSpeed", "WindDir"}.issubset(df.columns):
+        rad = np.deg2rad(df["WindDir"])
+        u = df["WindSpeed"] * np.sin(rad)
+        v = df["WindSpeed"] * np.cos(rad)
+        u_mean = u.resample(f"{interval_minutes}min").mean()
+        v_mean = v.resample(f"{interval_minutes}min").mean()
+        agg["WindSpeed"] = np.sqrt(u_mean**2 + v_mean**2)
+        agg["WindDir"] = (np.degrees(np.arctan2(u_mean, v_mean)) + 360) % 360
+
+    agg = agg.reset_index()
+
+    agg = apply_unit_conversions(agg, cfg)
+
+    wind_cols = cfg.get("wind", set())
+    for col in agg.columns:
+        if col not in wind_cols and pd.api.types.is_numeric_dtype(agg[col]):
+            agg[col] = agg[col].round(2)
+
+    return agg
+
+
+def window_weather_per_class(df: pd.DataFrame, interval_minutes: int, cfg: dict, origin=None) -> pd.DataFrame:
+    df = df.copy()
+    df["time"] = pd.to_datetime(df["time"], utc=True)
+    df = df.set_index("time")
+
+    df.drop(columns=[c for c in cfg["excluded"] if c in df.columns], inplace=True, errors="ignore")
+
+    for col in df.columns:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+
+    rule = f"{interval_minutes}min"
+    bins = {"origin": origin} if origin is not None else {}
+
+    agg = df.resample(rule, **bins).mean()
+
+    for col in utils.cumulative_rain_columns(cfg):
+        if col in df.columns:
+            agg[col] = df[col].resample(rule, **bins).last()
+
+    if {"WindSpeed", "WindDir"}.issubset(df.columns):
+        rad = np.deg2rad(df["WindDir"])
+        agg[utils.WIND_U] = (df["WindSpeed"] * np.sin(rad)).resample(rule, **bins).mean()
+        agg[utils.WIND_V] = (df["WindSpeed"] * np.cos(rad)).resample(rule, **bins).mean()
+
+    return agg
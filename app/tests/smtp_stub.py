@@ -0,0 +1,79 @@
+"""
+In-process SMTP stand-in for the notifier tests (plain SMTP, no STARTTLS).
+
+Speaks enough of the protocol for smtplib (EHLO/HELO, MAIL, RCPT, DATA,
+NOOP, RSET, QUIT) and records what it saw:
+
+- connections : TCP connections accepted
+- messages    : email.message.Message of every accepted DATA
+- attempts    : DATA commands received, refused ones included
+
+fail_next = n answers the next n messages with 451 (transient failure).
+"""
+
+import email
+import socketserver
+import threading
+
+
+class SmtpStub:
+    def __init__(self):
+        self.connections = 0
+        self.messages = []
+        self.attempts = 0
+        self.fail_next = 0
+        self._lock = threading.Lock()
+
+        stub = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(line.encode() + b"\r\n")
+
+            def handle(self):
+                with stub._lock:
+                    stub.connections += 1
+                self.reply("220 stub ESMTP")
+                for raw in self.rfile:
+                    command = raw.decode().strip().upper()
+                    if command.startswith("EHLO"):
+                        self.reply("250-stub")
+                        self.reply("250 8BITMIME")
+                    elif command.startswith("DATA"):
+                        self.reply("354 end with .")
+                        self.reply(stub._receive(self.rfile))
+                    elif command.startswith("QUIT"):
+                        self.reply("221 bye")
+                        return
+                    elif command[:4] in ("HELO", "MAIL", "RCPT", "NOOP", "RSET"):
+                        self.reply("250 OK")
+                    else:
+                        self.reply("500 unknown command")
+
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.host, self.port = self.server.server_address
+        self._thread = threading.Thread(target=self.server.serve_forever, name="smtp-stub", daemon=True)
+
+    def _receive(self, rfile):
+        lines = []
+        for raw in rfile:
+            line = raw.decode().rstrip("\r\n")
+            if line == ".":
+                break
+            lines.append(line[1:] if line.startswith("..") else line)
+        with self._lock:
+            self.attempts += 1
+            if self.fail_next > 0:
+                self.fail_next -= 1
+                return "451 try again later"
+            self.messages.append(email.message_from_string("\n".join(lines)))
+        return "250 queued"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
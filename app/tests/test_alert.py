@@ -0,0 +1,72 @@
+"""Status monitor scheduling: one heartbeat query per group of stations and cycle."""
+
+import asyncio
+import os
+
+# alert.py opens its database engine and Influx client at import
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("INFLUXDB_URL", "http://localhost:8086")
+
+import alert  # noqa: E402
+
+
+class Dispatcher:
+    def enqueue(self, station_id, station_name, status):
+        pass
+
+
+def instruments(count, field, interval, first=0):
+    return [{"id": f"station-{first + i}", "name": f"Station {first + i}", "status": "offline",
+             "heartbeat": field, "interval": interval} for i in range(count)]
+
+
+def test_one_query_per_group_and_cycle(monkeypatch):
+    # 300 stations in two groups (weather stations and tide gauges), 0.2 s interval, 1 s run
+    stations = instruments(200, "TempOut", 0.2) + instruments(100, "SeaLevel", 0.2, first=200)
+    queries = []
+    monkeypatch.setattr(alert, "load_instruments", lambda: [dict(s) for s in stations])
+    monkeypatch.setattr(alert, "latest_heartbeats", lambda field, topics: queries.append((field, len(topics))) or {})
+
+    monitor = alert.StatusMonitor()
+    monitor.dispatcher = Dispatcher()
+
+    async def run():
+        await monitor.sync_stations()
+        await asyncio.sleep(1.0)
+        for task in monitor.tasks.values():
+            task.cancel()
+        await asyncio.gather(*monitor.tasks.values(), return_exceptions=True)
+
+    asyncio.run(run())
+
+    per_field = {field: [size for f, size in queries if f == field] for field in ("TempOut", "SeaLevel")}
+    # Every query covers its whole group...
+    assert set(per_field["TempOut"]) == {200}
+    assert set(per_field["SeaLevel"]) == {100}
+    # ...and there is one per cycle: at most 1 s / (0.2 s * (1 - jitter)) + the first run
+    cycles = int(1.0 / (0.2 * (1 - alert.CHECK_JITTER))) + 1
+    for sizes in per_field.values():
+        assert 3 <= len(sizes) <= cycles
+
+
+def test_groups_follow_the_instrument_list(monkeypatch):
+    stations = instruments(3, "TempOut", 60) + instruments(2, "Temp", 300, first=3)
+    monkeypatch.setattr(alert, "load_instruments", lambda: [dict(s) for s in stations])
+    monitor = alert.StatusMonitor()
+
+    async def run():
+        await monitor.sync_stations()
+        first = set(monitor.tasks)
+        del stations[3:]
+        await monitor.sync_stations()
+        await asyncio.sleep(0)
+        tasks = list(monitor.tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return first, set(monitor.tasks)
+
+    first, second = asyncio.run(run())
+    assert first == {("TempOut", 60), ("Temp", 300)}
+    assert second == {("TempOut", 60)}
+    assert set(monitor.stations) == {"station-0", "station-1", "station-2"}
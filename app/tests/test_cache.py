@@ -0,0 +1,58 @@
+"""Snapshot cache staleness and the registry hooks that drive it."""
+
+import threading
+import time
+
+from cache import SnapshotCache
+from registry import InstrumentRegistry
+
+
+def counting_loader():
+    calls = []
+
+    def load():
+        calls.append(time.time())
+        return len(calls)
+    return load, calls
+
+
+def test_mark_stale_serves_snapshot_and_refreshes_in_background():
+    load, calls = counting_loader()
+    cache = SnapshotCache(load, ttl=60, stale_ttl=300)
+    assert cache.get() == 1
+
+    cache.mark_stale()
+    assert cache.get() == 1                 # no cold load in the request
+    deadline = time.time() + 5
+    while len(calls) < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    while cache._refreshing and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert cache.get() == 2
+    assert cache.stats()["stale_hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_mark_stale_survives_shared_file(tmp_path):
+    path = str(tmp_path / "snapshot.json")
+    load, calls = counting_loader()
+    writer = SnapshotCache(load, ttl=60, path=path)
+    writer.get()
+
+    reader = SnapshotCache(lambda: "fresh", ttl=60, path=path)
+    reader.mark_stale()
+    # The file written before the change is adopted, but as stale
+    assert reader.get() == 1
+    assert reader.stats()["stale_hits"] == 1
+
+
+def test_status_notifications_skip_on_change_hooks():
+    registry = InstrumentRegistry()
+    hooks = threading.Event()
+    registry.on_change.append(hooks.set)
+
+    registry.invalidate(status_only=True)
+    assert not hooks.is_set() and registry.invalidations == 1
+
+    registry.invalidate()
+    assert hooks.is_set()
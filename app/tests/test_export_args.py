@@ -0,0 +1,32 @@
+"""Format/compression validation shared by the export endpoints."""
+
+import pytest
+
+import app as webapp
+import influx
+
+REQUESTS = [
+    ("get", "/timeseries/station-1?format={fmt}&compression={compression}"),
+    ("get", "/api/timeseries/batch?ids=station-1&format={fmt}&compression={compression}"),
+    ("post", "/api/exports?instrument_id=station-1&format={fmt}&compression={compression}"),
+]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(webapp.registry, "get", lambda instrument_id: {"id": instrument_id})
+    monkeypatch.setattr(influx, "query_api", lambda: None)      # rejected before any query
+    flask_app = webapp.create_app({"SQLALCHEMY_DATABASE_URI": "sqlite://", "SECRET_KEY": "test",
+                                   "LOGIN_DISABLED": True})
+    return flask_app.test_client()
+
+
+@pytest.mark.parametrize("method, url", REQUESTS)
+@pytest.mark.parametrize("fmt, compression, error", [
+    ("xlsx", "", "Unsupported format 'xlsx' (use csv, parquet, arrow)"),
+    ("parquet", "lzma", "Unsupported compression 'lzma'"),
+])
+def test_export_endpoints_reject_the_same_formats(client, method, url, fmt, compression, error):
+    response = getattr(client, method)(url.format(fmt=fmt, compression=compression))
+    assert response.status_code == 400
+    assert response.get_json() == {"error": error}
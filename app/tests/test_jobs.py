@@ -0,0 +1,74 @@
+"""Export jobs: status files, progress and jobs orphaned by their worker process."""
+
+import json
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import jobs
+
+
+@pytest.fixture
+def export_jobs(tmp_path):
+    return jobs.ExportJobs(str(tmp_path), workers=1, stale_after=3600)
+
+
+def wait_finished(export_jobs, job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = export_jobs.status(job_id)
+        if status["status"] not in jobs.PENDING:
+            return status
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+def test_job_runs_and_reports_progress(export_jobs):
+    reported = []
+
+    def work(params, path, progress):
+        for fraction in (0.5, 1.0):
+            progress(fraction)
+            reported.append(export_jobs.status(export_jobs.job_id(params))["progress"])
+        with open(path, "w") as fh:
+            fh.write("time\n")
+
+    status = export_jobs.submit({"instrument_id": "station-1"}, work, "csv")
+    done = wait_finished(export_jobs, status["id"])
+
+    assert done["status"] == "done" and done["progress"] == 1.0
+    assert reported[0] == 0.5
+    assert export_jobs.result_path(status["id"]).endswith(".csv")
+
+
+def test_job_of_dead_worker_is_failed(export_jobs, tmp_path):
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+
+    job_id = export_jobs.job_id({"instrument_id": "station-1"})
+    status = {"id": job_id, "status": "running", "progress": 0.3, "params": {}, "file": f"{job_id}.csv",
+              "created": time.time(), "finished": None, "error": None,
+              "owner": {"host": jobs.HOST, "pid": dead.pid}}
+    (tmp_path / f"{job_id}.json").write_text(json.dumps(dict(status, updated=time.time())))
+
+    assert export_jobs.status(job_id)["status"] == "failed"
+
+    # ...and can be resubmitted at once
+    release = threading.Event()
+    resubmitted = export_jobs.submit({"instrument_id": "station-1"}, lambda *args: release.wait(5), "csv")
+    assert resubmitted["status"] in jobs.PENDING
+    assert resubmitted["owner"]["pid"] != dead.pid
+    release.set()
+
+
+def test_job_of_live_worker_stays_running(export_jobs, tmp_path):
+    job_id = "abc123"
+    status = {"id": job_id, "status": "running", "progress": 0.3, "params": {}, "file": f"{job_id}.csv",
+              "created": time.time(), "finished": None, "error": None, "updated": time.time(),
+              "owner": {"host": jobs.HOST, "pid": 1}}
+    (tmp_path / f"{job_id}.json").write_text(json.dumps(status))
+
+    assert export_jobs.status(job_id)["status"] == "running"
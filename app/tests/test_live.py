@@ -0,0 +1,49 @@
+"""SSE live feed: per-process stream cap, bounded lifetime, shutdown."""
+
+import threading
+import time
+
+from live import LiveFeed
+
+
+def feed(**kwargs):
+    live = LiveFeed(snapshot=lambda: [{"id": "station-1", "variables": {"TempOut": 1.0}}], interval=3600, **kwargs)
+    live._thread = threading.current_thread()     # no poller thread in tests
+    live.poll()
+    return live
+
+
+def test_acquire_caps_streams():
+    live = feed(max_clients=2)
+    assert live.acquire() and live.acquire()
+    assert not live.acquire()
+    assert live.stats()["rejected"] == 1
+
+    live.release()
+    assert live.acquire()
+    assert live.stats()["clients"] == 2
+
+
+def test_stream_starts_with_retry_hint_and_ends_after_lifetime():
+    live = feed(max_lifetime=0.2, retry=5)
+    started = time.monotonic()
+    messages = list(live.stream(keepalive=0.05))
+
+    assert time.monotonic() - started < 2
+    assert messages[0].startswith("retry: 5000\n")
+    assert "event: snapshot" in messages[0]
+
+
+def test_stream_ends_when_not_accepting():
+    live = feed(max_lifetime=3600)
+    accepting = threading.Event()
+    accepting.set()
+    live.accepting = accepting.is_set
+
+    stream = live.stream(keepalive=3600)
+    next(stream)
+    threading.Timer(0.1, lambda: (accepting.clear(), live.wake())).start()
+    started = time.monotonic()
+    assert list(stream) == []
+    assert time.monotonic() - started < 2
+    assert not live.acquire()
@@ -0,0 +1,40 @@
+"""/metrics access and the query labels reported to it."""
+
+import pytest
+
+import app as webapp
+import influx
+
+
+@pytest.fixture
+def client():
+    flask_app = webapp.create_app({"SQLALCHEMY_DATABASE_URI": "sqlite://", "SECRET_KEY": "test"})
+    return flask_app.test_client()
+
+
+def test_metrics_disabled_without_token(client, monkeypatch):
+    monkeypatch.setattr(webapp, "METRICS_TOKEN", None)
+    assert client.get("/metrics").status_code == 404
+
+
+def test_metrics_require_bearer_token(client, monkeypatch):
+    monkeypatch.setattr(webapp, "METRICS_TOKEN", "s3cret")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+
+    response = client.get("/metrics", headers={"Authorization": "Bearer s3cret"})
+    assert response.status_code == 200
+    assert b"http_request_duration_seconds" in response.data
+
+
+def test_queries_are_labelled_by_call_site(monkeypatch):
+    class Api:
+        def query(self, query, org=None):
+            return []
+
+    observed = []
+    monkeypatch.setattr(influx, "query_observers", [lambda *args: observed.append(args)])
+    influx.TimedQueryApi(Api()).query("from(bucket: \"b\")", org="o", name="field_keys")
+    influx.TimedQueryApi(Api()).query("from(bucket: \"b\")")
+
+    assert [name for name, _, rows in observed] == ["field_keys", "unnamed"]
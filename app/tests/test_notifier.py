@@ -0,0 +1,96 @@
+"""Alert delivery against a local SMTP stand-in: digests, retries, connection reuse."""
+
+import asyncio
+import time
+
+import pytest
+
+from notifier import AlertDispatcher
+from smtp_stub import SmtpStub
+
+
+@pytest.fixture
+def smtp():
+    stub = SmtpStub().start()
+    yield stub
+    stub.stop()
+
+
+def dispatcher(smtp, **kwargs):
+    options = dict(window=0.2, max_retries=3, backoff=0.01, starttls=False, timeout=5)
+    options.update(kwargs)
+    return AlertDispatcher(smtp.host, smtp.port, "monitor@example.org", ["ops@example.org"], **options)
+
+
+async def until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached")
+        await asyncio.sleep(0.01)
+
+
+def run(dispatch, scenario):
+    async def main():
+        task = asyncio.create_task(dispatch.run())
+        try:
+            await scenario()
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+    asyncio.run(main())
+
+
+def test_alerts_in_one_window_make_one_digest(smtp):
+    dispatch = dispatcher(smtp)
+
+    async def scenario():
+        for i in range(3):
+            dispatch.enqueue(f"station-{i}", f"Station {i}", "offline")
+        await until(lambda: dispatch.sent)
+        await asyncio.sleep(0.3)
+
+    run(dispatch, scenario)
+    assert len(smtp.messages) == 1
+    assert smtp.messages[0]["Subject"] == "ALERT: 3 stations went offline"
+    assert "Station 2 (ID station-2)" in smtp.messages[0].get_payload()[0].get_payload()
+
+
+def test_transient_failure_is_retried(smtp):
+    smtp.fail_next = 2
+    dispatch = dispatcher(smtp, window=0)
+
+    async def scenario():
+        dispatch.enqueue("station-1", "Station 1", "offline")
+        await until(lambda: dispatch.sent or dispatch.failed)
+
+    run(dispatch, scenario)
+    assert (dispatch.sent, dispatch.failed) == (1, 0)
+    assert smtp.attempts == 3
+    assert smtp.messages[0]["Subject"] == "ALERT: Station Station 1 (station-1) is now OFFLINE"
+
+
+def test_gives_up_after_max_retries(smtp):
+    smtp.fail_next = 10
+    dispatch = dispatcher(smtp, window=0, max_retries=2)
+
+    async def scenario():
+        dispatch.enqueue("station-1", "Station 1", "offline")
+        await until(lambda: dispatch.sent or dispatch.failed)
+
+    run(dispatch, scenario)
+    assert (dispatch.sent, dispatch.failed) == (0, 1)
+    assert smtp.attempts == 3 and smtp.messages == []
+
+
+def test_connection_is_reused_across_sends(smtp):
+    dispatch = dispatcher(smtp, window=0)
+
+    async def scenario():
+        for i in range(3):
+            dispatch.enqueue(f"station-{i}", f"Station {i}", "online")
+            await until(lambda: dispatch.sent == i + 1)
+
+    run(dispatch, scenario)
+    assert len(smtp.messages) == 3
+    assert smtp.connections == 1
@@ -0,0 +1,142 @@
+"""Rollup tiers: downsampler + router against an in-memory stand-in store."""
+
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+import rollups
+import utils
+from config.loader import load_aggregation_config
+from fake_influx import synthetic_frame
+
+DATA_START = datetime(2024, 3, 1)
+DATA_END = DATA_START + timedelta(days=9)
+TOPIC = "station-1"
+
+
+class MemoryRollupStore:
+    """Stand-in for InfluxRollupStore: raw rows in a frame, rollup windows in a dict."""
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.windows = {}
+        self.raw_reads = []
+
+    def read_raw(self, topic, start, stop):
+        self.raw_reads.append((start, stop))
+        t = self.frame["time"]
+        part = self.frame[(t >= pd.Timestamp(start, tz="UTC")) & (t < pd.Timestamp(stop, tz="UTC"))]
+        return part.to_dict("records")
+
+    def latest_window(self, topic, tier):
+        stored = self.windows.get((topic, tier))
+        return None if stored is None else stored.index.max().to_pydatetime().replace(tzinfo=None)
+
+    def earliest_window(self, topic, tier):
+        stored = self.windows.get((topic, tier))
+        return None if stored is None else stored.index.min().to_pydatetime().replace(tzinfo=None)
+
+    def read_windows(self, topic, tier, start, stop):
+        stored = self.windows.get((topic, tier), pd.DataFrame())
+        if stored.empty:
+            return stored
+        return stored[(stored.index >= pd.Timestamp(start, tz="UTC")) & (stored.index < pd.Timestamp(stop, tz="UTC"))]
+
+    def write_windows(self, topic, tier, windows):
+        stored = self.windows.get((topic, tier))
+        merged = windows if stored is None else pd.concat([stored[~stored.index.isin(windows.index)], windows])
+        self.windows[(topic, tier)] = merged.sort_index()
+        return len(windows)
+
+
+@pytest.fixture(scope="module")
+def cfg():
+    return load_aggregation_config()
+
+
+@pytest.fixture(scope="module")
+def frame():
+    return synthetic_frame(rows=9 * 1440, start="2024-03-01T00:00:00Z").drop(columns=["BatteryStatus"])
+
+
+def downsampled(frame, cfg, backfill_days):
+    store = MemoryRollupStore(frame)
+    rollups.Downsampler(store, cfg, backfill=timedelta(days=backfill_days)).run_once([TOPIC], now=DATA_END)
+    return store
+
+
+def expected_windows(frame, start, end, interval, cfg):
+    t = frame["time"]
+    part = frame[(t >= pd.Timestamp(start, tz="UTC")) & (t < pd.Timestamp(end, tz="UTC"))]
+    windows = utils.window_weather(part, interval, cfg, origin="epoch")
+    return windows[windows.notna().any(axis=1)]
+
+
+def assert_same_windows(actual, expected):
+    actual = actual[actual.notna().any(axis=1)]
+    pd.testing.assert_frame_equal(actual[sorted(expected.columns)], expected[sorted(expected.columns)],
+                                  check_freq=False, check_names=False, rtol=1e-9)
+
+
+@pytest.mark.parametrize("interval", [10, 60, 1440])
+def test_router_matches_raw_windows_when_covered(frame, cfg, interval):
+    store = downsampled(frame, cfg, backfill_days=10)
+    tier = rollups.pick_tier(interval)
+    start, end = datetime(2024, 3, 2, 5, 7), datetime(2024, 3, 8, 21, 45)
+
+    windows = rollups.fetch_windows(store, TOPIC, tier, start, end, interval, cfg)
+    assert windows is not None
+    assert_same_windows(windows, expected_windows(frame, start, end, interval, cfg))
+
+
+def test_partial_coverage_falls_back(frame, cfg):
+    # Only two days rolled up: a nine-day hourly request must not come back truncated
+    store = downsampled(frame, cfg, backfill_days=2)
+    assert store.earliest_window(TOPIC, "1h") >= DATA_END - timedelta(days=2)
+
+    assert rollups.fetch_windows(store, TOPIC, "1h", DATA_START, DATA_END, 60, cfg) is None
+
+
+def test_short_uncovered_head_is_read_raw(frame, cfg):
+    store = downsampled(frame, cfg, backfill_days=2)
+    start = store.earliest_window(TOPIC, "10m") - timedelta(hours=3, minutes=5)
+
+    windows = rollups.fetch_windows(store, TOPIC, "10m", start, DATA_END, 10, cfg)
+    assert windows is not None
+    assert (start, store.earliest_window(TOPIC, "10m")) in store.raw_reads
+    assert_same_windows(windows, expected_windows(frame, start, DATA_END, 10, cfg))
+
+
+def test_no_rollups(frame, cfg):
+    store = MemoryRollupStore(frame)
+    assert rollups.fetch_windows(store, TOPIC, "1h", DATA_START, DATA_END, 60, cfg) is None
+
+
+def test_pick_tier():
+    assert rollups.pick_tier(10) == "10m"
+    assert rollups.pick_tier(30) == "10m"
+    assert rollups.pick_tier(120) == "1h"
+    assert rollups.pick_tier(1440) == "1d"
+    assert rollups.pick_tier(7) is None
+
+
+def test_rebuild_picks_up_late_points(frame, cfg):
+    store = downsampled(frame, cfg, backfill_days=10)
+    # A backfill rewrites two hours of already rolled-up data
+    late = frame.copy()
+    hours = (late["time"] >= "2024-03-04T10:00:00Z") & (late["time"] < "2024-03-04T12:00:00Z")
+    late.loc[hours, "TempOut"] += 10
+    store.frame = late
+
+    start, end = datetime(2024, 3, 2), datetime(2024, 3, 8)
+    stale = rollups.fetch_windows(store, TOPIC, "1h", start, end, 60, cfg)
+    with pytest.raises(AssertionError):
+        assert_same_windows(stale, expected_windows(late, start, end, 60, cfg))
+
+    written = rollups.Downsampler(store, cfg).rebuild(TOPIC, datetime(2024, 3, 4, 10, 0, 5),
+                                                      datetime(2024, 3, 4, 11, 59))
+    assert written["1h"] == 2 and written["1d"] == 1 and written["10m"] == 12
+    for interval in (10, 60, 1440):
+        windows = rollups.fetch_windows(store, TOPIC, rollups.pick_tier(interval), start, end, interval, cfg)
+        assert_same_windows(windows, expected_windows(late, start, end, interval, cfg))
@@ -0,0 +1,81 @@
+"""/upload_influx: dedup against the points already in Influx and the counts it returns."""
+
+import io
+
+import pandas as pd
+import pytest
+
+import app as webapp
+import influx
+from fake_influx import FakeQueryApi
+
+EXISTING = ["2024-03-01 10:00:00", "2024-03-01 10:01:00"]
+UPLOAD = EXISTING + ["2024-03-01 10:02:00", "2024-03-01 10:03:00", "2024-03-01 10:03:00", "2024-03-01 10:04:00"]
+
+
+class FakeWriteApi:
+    def __init__(self, client, error_callback):
+        self.client, self.error_callback = client, error_callback
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def write(self, bucket, org, record, **kwargs):
+        lines = "\n".join(f"mqtt_data,topic={t} {ts}" for t, ts in zip(record["topic"], record.index))
+        if self.client.fail:
+            self.error_callback(None, lines.encode(), RuntimeError("write refused"))
+        else:
+            self.client.written.append(record)
+
+
+class FakeClient:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.written = []
+
+    def write_api(self, write_options=None, error_callback=None):
+        return FakeWriteApi(self, error_callback)
+
+
+@pytest.fixture
+def upload(monkeypatch):
+    points = pd.DataFrame({"time": pd.to_datetime(EXISTING, utc=True), "topic": "station-1",
+                           "field": "Datetime", "value": EXISTING})
+    monkeypatch.setattr(influx, "query_api", lambda: FakeQueryApi(points))
+    backfills = []
+    monkeypatch.setattr(webapp, "backfilled", lambda client, topic, first, last: backfills.append((topic, first, last)))
+
+    flask_app = webapp.create_app({"SQLALCHEMY_DATABASE_URI": "sqlite://", "SECRET_KEY": "test",
+                                   "LOGIN_DISABLED": True})
+    client = flask_app.test_client()
+
+    def post(influx_client):
+        monkeypatch.setattr(influx, "get_client", lambda: influx_client)
+        csv = pd.DataFrame({"Datetime": UPLOAD, "TempOut": range(len(UPLOAD))}).to_csv(index=False)
+        response = client.post("/upload_influx", data={"topic": "station-1", "file": (io.BytesIO(csv.encode()), "up.csv")})
+        assert response.status_code == 200
+        return response.get_json(), backfills
+
+    return post
+
+
+def test_skips_existing_and_repeated_rows(upload):
+    influx_client = FakeClient()
+    result, backfills = upload(influx_client)
+
+    assert (result["inserted_count"], result["skipped_count"], result["failed_count"]) == (3, 3, 0)
+    written = pd.concat(influx_client.written)
+    assert list(written["Datetime"]) == ["2024-03-01 10:02:00", "2024-03-01 10:03:00", "2024-03-01 10:04:00"]
+    assert set(written["topic"]) == {"station-1"}
+    assert backfills == [("station-1", pd.Timestamp("2024-03-01 10:02:00", tz="UTC"),
+                          pd.Timestamp("2024-03-01 10:04:00", tz="UTC"))]
+
+
+def test_failed_batches_are_counted_and_not_backfilled(upload):
+    result, backfills = upload(FakeClient(fail=True))
+
+    assert (result["inserted_count"], result["skipped_count"], result["failed_count"]) == (0, 3, 3)
+    assert backfills == []
@@ -0,0 +1,72 @@
+"""The vectorised aggregation must reproduce the original output exactly."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import legacy_utils
+import utils
+from config.loader import load_aggregation_config
+from fake_influx import synthetic_frame
+
+
+@pytest.fixture(scope="module")
+def cfg():
+    return load_aggregation_config()
+
+
+def with_gaps(frame):
+    t = frame["time"]
+    frame = frame[~((t >= "2024-03-01T10:00:00Z") & (t < "2024-03-01T13:30:00Z"))].copy()
+    frame.loc[frame.index[::7], "WindDir"] = np.nan
+    frame.loc[frame.index[::11], "TempOut"] = None
+    return frame
+
+
+@pytest.mark.parametrize("gaps", [False, True], ids=["continuous", "gaps"])
+@pytest.mark.parametrize("interval", [1, 10, 60, 1440])
+def test_aggregate_weather_matches_original(interval, gaps, cfg):
+    frame = synthetic_frame(rows=3 * 1440)
+    if gaps:
+        frame = with_gaps(frame)
+
+    pd.testing.assert_frame_equal(utils.aggregate_weather(frame, interval, cfg),
+                                  legacy_utils.aggregate_weather(frame, interval, cfg), check_exact=True)
+
+
+@pytest.mark.parametrize("interval", [1, 10, 60, 1440])
+def test_single_pass_windows_match_per_class_resampling(interval, cfg):
+    frame = with_gaps(synthetic_frame(rows=3 * 1440))
+    pd.testing.assert_frame_equal(utils.window_weather(frame, interval, cfg),
+                                  legacy_utils.window_weather_per_class(frame, interval, cfg), check_exact=True)
+
+
+def random_cumulative(n, seed):
+    random = np.random.RandomState(seed)
+    values = np.cumsum(random.uniform(0, 1, n))
+    resets = random.rand(n) < 0.02
+    values = values - np.maximum.accumulate(np.where(resets, values, 0))
+    values[random.rand(n) < 0.05] = np.nan
+    return pd.Series(values, index=pd.date_range("2024-01-01", periods=n, freq="10min"))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_ensure_monotonic_bit_for_bit(seed):
+    series = random_cumulative(5000, seed)
+    expected = legacy_utils.ensure_monotonic_progressive(series)
+    actual = utils.ensure_monotonic_progressive(series)
+    assert np.array_equal(actual.to_numpy(), expected.to_numpy())
+    assert actual.index.equals(expected.index)
+
+
+def test_ensure_monotonic_carry_across_chunks():
+    series = random_cumulative(3000, 11)
+    whole = utils.ensure_monotonic_progressive(series)
+    carry = {}
+    chunks = [utils.ensure_monotonic_progressive(series.iloc[a:a + 700], carry) for a in range(0, 3000, 700)]
+    assert np.array_equal(pd.concat(chunks).to_numpy(), whole.to_numpy())
+
+
+def test_ensure_monotonic_empty():
+    empty = pd.Series([], dtype=float)
+    assert utils.ensure_monotonic_progressive(empty).empty
@@ -0,0 +1,40 @@
+"""Window cache: closed days reused, retired by a new data version."""
+
+from datetime import datetime
+
+import pandas as pd
+
+from data_versions import DataVersions
+from window_cache import WindowCache
+
+NOW = datetime(2024, 3, 10)
+
+
+def fetcher(calls):
+    def fetch(start, stop):
+        calls.append((start, stop))
+        index = pd.date_range(start, stop, freq="60min", inclusive="left", tz="UTC", name="time")
+        return pd.DataFrame({"TempOut": range(len(index))}, index=index, dtype=float)
+    return fetch
+
+
+def test_data_version_retires_cached_days(tmp_path):
+    cache = WindowCache(str(tmp_path / "windows"))
+    versions = DataVersions(str(tmp_path / "versions"))
+    calls = []
+    start, end = datetime(2024, 3, 1), datetime(2024, 3, 4)
+
+    def windows():
+        return cache.windows(fetcher(calls), "station-1", 60, start, end, "cfg",
+                             versions.get("station-1"), now=NOW)
+
+    windows()
+    assert calls == [(start, end)]
+    windows()
+    assert len(calls) == 1                     # all three days from the cache
+
+    assert versions.get("station-1") == "0"
+    versions.bump("station-1")
+    assert versions.get("station-1") != "0" and versions.get("station-2") == "0"
+    assert len(windows()) == 72
+    assert calls[1:] == [(start, end)]         # recomputed after the backfill
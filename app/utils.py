@@ -1,10 +1,7 @@
-import math
 import pandas as pd
 import numpy as np
 
-import numpy as np
-import pandas as pd
-import math
+from config.units import compile_units
 
 def f_to_c(temp_f):
     """Convert Fahrenheit to Celsius."""
@@ -12,58 +9,169 @@ def f_to_c(temp_f):
 
 def apply_unit_conversions(df: pd.DataFrame, cfg: dict) -> pd.DataFrame:
     """
-    Applica i fattori di conversione o le funzioni di conversione
-    definite in config.yaml al dataframe aggregato.
+    Applica le conversioni di unità definite in aggregation.yaml al dataframe
+    aggregato: una operazione vettoriale per colonna (vedi config/units.py).
     """
-    print(cfg)
-    if "units" not in cfg:
+    conversions = cfg.get("conversions")
+    if conversions is None:
+        conversions = compile_units(cfg.get("units", {}))
+
+    converted = {
+        col: convert(pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float))
+        for col, convert in conversions
+        if col in df.columns
+    }
+    if not converted:
         return df
+    return df.assign(**converted)
 
-    df = df.copy()
-
-    for col, uconf in cfg["units"].items():
-        if col not in df.columns:
-            continue
-
-        # conversione per funzione (es. FtoC)
-        if "convert" in uconf:
-            if uconf["convert"].lower() == "ftoc":
-                print("CONVERTING")
-                df[col] = df[col].apply(lambda x: f_to_c(x) if pd.notnull(x) else np.nan)
-            # puoi aggiungere altre funzioni qui, es. "CtoK", "mps_to_kmh", ecc.
-
-        # conversione per fattore numerico
-        elif "factor" in uconf:
-            try:
-                df[col] = df[col].astype(float) * float(uconf["factor"])
-            except Exception:
-                pass
-
-    return df
-
-def ensure_monotonic_progressive(series: pd.Series) -> pd.Series:
+def ensure_monotonic_progressive(series: pd.Series, carry: dict = None) -> pd.Series:
     """
     Corregge una serie cumulativa in modo che non diminuisca mai.
     Quando rileva un reset (valore minore del precedente),
     aggiunge il valore cumulato alla differenza.
+
+    carry: stato opzionale ({"offset", "last"}) aggiornato in place, per
+    continuare la correzione tra blocchi consecutivi (export in streaming).
     """
     if series.empty:
         return series
 
-    values = series.fillna(0).to_numpy()
-    corrected = np.zeros_like(values, dtype=float)
-    offset = 0.0
-    corrected[0] = values[0]
+    values = series.fillna(0).to_numpy(dtype=float)
+
+    # Valore precedente di ogni elemento (per il primo: l'ultimo del blocco precedente)
+    prev = np.empty_like(values)
+    prev[1:] = values[:-1]
+    prev[0] = carry["last"] if carry and "last" in carry else values[0]
 
-    for i in range(1, len(values)):
-        if values[i] < values[i - 1]:
-            # Reset rilevato: inizia nuovo ciclo, somma offset
-            offset += values[i - 1]
-        corrected[i] = values[i] + offset
+    # Reset rilevato (valore minore del precedente): l'offset cresce del valore precedente.
+    # La somma cumulativa è sequenziale come nel ciclo, quindi il risultato è identico.
+    steps = np.where(values < prev, prev, 0.0)
+    steps[0] += carry.get("offset", 0.0) if carry else 0.0
+    offsets = np.cumsum(steps)
+    corrected = values + offsets
+
+    if carry is not None:
+        carry["offset"] = float(offsets[-1])
+        carry["last"] = values[-1]
 
     return pd.Series(corrected, index=series.index)
 
-def aggregate_weather(df: pd.DataFrame, interval_minutes: int, cfg: dict):
+# Colonne interne con le componenti medie del vento (u, v) tra le due fasi
+WIND_U = "_wind_u"
+WIND_V = "_wind_v"
+
+# Suffisso delle colonne con il numero di campioni di una media (vedi rollups.py)
+COUNT_SUFFIX = "__n"
+
+
+def cumulative_rain_columns(cfg: dict) -> list:
+    """Colonne di pioggia cumulative (aggregate con last), cioè tutte tranne RainRate."""
+    return sorted(c for c in cfg["rain"] if c.lower() != "rainrate")
+
+
+def window_weather(df: pd.DataFrame, interval_minutes: int, cfg: dict, origin=None, counts: bool = False) -> pd.DataFrame:
+    """
+    Prima fase dell'aggregazione: raggruppa i dati grezzi in finestre.
+      - media per le colonne normali (e RainRate)
+      - ultimo valore per le piogge cumulative
+      - media delle componenti u/v del vento (WIND_U, WIND_V)
+    Ritorna un DataFrame indicizzato per inizio finestra.
+
+    counts=True aggiunge per ogni colonna in media il numero di campioni
+    ("<col>" + COUNT_SUFFIX), per poter ricombinare le finestre (rollup).
+    """
+    # Un'unica copia: colonne escluse rimosse, indice temporale UTC
+    frame = df.drop(columns=["time"] + [c for c in cfg["excluded"] if c in df.columns])
+    frame.index = pd.DatetimeIndex(pd.to_datetime(df["time"], utc=True), name="time")
+
+    # Converti in numerico dove possibile (solo le colonne non già numeriche)
+    for col in frame.select_dtypes(exclude="number").columns:
+        frame[col] = pd.to_numeric(frame[col], errors="coerce")
+
+    # --- Vento: componenti per la media vettoriale ---
+    if {"WindSpeed", "WindDir"}.issubset(frame.columns):
+        rad = np.deg2rad(frame["WindDir"].to_numpy(dtype=float))
+        speed = frame["WindSpeed"].to_numpy(dtype=float)
+        frame[WIND_U] = speed * np.sin(rad)
+        frame[WIND_V] = speed * np.cos(rad)
+
+    rule = f"{interval_minutes}min"
+    bins = {"origin": origin} if origin is not None else {}
+
+    # Un solo raggruppamento per finestre, riusato per tutte le classi di colonne:
+    # media (normali, RainRate, u/v del vento) e ultimo valore (piogge cumulative)
+    resampler = frame.resample(rule, **bins)
+    last_cols = [c for c in cumulative_rain_columns(cfg) if c in frame.columns]
+    mean_cols = [c for c in frame.columns if c not in last_cols]
+
+    parts = [resampler[mean_cols].mean()] if mean_cols else []
+    if last_cols:
+        parts.append(resampler[last_cols].last())
+    if not parts:
+        return pd.DataFrame(index=resampler.size().index)
+    agg = pd.concat(parts, axis=1)[list(frame.columns)]
+
+    if counts and mean_cols:
+        n = resampler[mean_cols].count()
+        agg = agg.join(n.rename(columns=lambda c: c + COUNT_SUFFIX))
+
+    return agg
+
+
+def finish_weather_windows(agg: pd.DataFrame, interval_minutes: int, cfg: dict, state: dict = None) -> pd.DataFrame:
+    """
+    Seconda fase dell'aggregazione, su dati già divisi in finestre (da pandas
+    con window_weather o da Flux con aggregateWindow):
+      - finestre vuote intermedie come righe NaN
+      - correzione monotona delle piogge cumulative
+
+    state (aggregazione a blocchi): oltre alla correzione della pioggia porta
+    l'ultima finestra emessa, e ogni blocco riparte dalla finestra successiva,
+    così le finestre vuote tra due blocchi escono come sull'intero intervallo.
+      - velocità/direzione del vento dalle componenti u/v
+      - conversioni di unità e arrotondamento
+    """
+    if agg.empty:
+        return agg.reset_index()
+
+    rule = f"{interval_minutes}min"
+    first = agg.index.min()
+    if state is not None and "last_window" in state:
+        first = state["last_window"] + pd.Timedelta(minutes=interval_minutes)
+    agg = agg.reindex(pd.date_range(first, agg.index.max(), freq=rule))
+    agg.index.name = "time"
+    if state is not None:
+        state["last_window"] = agg.index.max()
+
+    # --- Pioggia: RainDay, RainMonth, RainYear, RainStorm → cumulativi ---
+    for col in cumulative_rain_columns(cfg):
+        if col in agg.columns:
+            carry = state.setdefault(col, {}) if state is not None else None
+            agg[col] = ensure_monotonic_progressive(agg[col], carry)
+
+    # --- Vento (media vettoriale) ---
+    if WIND_U in agg.columns and WIND_V in agg.columns:
+        u_mean = agg.pop(WIND_U)
+        v_mean = agg.pop(WIND_V)
+        agg["WindSpeed"] = np.sqrt(u_mean**2 + v_mean**2)
+        agg["WindDir"] = (np.degrees(np.arctan2(u_mean, v_mean)) + 360) % 360
+
+    agg = agg.reset_index()
+
+    # Convert units defined in aggregation.yaml
+    agg = apply_unit_conversions(agg, cfg)
+
+    # Arrotonda a 2 cifre decimali (tranne vento)
+    wind_cols = cfg.get("wind", set())
+    for col in agg.columns:
+        if col not in wind_cols and pd.api.types.is_numeric_dtype(agg[col]):
+            agg[col] = agg[col].round(2)
+
+    return agg
+
+
+def aggregate_weather(df: pd.DataFrame, interval_minutes: int, cfg: dict, state: dict = None, origin=None):
     """
     Aggrega i dati meteo Davis:
       - Media aritmetica per parametri normali
@@ -71,59 +179,59 @@ def aggregate_weather(df: pd.DataFrame, interval_minutes: int, cfg: dict):
         + correzione per garantire progressione monotona
       - Media vettoriale per il vento
       - Esclude colonne definite in config
+
+    Per l'aggregazione a blocchi (streaming):
+      - state : dict condiviso tra le chiamate, porta avanti la correzione della pioggia
+                e l'ultima finestra emessa (finestre vuote tra i blocchi)
+      - origin: timestamp di riferimento delle finestre (default: mezzanotte del primo dato)
     """
     if df.empty:
         return df
 
-    df = df.copy()
-    df["time"] = pd.to_datetime(df["time"], utc=True)
-    df = df.set_index("time")
+    agg = window_weather(df, interval_minutes, cfg, origin=origin)
+    return finish_weather_windows(agg, interval_minutes, cfg, state=state)
+
+def split_by_windows(df: pd.DataFrame, interval_minutes: int, parts: int, origin) -> list:
+    """
+    Divide i dati grezzi in `parts` blocchi di dimensione simile, con i tagli
+    sui bordi delle finestre (contate da `origin`): ogni finestra cade in un
+    solo blocco, quindi i blocchi si possono aggregare in modo indipendente.
+    """
+    times = pd.to_datetime(df["time"], utc=True)
+    order = np.argsort(times.to_numpy(), kind="stable")
+    df = df.iloc[order]
+    keys = ((times.iloc[order] - origin) // pd.Timedelta(minutes=interval_minutes)).to_numpy()
 
-    # Escludi colonne non desiderate
-    df.drop(columns=[c for c in cfg["excluded"] if c in df.columns], inplace=True, errors="ignore")
+    cuts = np.unique(keys[np.linspace(0, len(keys), parts, endpoint=False, dtype=int)[1:]])
+    edges = [0, *np.searchsorted(keys, cuts, side="left"), len(keys)]
+    return [df.iloc[a:b] for a, b in zip(edges, edges[1:]) if b > a]
 
-    # Converti in numerico dove possibile
-    for col in df.columns:
-        df[col] = pd.to_numeric(df[col], errors="coerce")
 
-    # Media base
-    agg = df.resample(f"{interval_minutes}min").mean()
+def window_cfg(cfg: dict) -> dict:
+    """Sottoinsieme della configurazione usato da window_weather (serializzabile per i processi)."""
+    return {k: cfg[k] for k in ("excluded", "rain", "wind") if k in cfg}
 
-    # --- Pioggia ---
-    for col in cfg["rain"]:
-        if col in df.columns:
-            if col.lower() == "rainrate":
-                # RainRate è intensità (mm/h): media aritmetica
-                agg[col] = df[col].resample(f"{interval_minutes}min").mean()
-            else:
-                # RainDay, RainMonth, RainYear, RainStorm → cumulativi
-                last_vals = df[col].resample(f"{interval_minutes}min").last()
-                agg[col] = ensure_monotonic_progressive(last_vals)
 
-    # --- Vento (media vettoriale) ---
-    if {"WindSpeed", "WindDir"}.issubset(df.columns):
-        rad = np.deg2rad(df["WindDir"])
-        u = df["WindSpeed"] * np.sin(rad)
-        v = df["WindSpeed"] * np.cos(rad)
-        u_mean = u.resample(f"{interval_minutes}min").mean()
-        v_mean = v.resample(f"{interval_minutes}min").mean()
-        wind_speed = np.sqrt(u_mean**2 + v_mean**2)
-        wind_dir = (np.degrees(np.arctan2(u_mean, v_mean)) + 360) % 360
-        agg["WindSpeed"] = wind_speed
-        agg["WindDir"] = wind_dir
+def window_weather_parallel(df: pd.DataFrame, interval_minutes: int, cfg: dict, executor, parts: int) -> pd.DataFrame:
+    """
+    window_weather distribuita su un pool di processi: blocchi allineati alle
+    finestre, stessa origine (mezzanotte del primo dato), risultati riuniti.
+    """
+    origin = pd.to_datetime(df["time"], utc=True).min().floor("D")
+    chunks = split_by_windows(df, interval_minutes, parts, origin)
+    futures = [executor.submit(window_weather, chunk, interval_minutes, window_cfg(cfg), origin)
+               for chunk in chunks]
+    return pd.concat([f.result() for f in futures]).sort_index()
 
-    agg = agg.reset_index()
 
-    # Convert units defined in aggregation.yaml
-    agg = apply_unit_conversions(agg, cfg)
+def aggregate_weather_parallel(df: pd.DataFrame, interval_minutes: int, cfg: dict, executor, parts: int):
+    """Come aggregate_weather, con la prima fase su un pool di processi (window_weather_parallel)."""
+    if df.empty:
+        return df
 
-    # Arrotonda a 2 cifre decimali (tranne vento)
-    wind_cols = cfg.get("wind", set())
-    for col in agg.columns:
-        if col not in wind_cols and pd.api.types.is_numeric_dtype(agg[col]):
-            agg[col] = agg[col].round(2)
+    agg = window_weather_parallel(df, interval_minutes, cfg, executor, parts)
+    return finish_weather_windows(agg, interval_minutes, cfg)
 
-    return agg
 
 def convert_f_to_c(temp_in_fahrenheit):
     convert = (temp_in_fahrenheit - 32) * 5 / 9
@@ -0,0 +1,187 @@
+"""
+Content-addressed disk cache of aggregated time-series windows.
+
+/timeseries results are built from windowed frames (utils.window_weather,
+Flux aggregateWindow or rollups) before the final finish step. For intervals
+that divide a day, those windows never straddle a UTC day, so each closed
+day can be cached on its own under a key made of
+
+    (instrument_id, interval, bucket_start, hash of aggregation.yaml, data version)
+
+and reused by any later request overlapping it ("last 7 days" asked several
+times a day only recomputes the open day and the edges). Missing days are
+fetched in contiguous runs, split and stored; open days (newer than
+`closed_margin`) and partial edge days are always computed. The data
+version of the instrument (data_versions.py) changes when a backfill writes
+into its past, so entries computed before it are no longer looked up.
+
+Entries are pickled frames named by the sha256 of the key, written
+atomically. Reads refresh the file mtime; when the directory grows past
+`max_bytes` the least recently used files are evicted. Several processes
+may share the directory.
+"""
+
+import hashlib
+import os
+import threading
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from flux_planner import MINUTES_PER_DAY
+
+
+class WindowCache:
+    def __init__(self, path, max_bytes=512 * 1024 * 1024, closed_margin=900, bucket_minutes=MINUTES_PER_DAY):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.closed_margin = timedelta(seconds=closed_margin)
+        self.bucket = timedelta(minutes=bucket_minutes)
+
+        self._lock = threading.Lock()
+        self._size = None                 # bytes on disk, scanned lazily
+        self.counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "errors": 0}
+
+    def covers(self, interval_minutes):
+        """Cached buckets are only exact when windows never straddle a bucket edge."""
+        minutes = int(self.bucket.total_seconds() // 60)
+        return interval_minutes > 0 and minutes % interval_minutes == 0
+
+    @staticmethod
+    def key(instrument_id, interval_minutes, bucket_start, config_hash, data_version="0"):
+        raw = f"{instrument_id}|{interval_minutes}|{bucket_start:%Y-%m-%dT%H:%M}|{config_hash}|{data_version}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.path, key[:2], key + ".pkl")
+
+    def get(self, key):
+        path = self._file(key)
+        try:
+            frame = pd.read_pickle(path)
+            os.utime(path)                # LRU: mtime = last use
+        except FileNotFoundError:
+            self._count("misses")
+            return None
+        except Exception:
+            self._count("errors")
+            return None
+        self._count("hits")
+        return frame
+
+    def put(self, key, frame):
+        path = self._file(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            frame.to_pickle(tmp)
+            os.replace(tmp, path)
+            size = os.path.getsize(path)
+        except Exception:
+            self._count("errors")
+            return
+        self._count("stores")
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _entries(self):
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                if name.endswith(".pkl"):
+                    full = os.path.join(root, name)
+                    try:
+                        st = os.stat(full)
+                    except OSError:
+                        continue
+                    yield st.st_mtime, st.st_size, full
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        # Rescan (other processes write here too), then drop the oldest down to 90%
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, full in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(full)
+                total -= size
+                self.counters["evictions"] += 1
+            except OSError:
+                pass
+        self._size = total
+
+    def stats(self):
+        with self._lock:
+            out = dict(self.counters)
+            out["bytes"] = self._size
+        lookups = out["hits"] + out["misses"]
+        out["hit_rate"] = round(out["hits"] / lookups, 4) if lookups else None
+        return out
+
+    def windows(self, fetch, instrument_id, interval_minutes, start, end, config_hash, data_version="0", now=None):
+        """
+        Windowed frame for [start, end) (naive UTC), using cached closed
+        buckets and calling fetch(start, stop) for everything else.
+        """
+        now = now or datetime.utcnow()
+        day0 = datetime(1970, 1, 1)
+        first = day0 + -(-(start - day0) // self.bucket) * self.bucket
+        last = day0 + (min(end, now - self.closed_margin) - day0) // self.bucket * self.bucket
+        if first >= last:
+            return fetch(start, end)
+
+        pieces = []
+        if start < first:
+            pieces.append(fetch(start, first))
+
+        run = None                        # start of the current run of missing buckets
+        bucket_start = first
+        while bucket_start < last:
+            cached = self.get(self.key(instrument_id, interval_minutes, bucket_start, config_hash, data_version))
+            if cached is None:
+                run = run or bucket_start
+            else:
+                if run is not None:
+                    pieces.append(self._fill(fetch, instrument_id, interval_minutes, run, bucket_start, config_hash,
+                                             data_version))
+                    run = None
+                pieces.append(cached)
+            bucket_start += self.bucket
+        if run is not None:
+            pieces.append(self._fill(fetch, instrument_id, interval_minutes, run, last, config_hash, data_version))
+
+        if last < end:
+            pieces.append(fetch(last, end))
+
+        pieces = [p for p in pieces if not p.empty]
+        if not pieces:
+            return pd.DataFrame()
+        out = pd.concat(pieces).sort_index()
+        return out[sorted(out.columns)]
+
+    def _fill(self, fetch, instrument_id, interval_minutes, start, stop, config_hash, data_version):
+        """Fetch a run of missing buckets at once and store each bucket (empty ones too)."""
+        frame = fetch(start, stop)
+        bucket_start = start
+        while bucket_start < stop:
+            lo = pd.Timestamp(bucket_start, tz="UTC")
+            if frame.empty:
+                part = frame
+            else:
+                part = frame[(frame.index >= lo) & (frame.index < lo + self.bucket)]
+            self.put(self.key(instrument_id, interval_minutes, bucket_start, config_hash, data_version), part)
+            bucket_start += self.bucket
+        return frame